@@ -0,0 +1,250 @@
+"""Benchmarks for flock scoring and the results pipeline at production scale.
+
+Builds flocks from a synthetic TMDB graph (see flickflock.synthetic) in a
+scratch database and times each stage a request goes through: scoring,
+the member list, work scoring with the results filters and multipliers,
+results post-processing (ranking, paging and member enrichment), the
+whole /results handler, and /api/search lookups in a local search index
+of the graph's works.  Each stage also gets one run under tracemalloc
+for its peak memory.  Results are saved as JSON and can be compared with
+a baseline run:
+
+    python bench.py --out baseline.json
+    python bench.py --scenario large --repeat 10 --baseline baseline.json
+    python bench.py --scenario medium --selections 40 --filmography 200
+"""
+import argparse, gc, json, os, platform, random, statistics, subprocess, sys, tempfile, time, tracemalloc
+
+import main
+from flickflock import storage
+from flickflock.contributions import contributions, seed_key
+from flickflock.flock import Flock, build_contribution
+from flickflock.rankings import Ranking, rankings
+from flickflock.search_index import SearchIndex
+from flickflock.synthetic import SyntheticGraph, SyntheticTMDB
+
+RESULTS_FORMAT = 1
+
+# selections: seeds in the flock, person_share: share of them that are
+# people, filmography: credits per person, max_works/max_cast: how far a
+# person seed expands transitively, index_docs: works in the search index.
+SCENARIOS = {
+    "small": dict(selections=5, person_share=0.2, filmography=30, max_works=10, max_cast=10, index_docs=5000),
+    "medium": dict(selections=20, person_share=0.3, filmography=60, max_works=20, max_cast=15, index_docs=20000),
+    "large": dict(selections=60, person_share=0.4, filmography=150, max_works=20, max_cast=20, index_docs=50000),
+}
+
+# Typed prefixes and words: short, long, article-stripped and multi-word
+SEARCH_QUERIES = ("s", "ni", "gho", "river", "the empire", "summer st", "gold")
+
+
+def build_flock(tmdb, selections, person_share, max_works, max_cast, seed=0):
+    """A synced flock of random seeds, expanded the way expand_selection does."""
+    rng = random.Random(seed)
+    graph = tmdb.graph
+    f = Flock(name="bench")
+    for _ in range(selections):
+        if rng.random() < person_share:
+            id, media_type = graph.random_person(rng), "person"
+            person = tmdb.get_person_by_id(id)
+            relations = tmdb.get_person_relations_filtered(id, max_works=max_works, max_cast_per_work=max_cast)
+            seeds = [
+                ("person_direct", [{"id": id, "department": person.get("known_for_department", "Acting"), "order": 0}]),
+                ("person_transitive", [p for p in relations if p.get("id") != id]),
+            ]
+        else:
+            id = graph.random_work(rng)
+            media_type = graph.media_type(id)
+            seeds = [(media_type, tmdb.get_people_by_media_id_filtered(id, media_type, max_cast=max_cast))]
+
+        f.update_selection({"id": id, "media_type": media_type})
+        for source_type, entities in seeds:
+            key = seed_key(source_type, id, graph=graph.seed, max_works=max_works, max_cast=max_cast)
+            version = contributions.set(key, build_contribution(entities, source_type))
+            f.add_seed_to_flock(version, primary_id=id, source_type=source_type)
+    f.sync_flock()
+    return f
+
+
+def stages(f):
+    """{stage: callable} for every benchmarked step of serving flock f."""
+    works = main.ranked_works(f)
+
+    def results_postprocess():
+        page, _, _ = Ranking(works).query(limit=50)
+        return main.enrich_members(page)
+
+    def flock_results():
+        rankings.clear()
+        return main.flock_results(
+            f.flock_id, genre=None, media_type=None, year_from=None, year_to=None,
+            sort="score", limit=50, cursor=None,
+        )
+
+    return {
+        "score_flock": f.score_flock,
+        "get_flock": lambda: f.get_flock(most_common=25),
+        "get_flock_works": lambda: main.ranked_works(f),
+        "results_postprocess": results_postprocess,
+        "flock_results": flock_results,
+    }
+
+
+def search_stages(graph, docs):
+    """{stage: callable} for search index lookups over graph's first docs works."""
+    index = SearchIndex()
+    index.add(graph.work(id) for id in range(1, docs + 1))
+    index.lookup("warm")  # merges the names added in bulk
+    return {"search_lookup": lambda: [index.lookup(q) for q in SEARCH_QUERIES]}
+
+
+def measure(fn, repeat):
+    """Timings over repeat runs (after a warm-up run) and one run's peak traced memory.
+
+    Like timeit, the garbage collector is off while timing, so a collection
+    triggered by earlier allocations doesn't land in a random run.
+    """
+    fn()
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_scenario(config, repeat, seed=0):
+    graph = SyntheticGraph(filmography=config["filmography"], seed=seed)
+    tmdb = SyntheticTMDB(graph)
+    original, main.tmdb = main.tmdb, tmdb
+    try:
+        f = build_flock(
+            tmdb, config["selections"], config["person_share"],
+            config["max_works"], config["max_cast"], seed=seed,
+        )
+        f.score_flock()
+        return {
+            "config": {**config, "graph": graph.config()},
+            "flock": {
+                "entries": len(f.flock_entries),
+                "members": len(f.flock),
+                "works": len(main.ranked_works(f)),
+            },
+            "stages": {
+                name: measure(fn, repeat)
+                for name, fn in {**stages(f), **search_stages(graph, config["index_docs"])}.items()
+            },
+        }
+    finally:
+        main.tmdb = original
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(scenarios, repeat=5, seed=0, db_path=None):
+    """Run {name: config} scenarios against a scratch database and return the results."""
+    storage.configure(path=db_path or os.path.join(tempfile.mkdtemp(prefix="flickflock-bench-"), "flock.db"), shards=1)
+    return {
+        "format": RESULTS_FORMAT,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "scenarios": {name: run_scenario(config, repeat, seed=seed) for name, config in scenarios.items()},
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """Rows of (scenario, stage, metric, baseline, current, change) and the regressions among them.
+
+    A stage regresses when its fastest time or peak memory grew by more
+    than threshold (a fraction) over a baseline run of the same scenario.
+    """
+    rows, regressions = [], []
+    for name, scenario in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if base["config"] != scenario["config"]:
+            print(f"warning: scenario {name} has a different config than the baseline", file=sys.stderr)
+        for stage, current in scenario["stages"].items():
+            before = base["stages"].get(stage)
+            if before is None:
+                continue
+            for metric in ("min_ms", "peak_kib"):
+                change = current[metric] / before[metric] - 1 if before[metric] else 0.0
+                row = (name, stage, metric, before[metric], current[metric], change)
+                rows.append(row)
+                if change > threshold:
+                    regressions.append(row)
+    return rows, regressions
+
+
+def print_results(results):
+    for name, scenario in results["scenarios"].items():
+        print(f"{name}: {scenario['flock']}")
+        for stage, m in scenario["stages"].items():
+            print(f"  {stage:<20} median {m['median_ms']:>10.3f} ms  min {m['min_ms']:>10.3f} ms  peak {m['peak_kib']:>10.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark flock scoring and the results pipeline")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these scenarios (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic graph and flock seed")
+    for option in ("selections", "filmography", "max-works", "max-cast", "index-docs"):
+        parser.add_argument(f"--{option}", type=int, help=f"override every scenario's {option.replace('-', '_')}")
+    parser.add_argument("--person-share", type=float, help="override every scenario's person_share")
+    parser.add_argument("--out", default="bench-results.json", help="where to save the results")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown or memory growth that fails the comparison")
+    args = parser.parse_args()
+
+    overrides = {
+        key: value for key, value in {
+            "selections": args.selections, "filmography": args.filmography, "max_works": args.max_works,
+            "max_cast": args.max_cast, "person_share": args.person_share, "index_docs": args.index_docs,
+        }.items() if value is not None
+    }
+    scenarios = {name: {**SCENARIOS[name], **overrides} for name in args.scenario or SCENARIOS}
+
+    results = run(scenarios, repeat=args.repeat, seed=args.seed)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"Saved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold)
+        for name, stage, metric, before, current, change in rows:
+            flag = "  REGRESSION" if change > args.threshold else ""
+            print(f"{name:<8} {stage:<20} {metric:<10} {before:>10} -> {current:>10} ({change:+.1%}){flag}")
+        if regressions:
+            sys.exit(1)
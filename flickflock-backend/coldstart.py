@@ -0,0 +1,121 @@
+"""Cold start benchmark: import time, time to ready and first-request latency.
+
+Each run starts from a fresh interpreter, the way a scaled-from-zero
+container does.  It times `import main` (and lists the heavy modules that
+import pulled in), then starts the app with uvicorn against a fake
+TMDB/OMDb (flickflock.fake_upstream) and a scratch database and request
+cache, and times how long /healthz takes to answer and how long the first
+requests take compared with the same requests once warm.  Reports medians
+over the runs:
+
+    python coldstart.py --runs 5
+    python coldstart.py --runs 5 --no-prewarm --out coldstart.json
+"""
+import argparse, json, os, statistics, subprocess, sys, time
+import requests
+from flickflock.fake_upstream import FakeUpstream
+from flickflock.synthetic import SyntheticGraph
+from loadtest import start_app
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules a plain `import main` should not load; they are deferred to first use
+DEFERRED_MODULES = ("requests", "diskcache", "uvicorn")
+
+_IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({{
+    "import_ms": (time.perf_counter() - started) * 1000,
+    "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+    "clients_built": main.tmdb is not None or main.omdb is not None,
+}}))
+"""
+
+# (name, path) requested in order once the app is ready, each twice
+REQUESTS = (
+    ("search", "/api/search?q=night"),
+    ("details", "/api/movie/10/details"),
+    ("person", "/api/person/7"),
+)
+
+
+def measure_import(env=None):
+    """Time `import main` in a fresh interpreter; also the interpreter's own wall time."""
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE], cwd=HERE, capture_output=True, text=True, check=True,
+        env={**os.environ, "TMDB_API_KEY": "coldstart", **(env or {})},
+    ).stdout
+    report = json.loads(out.strip().splitlines()[-1])
+    report["process_ms"] = (time.perf_counter() - started) * 1000
+    return report
+
+
+def measure_start(upstream_url, port, env=None):
+    """Time a fresh app's readiness and its first and second response to each of REQUESTS."""
+    started = time.perf_counter()
+    process, url = start_app(upstream_url, port, workers=1, env=env)
+    try:
+        report = {"ready_ms": (time.perf_counter() - started) * 1000}
+        for name, path in REQUESTS:
+            for attempt in ("first", "warm"):
+                t = time.perf_counter()
+                requests.get(url + path, timeout=30).raise_for_status()
+                report[f"{attempt}_{name}_ms"] = (time.perf_counter() - t) * 1000
+        return report
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(runs=3, port=8082, prewarm=True):
+    env = {"FLOCK_PREWARM": "1" if prewarm else "0", "TMDB_RATE_LIMIT": "0"}
+    upstream = FakeUpstream(graph=SyntheticGraph()).start()
+    try:
+        imports = [measure_import(env) for _ in range(runs)]
+        starts = [measure_start(upstream.url, port, env) for _ in range(runs)]
+    finally:
+        upstream.stop()
+
+    def medians(samples, keys):
+        return {k: round(statistics.median(s[k] for s in samples), 1) for k in keys}
+
+    return {
+        "runs": runs,
+        "prewarm": prewarm,
+        "python": sys.version.split()[0],
+        "import": {
+            **medians(imports, ("import_ms", "process_ms")),
+            "loaded": sorted({m for s in imports for m in s["loaded"]}),
+            "clients_built": any(s["clients_built"] for s in imports),
+        },
+        "start": medians(starts, starts[0]),
+    }
+
+
+def print_report(report):
+    imp, start = report["import"], report["start"]
+    print(f"{report['runs']} cold starts (prewarm {'on' if report['prewarm'] else 'off'}, python {report['python']})")
+    print(f"  import main          {imp['import_ms']:>8.1f} ms  ({imp['process_ms']:.1f} ms with interpreter startup)")
+    if imp["loaded"] or imp["clients_built"]:
+        print(f"  import also loaded   {', '.join(imp['loaded']) or '-'}{'; built clients' if imp['clients_built'] else ''}")
+    print(f"  ready (/healthz)     {start['ready_ms']:>8.1f} ms")
+    for name, _ in REQUESTS:
+        print(f"  first {name:<14} {start[f'first_{name}_ms']:>8.1f} ms  (warm {start[f'warm_{name}_ms']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the app's import, readiness and first requests from cold")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8082, help="port for the started apps")
+    parser.add_argument("--no-prewarm", action="store_true", help="start with FLOCK_PREWARM=0")
+    parser.add_argument("--out", help="save the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.runs, port=args.port, prewarm=not args.no_prewarm)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
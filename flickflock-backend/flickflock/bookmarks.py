@@ -1,123 +1,255 @@
-import uuid, json, time, sqlite3, os
+import uuid, json, logging, time
+from flickflock import metrics, storage
 
-_DB_PATH = os.environ.get(
-    "FLOCK_DB_PATH",
-    os.path.join(os.path.dirname(__file__), "..", "data", "flock.db"),
+log = logging.getLogger(__name__)
+
+# Items live one row per bookmark in bookmark_items; the items column on
+# bookmark_lists is only read to migrate lists saved before that table
+# existed (see _migrate_items).
+storage.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS bookmark_lists (
+        list_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        items TEXT NOT NULL DEFAULT '[]',
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_bookmark_lists_user_id
+    ON bookmark_lists(user_id)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bookmark_items (
+        list_id TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        media_id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        added_at REAL NOT NULL,
+        UNIQUE (list_id, media_type, media_id)
+    )
+    """,
+)
+# Lists are sharded by user_id, which the common per-user lookups know;
+# shared links by list_id have to check every shard.
+storage.register_sharded_table("bookmark_lists", "user_id")
+storage.register_sharded_table(
+    "bookmark_items",
+    "(SELECT user_id FROM bookmark_lists l WHERE l.list_id = bookmark_items.list_id)",
 )
 
 
-def _get_db():
-    db_dir = os.path.dirname(_DB_PATH)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-    conn = sqlite3.connect(_DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS bookmark_lists (
-            list_id TEXT PRIMARY KEY,
-            user_id TEXT NOT NULL,
-            items TEXT NOT NULL DEFAULT '[]',
-            updated_at REAL NOT NULL
-        )
-    """)
+def _migrate_item_positions(conn):
+    # Pages used to be read in rowid order, but VACUUM may renumber implicit
+    # rowids and rebalance() doesn't copy them.  position is a real column:
+    # existing rows keep their rowid as their position, so cursors clients
+    # already hold stay valid, and the (list_id, position) index replaces
+    # the list_id one.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(bookmark_items)")}
+    if "position" not in columns:
+        conn.execute("ALTER TABLE bookmark_items ADD COLUMN position INTEGER")
+    conn.execute("UPDATE bookmark_items SET position = rowid WHERE position IS NULL")
+    conn.execute("DROP INDEX IF EXISTS idx_bookmark_items_list_id")
     conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_bookmark_lists_user_id
-        ON bookmark_lists(user_id)
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bookmark_items_position
+        ON bookmark_items(list_id, position)
     """)
-    conn.commit()
-    return conn
+
+
+storage.register_migration("bookmark_items_position", _migrate_item_positions)
+
+# The next position in a list, i.e. items are paged in insertion order
+_INSERT_ITEM = """
+    INSERT OR IGNORE INTO bookmark_items (list_id, position, media_type, media_id, data, added_at)
+    VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM bookmark_items WHERE list_id = ?), ?, ?, ?, ?)
+"""
+
+
+def _with_media_type(item):
+    """item with a media_type, inferred as TMDB names them if missing: tv shows have a name, movies a title."""
+    if item.get("media_type"):
+        return item
+    return {**item, "media_type": "tv" if "name" in item and "title" not in item else "movie"}
+
+
+def _migrate_items(conn, list_id, items_json):
+    """Move a list's legacy JSON items into bookmark_items (called inside a transaction)."""
+    now = time.time()
+    items = json.loads(items_json)
+    untyped = sum(1 for item in items if not item.get("media_type"))
+    if untyped:
+        log.info("Inferred the media_type of %d legacy bookmarks in list %s", untyped, list_id)
+    conn.executemany(
+        _INSERT_ITEM,
+        [
+            (list_id, list_id, item["media_type"], item["id"], json.dumps(item), now)
+            for item in map(_with_media_type, items)
+        ],
+    )
+    conn.execute("UPDATE bookmark_lists SET items = '[]' WHERE list_id = ?", (list_id,))
 
 
 class BookmarkList:
-    """A shareable list of bookmarked movies/shows tied to a user_id."""
+    """A shareable list of bookmarked movies/shows tied to a user_id.
+
+    The constructor and methods block on SQLite; async routes use
+    load_async() and the *_async methods, which await the same queries on
+    the storage module's database threads instead.
+    """
 
     def __init__(self, user_id=None, list_id=None):
-        self.items = []
+        row = None
+        for db, query, params in self._lookups(user_id, list_id):
+            with metrics.DB_SECONDS.time(op="bookmarks_load"), db.connection() as conn:
+                row = conn.execute(query, params).fetchone()
+            if row:
+                if row[2] != "[]":
+                    # Migrate lists saved in the old JSON format on first access
+                    storage.write(lambda conn: _migrate_items(conn, row[0], row[2]), key=row[1])
+                break
+        self._init(user_id, row)
 
-        if list_id:
-            data = self._load_by_list_id(list_id)
-            if data:
-                self.list_id = data["list_id"]
-                self.user_id = data["user_id"]
-                self.items = data["items"]
-                return
+    @classmethod
+    async def load_async(cls, user_id=None, list_id=None):
+        """Like BookmarkList(user_id, list_id), without blocking the event loop."""
+        row = None
+        for db, query, params in cls._lookups(user_id, list_id):
+            with metrics.DB_SECONDS.time(op="bookmarks_load"):
+                row = await storage.read_async(
+                    lambda conn: conn.execute(query, params).fetchone(), db=db,
+                )
+            if row:
+                if row[2] != "[]":
+                    await storage.write_async(lambda conn: _migrate_items(conn, row[0], row[2]), key=row[1])
+                break
+        self = cls.__new__(cls)
+        self._init(user_id, row)
+        return self
 
-        # No existing list found by list_id; try to find by user_id
-        if user_id:
-            data = self._load_by_user_id(user_id)
-            if data:
-                self.list_id = data["list_id"]
-                self.user_id = data["user_id"]
-                self.items = data["items"]
-                return
+    def _init(self, user_id, row):
+        self._items = None
+        if row:
+            self.list_id, self.user_id = row[0], row[1]
+            return
 
         # Create new
         self.list_id = str(uuid.uuid4())
         self.user_id = user_id or str(uuid.uuid4())
+        self._items = []
 
-    def _load_by_list_id(self, list_id):
-        conn = _get_db()
-        try:
-            row = conn.execute(
-                "SELECT list_id, user_id, items FROM bookmark_lists WHERE list_id = ?",
-                (list_id,),
-            ).fetchone()
-            if row:
-                return {
-                    "list_id": row[0],
-                    "user_id": row[1],
-                    "items": json.loads(row[2]),
-                }
-            return None
-        finally:
-            conn.close()
-
-    def _load_by_user_id(self, user_id):
-        conn = _get_db()
-        try:
-            row = conn.execute(
+    @staticmethod
+    def _lookups(user_id, list_id):
+        """(db, query, params) to try in order: the list_id on every shard, then the user's latest list."""
+        if list_id:
+            for db in storage.shards():
+                yield db, "SELECT list_id, user_id, items FROM bookmark_lists WHERE list_id = ?", (list_id,)
+        # No existing list found by list_id; try to find by user_id
+        if user_id:
+            yield (
+                storage.shard_for(user_id),
                 "SELECT list_id, user_id, items FROM bookmark_lists WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1",
                 (user_id,),
-            ).fetchone()
-            if row:
-                return {
-                    "list_id": row[0],
-                    "user_id": row[1],
-                    "items": json.loads(row[2]),
-                }
-            return None
-        finally:
-            conn.close()
+            )
+
+    @property
+    def items(self):
+        """All bookmarked items in the order they were added."""
+        if self._items is None:
+            self._items, _ = self.page()
+        return self._items
+
+    def page(self, limit=None, cursor=None):
+        """Return (items, next_cursor) for one page of the list.
+
+        cursor is the next_cursor of the previous page; next_cursor is None on
+        the last page.
+        """
+        with metrics.DB_SECONDS.time(op="bookmarks_page"), storage.connection(self.user_id) as conn:
+            return self._read_page(conn, limit, cursor)
+
+    async def page_async(self, limit=None, cursor=None):
+        with metrics.DB_SECONDS.time(op="bookmarks_page"):
+            return await storage.read_async(
+                lambda conn: self._read_page(conn, limit, cursor), key=self.user_id,
+            )
+
+    def _read_page(self, conn, limit, cursor):
+        query = "SELECT position, data FROM bookmark_items WHERE list_id = ? AND position > ? ORDER BY position"
+        params = [self.list_id, cursor or 0]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit + 1)
+        rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][0]
+        return [json.loads(r[1]) for r in rows], next_cursor
 
     def add(self, item):
         """Add a bookmark item (dict with id, title, media_type, poster_path, etc.)."""
-        if any(b["id"] == item["id"] and b.get("media_type") == item.get("media_type") for b in self.items):
-            return  # already bookmarked
-        self.items.append(item)
-        self._save()
+        with metrics.DB_SECONDS.time(op="bookmarks_save"):
+            storage.write(lambda conn: self._add(conn, item), key=self.user_id)
+        self._items = None
+
+    async def add_async(self, item):
+        with metrics.DB_SECONDS.time(op="bookmarks_save"):
+            await storage.write_async(lambda conn: self._add(conn, item), key=self.user_id)
+        self._items = None
+
+    def _add(self, conn, item):
+        # The unique (list_id, media_type, media_id) index makes a
+        # duplicate add a no-op
+        item = _with_media_type(item)
+        conn.execute(
+            _INSERT_ITEM,
+            (self.list_id, self.list_id, item["media_type"], item["id"], json.dumps(item), time.time()),
+        )
+        self._save(conn)
 
     def remove(self, media_id, media_type):
         """Remove a bookmark by media id and type."""
-        self.items = [
-            b for b in self.items
-            if not (b["id"] == media_id and b.get("media_type") == media_type)
-        ]
-        self._save()
+        with metrics.DB_SECONDS.time(op="bookmarks_save"):
+            storage.write(lambda conn: self._remove(conn, media_id, media_type), key=self.user_id)
+        self._items = None
+
+    async def remove_async(self, media_id, media_type):
+        with metrics.DB_SECONDS.time(op="bookmarks_save"):
+            await storage.write_async(lambda conn: self._remove(conn, media_id, media_type), key=self.user_id)
+        self._items = None
+
+    def _remove(self, conn, media_id, media_type):
+        conn.execute(
+            "DELETE FROM bookmark_items WHERE list_id = ? AND media_type = ? AND media_id = ?",
+            (self.list_id, media_type, media_id),
+        )
+        self._save(conn)
+
+    def to_dict(self, limit=None, cursor=None):
+        if limit or cursor:
+            items, next_cursor = self.page(limit, cursor)
+            return {**self._as_dict(items), "next_cursor": next_cursor}
+        return self._as_dict(self.items)
+
+    async def to_dict_async(self, limit=None, cursor=None):
+        if limit or cursor:
+            items, next_cursor = await self.page_async(limit, cursor)
+            return {**self._as_dict(items), "next_cursor": next_cursor}
+        if self._items is None:
+            self._items, _ = await self.page_async()
+        return self._as_dict(self._items)
 
-    def to_dict(self):
+    def _as_dict(self, items):
         return {
             "list_id": self.list_id,
             "user_id": self.user_id,
-            "items": self.items,
+            "items": items,
         }
 
-    def _save(self):
-        conn = _get_db()
-        try:
-            conn.execute(
-                "INSERT OR REPLACE INTO bookmark_lists (list_id, user_id, items, updated_at) VALUES (?, ?, ?, ?)",
-                (self.list_id, self.user_id, json.dumps(self.items), time.time()),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+    def _save(self, conn):
+        conn.execute(
+            "INSERT INTO bookmark_lists (list_id, user_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(list_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (self.list_id, self.user_id, time.time()),
+        )
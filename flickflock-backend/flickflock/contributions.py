@@ -0,0 +1,214 @@
+import hashlib, json, time, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from flickflock import metrics, storage, tracing
+from flickflock.vectors import EntityVector
+
+# How long a built contribution is reused for new seed adds before it is
+# rebuilt from TMDB.  Matches the TMDB request cache TTL.
+SEED_MAX_AGE = 7 * 24 * 3600
+
+
+storage.register_schema("""
+    CREATE TABLE IF NOT EXISTS seed_contributions (
+        seed_key TEXT PRIMARY KEY,
+        entities BLOB NOT NULL,
+        updated_at REAL NOT NULL
+    )
+""", """
+    CREATE TABLE IF NOT EXISTS seed_versions (
+        seed_key TEXT PRIMARY KEY,
+        version_key TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+""")
+
+
+def _migrate_seed_versions(conn):
+    # Contributions stored before versioning are referenced by their plain
+    # key; keep them as the current version until they are rebuilt
+    conn.execute("""
+        INSERT OR IGNORE INTO seed_versions (seed_key, version_key, updated_at)
+        SELECT seed_key, seed_key, updated_at FROM seed_contributions WHERE instr(seed_key, '@') = 0
+    """)
+
+
+storage.register_migration("seed_versions_backfill", _migrate_seed_versions)
+
+
+def seed_key(source_type, id, **params):
+    """Build the cache key for a seed's contribution, e.g. 'movie:603:max_cast=20'."""
+    key = f"{source_type}:{id}"
+    if params:
+        key += ":" + ",".join(f"{k}={params[k]}" for k in sorted(params))
+    return key
+
+
+def version_key(key, blob):
+    """The key of one build of a seed's contribution, e.g. 'movie:603:max_cast=20@1f3a...'."""
+    return f"{key}@{hashlib.blake2b(blob, digest_size=8).hexdigest()}"
+
+
+class ContributionCache:
+    """Shared store of finished per-seed EntityVectors.
+
+    Popular seeds are added to many flocks; building their contribution once
+    and letting flocks reference it by key saves the credit fetch, the entity
+    weighting and the transitive cap on every add.  Vectors are persisted in
+    SQLite and the hottest ones are kept in an in-process LRU.  Callers must
+    treat returned vectors as read-only, since they are shared.
+
+    Stored vectors never change: each build is kept under a version key
+    derived from its contents, and seed_versions points each seed at the
+    build new adds should use.  Flocks record the version key, so rebuilding
+    a seed after SEED_MAX_AGE leaves the scores of existing flocks (and
+    their rankings cached by flock version) as they were.
+    """
+
+    def __init__(self, max_items=2048):
+        self.max_items = max_items
+        self._lru = OrderedDict()    # {version_key: (entities, updated_at)}
+        self._heads = OrderedDict()  # {seed_key: (version_key, updated_at)}
+        self._building = {}          # {seed_key: Future for the version key being built}
+        self._lock = threading.Lock()
+
+    def _get_record(self, key):
+        with self._lock:
+            record = self._lru.get(key)
+            if record is not None:
+                self._lru.move_to_end(key)
+                metrics.CACHE_LOOKUPS.inc(cache="contributions", result="l1_hit")
+                return record
+
+        with tracing.span("contributions_load"), storage.connection() as conn:
+            record = self._read_record(conn, key)
+        if record is None:
+            metrics.CACHE_LOOKUPS.inc(cache="contributions", result="miss")
+            return None
+        metrics.CACHE_LOOKUPS.inc(cache="contributions", result="l2_hit")
+        self._remember(self._lru, key, record)
+        return record
+
+    @staticmethod
+    def _read_record(conn, key):
+        row = conn.execute(
+            "SELECT entities, updated_at FROM seed_contributions WHERE seed_key = ?",
+            (key,),
+        ).fetchone()
+        if not row:
+            return None
+        # Rows written before vectors were packed hold JSON entity lists
+        blob = row[0]
+        if isinstance(blob, str):
+            entities = EntityVector.from_entities(json.loads(blob))
+        else:
+            entities = EntityVector.from_bytes(blob)
+        return (entities, row[1])
+
+    async def prefetch_async(self, keys):
+        """Load the vectors for keys into the LRU off the event loop, so get() on them won't block."""
+        with self._lock:
+            missing = {key for key in keys if key not in self._lru}
+        if not missing:
+            return
+        with tracing.span("contributions_load"):
+            records = await storage.read_async(lambda conn: {key: self._read_record(conn, key) for key in missing})
+        for key, record in records.items():
+            if record is not None:
+                self._remember(self._lru, key, record)
+
+    def _remember(self, lru, key, record):
+        with self._lock:
+            lru[key] = record
+            lru.move_to_end(key)
+            while len(lru) > self.max_items:
+                lru.popitem(last=False)
+
+    def get(self, key, max_age=None):
+        """Return the vector stored under a version key, or None if missing or older than max_age seconds."""
+        record = self._get_record(key)
+        if record is None:
+            return None
+        entities, updated_at = record
+        if max_age is not None and time.time() - updated_at > max_age:
+            return None
+        return entities
+
+    def current(self, key, max_age=None):
+        """Return the version key new adds of seed key use, or None if missing or older than max_age."""
+        with self._lock:
+            head = self._heads.get(key)
+            if head is not None:
+                self._heads.move_to_end(key)
+        if head is None:
+            with storage.connection() as conn:
+                head = conn.execute(
+                    "SELECT version_key, updated_at FROM seed_versions WHERE seed_key = ?", (key,)
+                ).fetchone()
+            if head is None:
+                return None
+            self._remember(self._heads, key, tuple(head))
+        version, updated_at = head
+        if max_age is not None and time.time() - updated_at > max_age:
+            return None
+        return version
+
+    def set(self, key, entities):
+        """Store a new build of seed key's vector and return its version key.
+
+        entities may be weighted dicts or an EntityVector.
+        """
+        if not isinstance(entities, EntityVector):
+            entities = EntityVector.from_entities(entities)
+        blob = entities.to_bytes()
+        version = version_key(key, blob)
+        updated_at = time.time()
+
+        def write(conn):
+            conn.execute(
+                "INSERT OR IGNORE INTO seed_contributions (seed_key, entities, updated_at) VALUES (?, ?, ?)",
+                (version, blob, updated_at),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO seed_versions (seed_key, version_key, updated_at) VALUES (?, ?, ?)",
+                (key, version, updated_at),
+            )
+        storage.write(write)
+        self._remember(self._lru, version, (entities, updated_at))
+        self._remember(self._heads, key, (version, updated_at))
+        return version
+
+    def get_or_build(self, key, build, max_age=SEED_MAX_AGE):
+        """Return the version key for seed key, calling build() for its vector on a miss.
+
+        Concurrent misses for the same seed wait for a single build.
+        """
+        version = self.current(key, max_age=max_age)
+        if version is not None:
+            return version
+        with self._lock:
+            future = self._building.get(key)
+            building = future is None
+            if building:
+                future = self._building[key] = Future()
+        if not building:
+            return future.result()
+        try:
+            version = self.set(key, build())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(version)
+        finally:
+            with self._lock:
+                del self._building[key]
+        return version
+
+    def clear_memory(self):
+        with self._lock:
+            self._lru.clear()
+            self._heads.clear()
+
+
+contributions = ContributionCache()
@@ -0,0 +1,206 @@
+"""A local stand-in for the TMDB and OMDb APIs, for load tests.
+
+Serves TMDB-shaped responses under /3/ and OMDb-shaped ones at /, from
+recorded fixtures or a SyntheticGraph (or fixtures first, falling back to
+the graph), with configurable latency and injected errors.  Point the app
+at it with
+
+    TMDB_BASE_URL=http://localhost:8765/3 OMDB_BASE_URL=http://localhost:8765/
+
+and read per-endpoint call counts from GET /__stats (POST /__reset clears
+them).  Fixtures are a JSON file of
+
+    {"tmdb": {"movie/603/credits": {...}, "search/multi?query=matrix": {...}},
+     "omdb": {"tt0133093": {...}}}
+
+    python -m flickflock.fake_upstream --port 8765 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+"""
+import json, logging, random, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from flickflock import metrics
+from flickflock.synthetic import NOT_FOUND, SyntheticGraph
+
+log = logging.getLogger(__name__)
+
+# Bodies the real APIs send with these statuses
+_TMDB_ERRORS = {
+    429: {"success": False, "status_code": 25, "status_message": "Your request count (41) is over the allowed limit of (40)."},
+    500: {"success": False, "status_code": 11, "status_message": "Internal error: Something went wrong, contact TMDb."},
+    503: {"success": False, "status_code": 9, "status_message": "Service offline - This service is temporarily offline, try again later."},
+}
+_TMDB_INVALID_KEY = {"success": False, "status_code": 7, "status_message": "Invalid API key: You must be granted a valid key."}
+_OMDB_NOT_FOUND = {"Response": "False", "Error": "Incorrect IMDb ID."}
+
+
+def load_fixtures(path):
+    with open(path) as f:
+        fixtures = json.load(f)
+    return {"tmdb": fixtures.get("tmdb", {}), "omdb": fixtures.get("omdb", {})}
+
+
+class FakeUpstream:
+    """A threaded HTTP server answering TMDB and OMDb requests.
+
+    latency_ms plus up to jitter_ms of uniform noise is added to every
+    response; error_rate of them instead fail with one of error_statuses.
+    With fixtures_only, requests missing from fixtures get a not-found
+    response instead of a synthetic one.
+    """
+
+    def __init__(self, graph=None, fixtures=None, fixtures_only=False, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, error_statuses=(429, 500, 503), seed=None, host="127.0.0.1", port=0):
+        self.graph = graph or SyntheticGraph()
+        self.fixtures = fixtures or {"tmdb": {}, "omdb": {}}
+        self.fixtures_only = fixtures_only
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._errors = Counter()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve on a daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        """{"calls": {"tmdb movie/:id/credits": n, ...}, "errors": {...}}"""
+        with self._lock:
+            return {"calls": dict(self._calls), "errors": dict(self._errors)}
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._errors.clear()
+
+    # --- Responses ---
+
+    def _tmdb(self, path, params):
+        if not params.get("api_key"):
+            return 401, _TMDB_INVALID_KEY
+        query = {k: v for k, v in params.items() if k != "api_key"}
+        key = path + ("?" + "&".join(f"{k}={query[k]}" for k in sorted(query)) if query else "")
+        payload = self.fixtures["tmdb"].get(key) or self.fixtures["tmdb"].get(path)
+        if payload is None:
+            payload = NOT_FOUND if self.fixtures_only else self.graph.payload(path, query)
+        return (404 if payload is NOT_FOUND else 200), payload
+
+    def _omdb(self, params):
+        imdb_id = params.get("i", "")
+        payload = self.fixtures["omdb"].get(imdb_id)
+        if payload is None:
+            payload = _OMDB_NOT_FOUND if self.fixtures_only else self.graph.omdb(imdb_id)
+        return 200, payload
+
+    def respond(self, raw_path):
+        """(service, endpoint, status, payload) for a request path with its query string."""
+        url = urlsplit(raw_path)
+        params = dict(parse_qsl(url.query))
+        if url.path.startswith("/3/"):
+            path = url.path[3:].strip("/")
+            service, endpoint = "tmdb", metrics.endpoint(path)
+        else:
+            service, endpoint = "omdb", "title"
+
+        with self._lock:
+            self._calls[f"{service} {endpoint}"] += 1
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            status = self._rng.choice(self.error_statuses) if self._rng.random() < self.error_rate else None
+            if status:
+                self._errors[f"{service} {endpoint}"] += 1
+        if delay:
+            time.sleep(delay)
+
+        if status:
+            body = _TMDB_ERRORS.get(status, _TMDB_ERRORS[500]) if service == "tmdb" else {"Response": "False", "Error": "Server error"}
+            return service, endpoint, status, body
+        if service == "tmdb":
+            return (service, endpoint, *self._tmdb(path, params))
+        return (service, endpoint, *self._omdb(params))
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, payload, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json;charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/__stats":
+                    return self._send(200, upstream.stats())
+                _, _, status, payload = upstream.respond(self.path)
+                self._send(status, payload, [("Retry-After", "1")] if status == 429 else ())
+
+            def do_POST(self):
+                if self.path == "/__reset":
+                    upstream.reset()
+                    return self._send(200, {"reset": True})
+                self._send(405, {"error": "method not allowed"})
+
+            def log_message(self, format, *args):
+                log.debug("%s " + format, self.address_string(), *args)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve fake TMDB and OMDb APIs for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", help="JSON file of recorded responses")
+    parser.add_argument("--fixtures-only", action="store_true", help="answer requests missing from the fixtures with not found")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, action="append", help="statuses injected errors use (default 429, 500, 503)")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic graph seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    upstream = FakeUpstream(
+        graph=SyntheticGraph(seed=args.seed),
+        fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+        fixtures_only=args.fixtures_only,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_statuses=tuple(args.error_status or (429, 500, 503)),
+        host=args.host,
+        port=args.port,
+    )
+    log.info("Serving fake TMDB at %s/3 and OMDb at %s/", upstream.url, upstream.url)
+    try:
+        upstream.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,5 +1,10 @@
-import uuid, itertools, time, math, json, sqlite3, os
+import uuid, itertools, time, math, json, sqlite3, logging, struct
+from flickflock import metrics, storage, tracing
 from collections import Counter, defaultdict
+from flickflock.contributions import contributions
+from flickflock.vectors import DEFAULT_DEPARTMENT_WEIGHT, EntityVector
+
+log = logging.getLogger(__name__)
 
 # Department weights: how much creative influence does this role have
 DEPARTMENT_WEIGHTS = {
@@ -13,31 +18,35 @@ DEPARTMENT_WEIGHTS = {
     "Art": 0.5,
     "Crew": 0.3,
 }
-DEFAULT_DEPARTMENT_WEIGHT = 0.5
 
 # Max entities kept when scoring oversized person-transitive entries.
 # Person expansion can yield 200+ people; keeping only the top contributors
 # prevents key collaborators from being diluted to near-zero.
 _TRANSITIVE_CAP = 50
 
-_DB_PATH = os.environ.get("FLOCK_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "flock.db"))
+_BLOB_LENGTH = struct.Struct("<I")
 
+# Write a full snapshot once this many events have accumulated past the last
+# one, so loads replay a bounded number of events.
+_SNAPSHOT_INTERVAL = 32
 
-def _get_db():
-    db_dir = os.path.dirname(_DB_PATH)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-    conn = sqlite3.connect(_DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS flocks (
-            flock_id TEXT PRIMARY KEY,
-            data TEXT NOT NULL,
-            updated_at REAL NOT NULL
-        )
-    """)
-    conn.commit()
-    return conn
+# How often sync_flock rebases onto a concurrent writer's events and retries.
+_SYNC_RETRIES = 3
+
+def _migrate_capped_entries(conn):
+    rows = conn.execute("SELECT flock_id, data FROM flocks").fetchall()
+    for flock_id, data in rows:
+        flock_data = json.loads(data)
+        flock_data["flock_entries"] = _migrate_entries(flock_data.get("flock_entries", []))
+        conn.execute("UPDATE flocks SET data = ? WHERE flock_id = ?", (json.dumps(flock_data), flock_id))
+
+
+def _migrate_entries_column(conn):
+    # Existing rows keep entries inline in their JSON and are repacked the
+    # next time they're saved; see _unpack_entries.
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(flocks)")}
+    if "entries" not in columns:
+        conn.execute("ALTER TABLE flocks ADD COLUMN entries BLOB")
 
 
 def cast_order_weight(order):
@@ -67,65 +76,445 @@ def compute_entity_weight(entity):
     return base_weight
 
 
+def weigh_entities(entities):
+    """Normalize raw credits (or plain IDs, for backward compat) to weighted entity dicts."""
+    weighted = []
+    for e in entities:
+        if isinstance(e, dict):
+            weighted.append({
+                "id": e["id"],
+                "weight": compute_entity_weight(e),
+                "department": e.get("department", e.get("known_for_department", "")),
+            })
+        else:
+            weighted.append({
+                "id": e,
+                "weight": DEFAULT_DEPARTMENT_WEIGHT,
+                "department": "",
+            })
+    return weighted
+
+
+def cap_transitive(entities):
+    """Merge duplicate people and keep the top _TRANSITIVE_CAP contributors.
+
+    Person expansion can yield 300+ entities across 20 works.  Duplicates are
+    merged by person_id with their weights summed, so a lead actor in 5 of
+    the person's works (3.0 × 5 = 15.0) outranks a one-off director (5.0),
+    naturally surfacing repeat collaborators instead of one-off crew entries.
+    Entries at or under the cap are returned unchanged.
+    """
+    if len(entities) <= _TRANSITIVE_CAP:
+        return entities
+    merged = {}
+    for e in entities:
+        pid = e["id"]
+        if pid in merged:
+            merged[pid]["weight"] += e.get("weight", DEFAULT_DEPARTMENT_WEIGHT)
+        else:
+            merged[pid] = dict(e)  # copy so we don't mutate original
+    return sorted(
+        merged.values(),
+        key=lambda e: e.get("weight", DEFAULT_DEPARTMENT_WEIGHT),
+        reverse=True,
+    )[:_TRANSITIVE_CAP]
+
+
+def build_contribution(entities, source_type):
+    """Build the finished entity-weight vector a seed contributes to a flock."""
+    weighted = weigh_entities(entities)
+    if source_type == "person_transitive":
+        weighted = cap_transitive(weighted)
+    return weighted
+
+
+def _migrate_entries(entries):
+    """Upgrade stored entries: weigh legacy plain-ID lists and cap transitive ones."""
+    migrated = []
+    for entry in entries:
+        if "entities" in entry:
+            entities = entry["entities"]
+            if entities and not isinstance(entities[0], dict):
+                entities = weigh_entities(entities)
+            if entry.get("source_type") == "person_transitive":
+                entities = cap_transitive(entities)
+            entry = {**entry, "entities": entities}
+        migrated.append(entry)
+    return migrated
+
+
+def _migrate_snapshot_version(conn):
+    # Rows saved before the event log are snapshots at version 0
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(flocks)")}
+    if "version" not in columns:
+        conn.execute("ALTER TABLE flocks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_heads_backfill(conn):
+    # Give flocks saved before the event log a head, so retention can find
+    # every flock through the flock_heads.updated_at index
+    conn.execute("""
+        INSERT OR IGNORE INTO flock_heads (flock_id, version, updated_at)
+        SELECT flock_id, version, updated_at FROM flocks
+    """)
+
+
+# Flock state is an append-only event log per flock.  The flocks row holds a
+# periodic snapshot (legacy rows are version 0 snapshots) and flock_entries
+# holds one row per entry added since the snapshot.
+storage.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS flocks (
+        flock_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flock_events (
+        flock_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        payload TEXT,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (flock_id, version)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flock_entries (
+        flock_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        primary_id TEXT NOT NULL,
+        source_type TEXT NOT NULL,
+        seed_key TEXT,
+        entities BLOB,
+        timestamp REAL NOT NULL,
+        PRIMARY KEY (flock_id, version)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flock_heads (
+        flock_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_flock_heads_updated_at
+    ON flock_heads(updated_at)
+    """,
+)
+for table in ("flocks", "flock_events", "flock_entries", "flock_heads"):
+    storage.register_sharded_table(table, "flock_id")
+storage.register_migration("flock_entries_capped", _migrate_capped_entries)
+storage.register_migration("flock_entries_blob", _migrate_entries_column)
+storage.register_migration("flock_snapshot_version", _migrate_snapshot_version)
+storage.register_migration("flock_heads_backfill", _migrate_heads_backfill)
+
+
+def _pack_entries(entries):
+    """Split entries into JSON-able metadata and one blob of packed entity vectors.
+
+    Each inline vector is written as a uint32 byte length followed by its
+    EntityVector bytes, in entry order.  Seed entries reference the shared
+    contribution cache and have nothing to pack.
+    """
+    meta = []
+    chunks = []
+    for entry in entries:
+        meta.append({k: v for k, v in entry.items() if k != "entities"})
+        if "seed_key" not in entry:
+            packed = entry["entities"].to_bytes()
+            chunks.append(_BLOB_LENGTH.pack(len(packed)))
+            chunks.append(packed)
+    return meta, b"".join(chunks)
+
+
+def _unpack_entries(meta, blob):
+    """Rebuild entries from _pack_entries output, or from a pre-blob JSON row."""
+    if blob is None:
+        return [
+            entry if "seed_key" in entry
+            else {**entry, "entities": EntityVector.from_entities(entry.get("entities", []))}
+            for entry in meta
+        ]
+
+    blob = memoryview(blob)
+    offset = 0
+    entries = []
+    for entry in meta:
+        if "seed_key" not in entry:
+            (length,) = _BLOB_LENGTH.unpack_from(blob, offset)
+            offset += _BLOB_LENGTH.size
+            entry = {**entry, "entities": EntityVector.from_bytes(blob[offset:offset + length])}
+            offset += length
+        entries.append(entry)
+    return entries
+
+
+def _entry_from_row(row):
+    _, primary_id, source_type, seed_key, entities, timestamp = row
+    entry = {
+        "timestamp": timestamp,
+        "primary_id": json.loads(primary_id),
+        "source_type": source_type,
+    }
+    if seed_key is not None:
+        entry["seed_key"] = seed_key
+    else:
+        entry["entities"] = EntityVector.from_bytes(entities)
+    return entry
+
+
+def _read_flock(conn, key):
+    """Read a flock's latest snapshot and the events after it ({} if unknown)."""
+    # One read transaction, so a snapshot written concurrently can't fold
+    # away the entry rows of events read against the previous one
+    conn.execute("BEGIN")
+    try:
+        row = conn.execute(
+            "SELECT data, entries, version FROM flocks WHERE flock_id = ?", (key,)
+        ).fetchone()
+        snapshot_version = row[2] if row else 0
+        events = conn.execute(
+            "SELECT version, op, payload FROM flock_events WHERE flock_id = ? AND version > ? ORDER BY version",
+            (key, snapshot_version),
+        ).fetchall()
+        entries = {
+            r[0]: r for r in conn.execute(
+                "SELECT version, primary_id, source_type, seed_key, entities, timestamp "
+                "FROM flock_entries WHERE flock_id = ? AND version > ?",
+                (key, snapshot_version),
+            )
+        }
+    finally:
+        conn.commit()
+    if not row and not events:
+        return {}
+
+    snapshot = None
+    if row:
+        snapshot = json.loads(row[0])
+        snapshot["flock_entries"] = _unpack_entries(snapshot.get("flock_entries", []), row[1])
+        snapshot["version"] = snapshot_version
+
+    decoded = []
+    for version, op, payload in events:
+        if op == "add_entry":
+            payload = _entry_from_row(entries[version])
+        elif payload is not None:
+            payload = json.loads(payload)
+        decoded.append((version, op, payload))
+    return {"snapshot": snapshot, "events": decoded}
+
+
+def _replayed_seed_keys(flock_data):
+    """Seed keys whose vectors replaying flock_data's events reads (person_direct adds)."""
+    return [
+        payload["seed_key"] for _, op, payload in (flock_data or {}).get("events", ())
+        if op == "add_entry" and payload["source_type"] == "person_direct" and "seed_key" in payload
+    ]
+
+
+async def _read_flock_async(key):
+    """_read_flock() on key's database thread, with the seed vectors its replay needs loaded."""
+    flock_data = await storage.read_async(lambda conn: _read_flock(conn, key), key=key)
+    await contributions.prefetch_async(_replayed_seed_keys(flock_data))
+    return flock_data
+
+
+class FlockConflictError(RuntimeError):
+    """Raised when a flock keeps losing the race to concurrent writers."""
+
+
 class Flock:
+    """A flock of people built from a user's selected works and people.
+
+    Mutations are recorded as events and appended to the flock's log on
+    sync_flock, so adding one selection writes a few small rows instead of
+    re-serializing the whole flock.  The log's (flock_id, version) key gives
+    optimistic concurrency: if another writer got there first, the pending
+    events are rebased onto the newer state and retried.
+    """
+
     def __init__(self, name=None, flock_id=None, db_type=None):
-        self.flock = {}
-        self.direct_person_ids = set()
+        self._init(name, flock_id, self._get_from_db(flock_id) if flock_id else None)
 
+    @classmethod
+    async def load_async(cls, name=None, flock_id=None):
+        """Like Flock(name, flock_id), but awaits the load instead of blocking the event loop."""
+        flock_data = None
         if flock_id:
-            flock_data = self._get_from_db(flock_id)
-        else:
-            flock_data = None
+            with metrics.DB_SECONDS.time(op="flock_load"), tracing.span("db_load"):
+                flock_data = await _read_flock_async(flock_id)
+        self = cls.__new__(cls)
+        self._init(name, flock_id, flock_data)
+        return self
+
+    def _init(self, name, flock_id, flock_data):
+        self.flock = {}
+        self._pending = []
+        self._reset()
 
         if flock_data:
-            self.flock_id = flock_data["flock_id"]
-            self.flock_name = flock_data.get("flock_name", "")
-            self.flock_entries = flock_data["flock_entries"]
-            self.selection = flock_data.get("selection", [])
-            self.direct_person_ids = set(flock_data.get("direct_person_ids", []))
-        else:
-            self.flock_id = str(uuid.uuid4())
-            self.flock_name = name
-            self.flock_entries = []
-            self.selection = []
+            self._load_data(flock_id, flock_data)
+            return
+
+        self.flock_id = str(uuid.uuid4())
+        if name:
+            self._record("rename", name)
+
+    def _reset(self):
+        self.flock_name = None
+        self.flock_entries = []
+        self.selection = []
+        self.direct_person_ids = set()
+        self.version = 0
+        self._snapshot_version = 0
+
+    def _load_data(self, flock_id, flock_data):
+        snapshot = flock_data["snapshot"]
+        self.flock_id = flock_id
+        if snapshot:
+            self.flock_name = snapshot.get("flock_name", "")
+            self.flock_entries = snapshot["flock_entries"]
+            self.selection = snapshot.get("selection", [])
+            self.direct_person_ids = set(snapshot.get("direct_person_ids", []))
+            self.version = self._snapshot_version = snapshot["version"]
+
+        for version, op, payload in flock_data["events"]:
+            self._apply(op, payload)
+            self.version = version
 
     def _get_from_db(self, key):
-        conn = _get_db()
+        with metrics.DB_SECONDS.time(op="flock_load"), tracing.span("db_load"), storage.connection(key) as conn:
+            return _read_flock(conn, key)
+
+    def _set_in_db(self, key, events):
+        """Append events after self.version; raises FlockConflictError if that version is taken."""
         try:
-            row = conn.execute("SELECT data FROM flocks WHERE flock_id = ?", (key,)).fetchone()
-            return json.loads(row[0]) if row else {}
-        finally:
-            conn.close()
+            with metrics.DB_SECONDS.time(op="flock_save"), tracing.span("db_save"):
+                storage.write(self._event_writer(key, events), key=key)
+        except sqlite3.IntegrityError:
+            raise FlockConflictError(f"Flock {key} was modified concurrently at version {self.version}")
+        self._advance(len(events))
 
-    def _set_in_db(self, key, value):
-        conn = _get_db()
+    async def _set_in_db_async(self, key, events):
         try:
+            with metrics.DB_SECONDS.time(op="flock_save"), tracing.span("db_save"):
+                await storage.write_async(self._event_writer(key, events), key=key)
+        except sqlite3.IntegrityError:
+            raise FlockConflictError(f"Flock {key} was modified concurrently at version {self.version}")
+        self._advance(len(events))
+
+    def _needs_snapshot(self, version):
+        return version - self._snapshot_version >= _SNAPSHOT_INTERVAL
+
+    def _advance(self, count):
+        self.version += count
+        if self._needs_snapshot(self.version):
+            self._snapshot_version = self.version
+
+    def _event_writer(self, key, events):
+        """Return write(conn), which appends events after self.version."""
+        now = time.time()
+        base_version = self.version
+        snapshot = self._needs_snapshot(base_version + len(events))
+
+        def write(conn):
+            version = base_version
+            for op, payload in events:
+                version += 1
+                if op == "add_entry":
+                    conn.execute(
+                        "INSERT INTO flock_events (flock_id, version, op, payload, created_at) VALUES (?, ?, ?, NULL, ?)",
+                        (key, version, op, now),
+                    )
+                    conn.execute(
+                        "INSERT INTO flock_entries (flock_id, version, primary_id, source_type, seed_key, entities, timestamp) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, version, json.dumps(payload["primary_id"]), payload["source_type"],
+                         payload.get("seed_key"),
+                         payload["entities"].to_bytes() if "entities" in payload else None,
+                         payload["timestamp"]),
+                    )
+                else:
+                    conn.execute(
+                        "INSERT INTO flock_events (flock_id, version, op, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, version, op, json.dumps(payload), now),
+                    )
             conn.execute(
-                "INSERT OR REPLACE INTO flocks (flock_id, data, updated_at) VALUES (?, ?, ?)",
-                (key, json.dumps(value), time.time()),
+                "INSERT OR REPLACE INTO flock_heads (flock_id, version, updated_at) VALUES (?, ?, ?)",
+                (key, version, now),
             )
-            conn.commit()
-        finally:
-            conn.close()
+            if snapshot:
+                self._write_snapshot(conn, key, version, now)
+
+        return write
+
+    def _write_snapshot(self, conn, key, version, now):
+        # Called with the events up to version already applied in memory.
+        # Entry rows up to the snapshot are folded into its blob; the event
+        # log itself is never rewritten.
+        meta, blob = _pack_entries(self.flock_entries)
+        conn.execute(
+            "INSERT OR REPLACE INTO flocks (flock_id, data, entries, updated_at, version) VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps({
+                "flock_id": key,
+                "flock_entries": meta,
+                "flock_name": self.flock_name,
+                "selection": self.selection,
+                "direct_person_ids": list(self.direct_person_ids),
+            }), blob, now, version),
+        )
+        conn.execute("DELETE FROM flock_entries WHERE flock_id = ? AND version <= ?", (key, version))
+
+    def _record(self, op, payload):
+        self._apply(op, payload)
+        self._pending.append((op, payload))
+
+    def _apply(self, op, payload):
+        """Apply one event to the in-memory state (used for both live mutations and replay)."""
+        if op == "add_selection":
+            self.selection.append(payload)
+        elif op == "remove_selection":
+            self.selection = [s for s in self.selection if s.get("id") != payload]
+            self.flock_entries = [
+                e for e in self.flock_entries if e.get("primary_id") != payload
+            ]
+            self.direct_person_ids.discard(payload)
+        elif op == "add_entry":
+            if payload["source_type"] == "person_direct":
+                self.direct_person_ids.update(self._entry_entities(payload).ids)
+            self.flock_entries.append(payload)
+        elif op == "remove_entry":
+            if isinstance(payload, int):
+                # Logged before entries were identified by content
+                self.flock_entries.pop(payload)
+            else:
+                for i, entry in enumerate(self.flock_entries):
+                    if all(entry.get(k) == v for k, v in payload.items()):
+                        del self.flock_entries[i]
+                        break
+        elif op == "rename":
+            self.flock_name = payload
+        else:
+            raise ValueError(f"Unknown flock event: {op}")
 
     def set_flock_name(self, name):
-        self.flock_name = name
+        self._record("rename", name)
 
     def get_flock_id(self):
         return self.flock_id
 
     def update_selection(self, selection):
-        self.selection.append(selection)
+        self._record("add_selection", selection)
 
     def get_selection(self):
         return self.selection
 
     def remove_selection(self, selection_id):
-        self.selection = [s for s in self.selection if s.get("id") != selection_id]
-        self.flock_entries = [
-            e for e in self.flock_entries if e.get("primary_id") != selection_id
-        ]
-        self.direct_person_ids.discard(selection_id)
+        self._record("remove_selection", selection_id)
 
     def add_to_flock(self, entities, primary_id="", source_type="movie"):
         """Add entities to the flock.
@@ -138,47 +527,90 @@ class Flock:
         if not isinstance(entities, list):
             entities = [entities]
 
-        # Normalize to weighted entity dicts
-        weighted = []
-        for e in entities:
-            if isinstance(e, dict):
-                weighted.append({
-                    "id": e["id"],
-                    "weight": compute_entity_weight(e),
-                    "department": e.get("department", e.get("known_for_department", "")),
-                })
-            else:
-                weighted.append({
-                    "id": e,
-                    "weight": DEFAULT_DEPARTMENT_WEIGHT,
-                    "department": "",
-                })
+        # Transitive entries are merged and capped here, once, rather than on
+        # every score — person expansion can yield 300+ raw entities.
+        weighted = build_contribution(entities, source_type)
+
+        self._record("add_entry", {
+            "entities": EntityVector.from_entities(weighted),
+            "timestamp": time.time(),
+            "primary_id": primary_id,
+            "source_type": source_type,
+        })
 
-        if source_type == "person_direct":
-            for e in weighted:
-                self.direct_person_ids.add(e["id"])
+    def add_seed_to_flock(self, seed_key, primary_id="", source_type="movie"):
+        """Add a cached seed contribution to the flock by reference.
 
-        self.flock_entries.append({
-            "entities": weighted,
+        The entity-weight vector lives in the shared contribution cache, so
+        the flock only stores its key instead of a copy of every entity.
+        """
+        self._record("add_entry", {
+            "seed_key": seed_key,
             "timestamp": time.time(),
             "primary_id": primary_id,
             "source_type": source_type,
         })
 
+    def _entry_entities(self, entry):
+        if "seed_key" not in entry:
+            return entry["entities"]
+        entities = contributions.get(entry["seed_key"])
+        if entities is None:
+            log.warning("Missing seed contribution %s in flock %s", entry["seed_key"], self.flock_id)
+            return EntityVector()
+        return entities
+
     def remove_from_flock(self, index):
-        self.flock_entries.pop(index)
+        """Remove the entry at index in flock_entries.
 
-    def sync_flock(self):
-        if self.flock_id:
-            flock_current = {
-                "flock_id": self.flock_id,
-                "flock_entries": self.flock_entries,
-                "flock_name": self.flock_name,
-                "selection": self.selection,
-                "direct_person_ids": list(self.direct_person_ids),
-            }
-            self._set_in_db(self.flock_id, flock_current)
+        The event identifies the entry by its primary id, source type, seed
+        key and timestamp rather than by position, so it removes the same
+        entry when rebased onto entries added concurrently.
+        """
+        entry = self.flock_entries[index]
+        self._record("remove_entry", {
+            k: entry[k] for k in ("primary_id", "source_type", "seed_key", "timestamp") if k in entry
+        })
+
+    def _rebase(self, flock_data):
+        """Reset to the latest stored state and re-apply pending events on top of it."""
+        pending = self._pending
+        self._reset()
+        if flock_data:
+            self._load_data(self.flock_id, flock_data)
+        for op, payload in pending:
+            self._apply(op, payload)
+        self._pending = pending
 
+    def sync_flock(self):
+        if not self.flock_id or not self._pending:
+            return
+        for attempt in range(_SYNC_RETRIES):
+            try:
+                self._set_in_db(self.flock_id, self._pending)
+                self._pending = []
+                return
+            except FlockConflictError:
+                log.info("Flock %s changed concurrently, rebasing (attempt %d)", self.flock_id, attempt + 1)
+                self._rebase(self._get_from_db(self.flock_id))
+        raise FlockConflictError(f"Gave up syncing flock {self.flock_id} after {_SYNC_RETRIES} attempts")
+
+    async def sync_flock_async(self):
+        """Like sync_flock, but awaits storage instead of blocking the event loop."""
+        if not self.flock_id or not self._pending:
+            return
+        for attempt in range(_SYNC_RETRIES):
+            try:
+                await self._set_in_db_async(self.flock_id, self._pending)
+                self._pending = []
+                return
+            except FlockConflictError:
+                log.info("Flock %s changed concurrently, rebasing (attempt %d)", self.flock_id, attempt + 1)
+                self._rebase(await _read_flock_async(self.flock_id))
+        raise FlockConflictError(f"Gave up syncing flock {self.flock_id} after {_SYNC_RETRIES} attempts")
+
+    @metrics.SCORING_SECONDS.time(stage="score_flock")
+    @tracing.span("score_flock")
     def score_flock(self):
         """Score flock members using weighted, normalized scoring with TF-IDF."""
         self.sync_flock()
@@ -187,41 +619,18 @@ class Flock:
         person_entry_count = defaultdict(int)
 
         for entry in self.flock_entries:
-            entities = entry.get("entities", [])
+            # Entries are stored weighted and capped (see add_to_flock and
+            # _migrate_entries), so they can be scored as-is.
+            entities = self._entry_entities(entry)
 
-            # Backward compat: old entries stored plain ID lists
-            if entities and not isinstance(entities[0], dict):
-                entities = [{"id": e, "weight": DEFAULT_DEPARTMENT_WEIGHT} for e in entities]
-
-            # For large transitive entries (person expansion can yield 300+
-            # entities across 20 works), merge duplicates by person_id and sum
-            # their weights, then keep only the top contributors.  Summing
-            # means a lead actor in 5 Statham works (3.0 × 5 = 15.0) outranks
-            # a one-off director (5.0), naturally surfacing repeat collaborators
-            # instead of being dominated by one-off crew entries.
-            source_type = entry.get("source_type", "")
-            if source_type == "person_transitive" and len(entities) > _TRANSITIVE_CAP:
-                merged = {}
-                for e in entities:
-                    pid = e["id"]
-                    if pid in merged:
-                        merged[pid]["weight"] += e.get("weight", DEFAULT_DEPARTMENT_WEIGHT)
-                    else:
-                        merged[pid] = dict(e)  # copy so we don't mutate original
-                entities = sorted(
-                    merged.values(),
-                    key=lambda e: e.get("weight", DEFAULT_DEPARTMENT_WEIGHT),
-                    reverse=True,
-                )[:_TRANSITIVE_CAP]
+            weights = entities.weights
 
             # Normalize: each selection contributes a budget of 1.0
-            total_weight = sum(e.get("weight", DEFAULT_DEPARTMENT_WEIGHT) for e in entities)
+            total_weight = sum(weights)
             if total_weight == 0:
                 continue
 
-            for e in entities:
-                person_id = e["id"] if isinstance(e, dict) else e
-                raw_weight = e.get("weight", DEFAULT_DEPARTMENT_WEIGHT)
+            for person_id, raw_weight in zip(entities.ids, weights):
                 normalized = raw_weight / total_weight
                 person_scores[person_id] += normalized
                 person_entry_count[person_id] += 1
@@ -257,11 +666,22 @@ class Flock:
         else:
             return {pid: round(score, 4) for pid, score in items}
 
-    def get_flock_works(self, get_works_function, unique_work_key="id", most_common=None):
-        """Score works by weighted flock member collaboration with direct-selection boost."""
+    @metrics.SCORING_SECONDS.time(stage="get_flock_works")
+    @tracing.span("get_flock_works")
+    def get_flock_works(self, get_works_function, unique_work_key="id", most_common=None,
+                        filters=(), multipliers=()):
+        """Score works by weighted flock member collaboration with direct-selection boost.
+
+        filters are predicates on a candidate work: a work any of them
+        rejects (judged on its first occurrence) is dropped before it is
+        scored or copied.  multipliers map a work to a score factor, or None
+        to leave it alone; each is applied in order to the rounded count and
+        rounded again.
+        """
         flock_scores = self.get_flock(most_common=most_common)
 
         works_by_id = {}
+        rejected = set()
         works_member_scores = defaultdict(dict)  # {work_id: {person_id: score}}
         works_member_roles = defaultdict(lambda: defaultdict(list))  # {work_id: {person_id: [roles]}}
         works_direct_boost = defaultdict(float)
@@ -276,6 +696,11 @@ class Flock:
             for w in works:
                 wid = w[unique_work_key]
                 if wid not in works_by_id:
+                    if wid in rejected:
+                        continue
+                    if not all(f(w) for f in filters):
+                        rejected.add(wid)
+                        continue
                     works_by_id[wid] = w
                 works_member_scores[wid][person_id] = score
 
@@ -286,6 +711,9 @@ class Flock:
                 if person_id in self.direct_person_ids:
                     works_direct_boost[wid] += 0.5
 
+        metrics.FLOCK_WORKS.observe(len(works_by_id) + len(rejected), kind="candidates")
+        metrics.FLOCK_WORKS.observe(len(works_by_id), kind="scored")
+
         results = []
         for wid, work_data in works_by_id.items():
             weighted_score = sum(works_member_scores[wid].values())
@@ -315,14 +743,21 @@ class Flock:
                     "role": ", ".join(roles[:2]) if roles else "",
                 })
 
-            # Strip internal fields (keep _genre_ids for downstream filtering)
-            clean_data = {k: v for k, v in work_data.items()
-                          if not k.startswith("_") or k == "_genre_ids"}
+            count = base_count = round(score, 2)
+            for multiplier in multipliers:
+                factor = multiplier(work_data)
+                if factor is not None:
+                    count = round(count * factor, 2)
 
-            results.append({
-                "count": round(score, 2),
+            # Strip internal fields
+            clean_data = {k: v for k, v in work_data.items() if not k.startswith("_")}
+
+            results.append((base_count, {
+                "count": count,
                 "connected_member_ids": connected_with_roles,
                 **clean_data,
-            })
+            }))
 
-        return sorted(results, key=lambda x: x["count"], reverse=True)
+        # Ties on the final count keep their order by unadjusted count
+        results.sort(key=lambda x: (x[1]["count"], x[0]), reverse=True)
+        return [work for _, work in results]
@@ -0,0 +1,281 @@
+"""Retention and compaction for flock storage.
+
+Every visit to /api/flock without an id starts a new flock, and most are
+never touched again.  expire_flocks() archives flocks that haven't been
+updated for FLOCK_RETENTION_DAYS into a compressed archive database and
+deletes them; collect_contributions() deletes seed contribution versions
+no flock references any more; vacuum() then returns the freed pages to
+the filesystem and truncates the WAL.  run() does all three for every
+shard and reports what was reclaimed, and start_background() repeats it on a timer in whichever
+worker holds the maintenance lease.
+
+Database files created before auto_vacuum=INCREMENTAL need one full VACUUM,
+which rewrites the whole file under an exclusive lock, before freed pages
+can be released.  Only the CLI does that conversion:
+
+    python -m flickflock.maintenance --convert
+"""
+import json, logging, os, socket, sqlite3, threading, time, zlib
+from flickflock import storage
+from flickflock.contributions import SEED_MAX_AGE
+from flickflock.flock import Flock
+
+log = logging.getLogger(__name__)
+
+RETENTION_DAYS = float(os.environ.get("FLOCK_RETENTION_DAYS", 90))
+MAINTENANCE_INTERVAL = float(os.environ.get("FLOCK_MAINTENANCE_INTERVAL", 3600))
+_ARCHIVE_PATH = os.environ.get(
+    "FLOCK_ARCHIVE_PATH",
+    os.path.join(os.path.dirname(storage._DB_PATH), "flock-archive.db"),
+)
+
+# Flocks archived per transaction, so expiry never holds the write lock long
+_BATCH_SIZE = 200
+
+# Pages freed per incremental_vacuum call
+_VACUUM_PAGES = 2000
+
+_FLOCK_TABLES = ("flock_events", "flock_entries", "flocks")
+
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+storage.register_schema("""
+    CREATE TABLE IF NOT EXISTS maintenance_lease (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+""")
+
+
+def _get_archive_db():
+    db_dir = os.path.dirname(_ARCHIVE_PATH)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(_ARCHIVE_PATH)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS flock_archive (
+            flock_id TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at REAL NOT NULL,
+            archived_at REAL NOT NULL
+        )
+    """)
+    conn.commit()
+    return conn
+
+
+def _archive_document(flock):
+    return {
+        "flock_id": flock.flock_id,
+        "flock_name": flock.flock_name,
+        "version": flock.version,
+        "selection": flock.selection,
+        "direct_person_ids": list(flock.direct_person_ids),
+        "flock_entries": [
+            {k: (v.to_list() if k == "entities" else v) for k, v in entry.items()}
+            for entry in flock.flock_entries
+        ],
+    }
+
+
+def load_archived(flock_id):
+    """Return an archived flock's document, or None."""
+    conn = _get_archive_db()
+    try:
+        row = conn.execute("SELECT data FROM flock_archive WHERE flock_id = ?", (flock_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(zlib.decompress(row[0])) if row else None
+
+
+def expire_flocks(db, max_age_days=RETENTION_DAYS, dry_run=False):
+    """Archive and delete flocks in db not updated for max_age_days. Returns the number expired."""
+    cutoff = time.time() - max_age_days * 24 * 3600
+    if dry_run:
+        with db.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM flock_heads WHERE updated_at < ?", (cutoff,)
+            ).fetchone()[0]
+
+    expired = 0
+    while True:
+        with db.connection() as conn:
+            rows = conn.execute(
+                "SELECT flock_id, updated_at FROM flock_heads WHERE updated_at < ? ORDER BY updated_at LIMIT ?",
+                (cutoff, _BATCH_SIZE),
+            ).fetchall()
+        if not rows:
+            return expired
+
+        archive = _get_archive_db()
+        try:
+            with archive:
+                archive.executemany(
+                    "INSERT OR REPLACE INTO flock_archive (flock_id, data, updated_at, archived_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (flock_id, zlib.compress(json.dumps(_archive_document(Flock(flock_id=flock_id))).encode()),
+                         updated_at, time.time())
+                        for flock_id, updated_at in rows
+                    ],
+                )
+        finally:
+            archive.close()
+
+        deleted = 0
+        with db.connection() as conn, conn:
+            for flock_id, _ in rows:
+                # Skip flocks that were touched after we archived them
+                if conn.execute(
+                    "DELETE FROM flock_heads WHERE flock_id = ? AND updated_at < ?", (flock_id, cutoff)
+                ).rowcount == 0:
+                    continue
+                for table in _FLOCK_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE flock_id = ?", (flock_id,))
+                deleted += 1
+        expired += deleted
+        if len(rows) < _BATCH_SIZE or deleted == 0:
+            return expired
+
+
+def _referenced_seed_keys():
+    """Seed version keys used by any live or archived flock entry."""
+    keys = set()
+    for db in storage.shards():
+        with db.connection() as conn:
+            keys.update(row[0] for row in conn.execute(
+                "SELECT DISTINCT seed_key FROM flock_entries WHERE seed_key IS NOT NULL"
+            ))
+            for (data,) in conn.execute("SELECT data FROM flocks"):
+                keys.update(e["seed_key"] for e in json.loads(data).get("flock_entries", ()) if "seed_key" in e)
+    archive = _get_archive_db()
+    try:
+        for (data,) in archive.execute("SELECT data FROM flock_archive"):
+            document = json.loads(zlib.decompress(data))
+            keys.update(e["seed_key"] for e in document.get("flock_entries", ()) if "seed_key" in e)
+    finally:
+        archive.close()
+    return keys
+
+
+def collect_contributions(max_age=SEED_MAX_AGE, dry_run=False):
+    """Delete seed contribution versions nothing references. Returns the number deleted.
+
+    A version is kept while seed_versions points at it or any live or
+    archived flock entry uses it.  Versions younger than max_age are kept
+    too: a worker may still be adding them from its in-memory head.
+    """
+    cutoff = time.time() - max_age
+    with storage.connection() as conn:
+        candidates = [row[0] for row in conn.execute(
+            "SELECT seed_key FROM seed_contributions WHERE updated_at < ? "
+            "AND seed_key NOT IN (SELECT version_key FROM seed_versions)",
+            (cutoff,),
+        )]
+    if not candidates:
+        return 0
+    referenced = _referenced_seed_keys()
+    unused = [(key,) for key in candidates if key not in referenced]
+    if unused and not dry_run:
+        storage.write(lambda conn: conn.executemany("DELETE FROM seed_contributions WHERE seed_key = ?", unused))
+    return len(unused)
+
+
+def _file_size(path):
+    return sum(
+        os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)
+    )
+
+
+def vacuum(db, convert=False):
+    """Release free pages and truncate the WAL. Returns bytes reclaimed on disk.
+
+    Files not yet in incremental auto_vacuum mode are only converted (with a
+    full VACUUM) when convert is set; otherwise just the WAL is truncated.
+    """
+    before = _file_size(db.path)
+    with db.connection() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+                conn.execute(f"PRAGMA incremental_vacuum({_VACUUM_PAGES})").fetchall()
+        elif convert:
+            log.info("Converting %s to incremental auto_vacuum", db.path)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            log.info("%s is not in incremental auto_vacuum mode; run maintenance with --convert", db.path)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return before - _file_size(db.path)
+
+
+def run(max_age_days=RETENTION_DAYS, dry_run=False, convert=False):
+    """Expire old flocks, collect unused contributions and vacuum every shard. Returns a report per shard."""
+    report = []
+    # Contributions live on shard 0, which reports them
+    collected = collect_contributions(dry_run=dry_run)
+    for db in storage.shards():
+        started = time.time()
+        expired = expire_flocks(db, max_age_days, dry_run=dry_run)
+        reclaimed = 0 if dry_run else vacuum(db, convert=convert)
+        report.append({
+            "path": db.path,
+            "expired_flocks": expired,
+            "collected_contributions": collected if db is storage.default else 0,
+            "reclaimed_bytes": reclaimed,
+            "size_bytes": _file_size(db.path),
+            "seconds": round(time.time() - started, 3),
+        })
+        log.info(
+            "Maintenance on %s: expired %d flocks, reclaimed %d bytes",
+            db.path, expired, reclaimed,
+        )
+    return report
+
+
+def acquire_lease(duration, owner=_WORKER):
+    """Take or renew the maintenance lease for duration seconds. Returns whether owner holds it."""
+    now = time.time()
+    return storage.write(lambda conn: conn.execute("""
+        INSERT INTO maintenance_lease (name, owner, expires_at) VALUES ('maintenance', ?, ?)
+        ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+        WHERE maintenance_lease.owner = excluded.owner OR maintenance_lease.expires_at < ?
+    """, (owner, now + duration, now)).rowcount == 1)
+
+
+def start_background(interval=MAINTENANCE_INTERVAL):
+    """Run maintenance every interval seconds on a daemon thread (0 disables).
+
+    Every worker starts the loop, but only the one holding the lease runs
+    maintenance; the lease outlives one missed run, so another worker takes
+    over if its holder exits.
+    """
+    if not interval:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                if acquire_lease(2 * interval):
+                    run()
+            except Exception:
+                log.exception("Flock maintenance failed")
+
+    thread = threading.Thread(target=loop, name="flock-maintenance", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Expire, archive and vacuum old flocks")
+    parser.add_argument("--days", type=float, default=RETENTION_DAYS)
+    parser.add_argument("--dry-run", action="store_true", help="only count expired flocks")
+    parser.add_argument(
+        "--convert", action="store_true",
+        help="switch older files to incremental auto_vacuum (a full VACUUM; stop the server first)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(run(args.days, dry_run=args.dry_run, convert=args.convert), indent=2))
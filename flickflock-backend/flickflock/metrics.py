@@ -0,0 +1,258 @@
+"""In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Counters and histograms are updated under a lock, so they are safe to use
+from request threads, the expansion pool and the database threads.  Each
+worker process also publishes its values to the metrics_workers table
+every PUBLISH_INTERVAL seconds; render() sums every recently published
+worker, so a scrape that lands on any one worker sees the whole server.
+"""
+import json, logging, os, re, socket, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+from flickflock import storage
+
+log = logging.getLogger(__name__)
+
+PUBLISH_INTERVAL = float(os.environ.get("FLOCK_METRICS_PUBLISH_INTERVAL", 10))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+storage.register_schema("""
+    CREATE TABLE IF NOT EXISTS metrics_workers (
+        worker TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+""")
+
+_lock = threading.Lock()
+_registry = []
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = defaultdict(float)
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[l] for l in self.labels)
+        with _lock:
+            self._values[key] += amount
+
+    def _snapshot(self):
+        return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def _merge(a, b):
+        return a + b
+
+    def _lines(self, series):
+        for key, value in series.items():
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # {labels: [count per bucket..., count above the last bucket, sum]}
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[l] for l in self.labels)
+        index = next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+        with _lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _snapshot(self):
+        return [[list(k), list(v)] for k, v in self._values.items()]
+
+    @staticmethod
+    def _merge(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def _lines(self, series):
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                labels = _labels((*self.labels, "le"), (*key, _number(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(values[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+_ID = re.compile(r"\d+")
+
+
+def endpoint(path):
+    """Collapse ids in an API path, e.g. 'movie/603/credits' -> 'movie/:id/credits'."""
+    return _ID.sub(":id", path)
+
+
+# --- Metrics ---
+
+UPSTREAM_SECONDS = Histogram(
+    "flickflock_upstream_request_seconds",
+    "Upstream API call latency; _count is the number of calls.",
+    ("service", "endpoint"),
+)
+CACHE_LOOKUPS = Counter(
+    "flickflock_cache_lookups_total",
+    "Cache lookups by result: l1_hit (in-process), l2_hit (disk/SQLite), inflight (joined a running build) or miss.",
+    ("cache", "result"),
+)
+SEARCHES = Counter(
+    "flickflock_searches_total",
+    "Searches by how they were answered: index, refined (from a complete prefix's results), upstream (request cache or TMDB) or superseded (dropped).",
+    ("source",),
+)
+DB_SECONDS = Histogram(
+    "flickflock_db_seconds",
+    "SQLite load and save durations.",
+    ("op",),
+)
+SCORING_SECONDS = Histogram(
+    "flickflock_scoring_seconds",
+    "Flock scoring durations.",
+    ("stage",),
+)
+FLOCK_WORKS = Histogram(
+    "flickflock_flock_works",
+    "Works per get_flock_works call: candidates seen and works scored.",
+    ("kind",),
+    buckets=COUNT_BUCKETS,
+)
+
+
+# --- Collection ---
+
+def snapshot():
+    """This process's values as a JSON-serializable dict."""
+    with _lock:
+        return {m.name: m._snapshot() for m in _registry}
+
+
+def publish():
+    """Store this process's values for other workers' scrapes."""
+    data = json.dumps(snapshot())
+    storage.write(lambda conn: conn.execute(
+        "INSERT OR REPLACE INTO metrics_workers (worker, data, updated_at) VALUES (?, ?, ?)",
+        (_WORKER, data, time.time()),
+    ))
+
+
+def collect():
+    """{metric name: {labels: value}} summed over every live worker."""
+    snapshots = {_WORKER: snapshot()}
+    cutoff = time.time() - 3 * PUBLISH_INTERVAL
+    with storage.connection() as conn:
+        for worker, data in conn.execute(
+            "SELECT worker, data FROM metrics_workers WHERE updated_at >= ?", (cutoff,)
+        ):
+            snapshots.setdefault(worker, json.loads(data))
+
+    merged = {m.name: {} for m in _registry}
+    for metric in _registry:
+        series = merged[metric.name]
+        for data in snapshots.values():
+            for key, value in data.get(metric.name, []):
+                key = tuple(key)
+                series[key] = metric._merge(series[key], value) if key in series else value
+    return merged
+
+
+def hit_ratios(merged):
+    """{cache: share of lookups that were hits}"""
+    totals, hits = defaultdict(float), defaultdict(float)
+    for (cache, result), count in merged[CACHE_LOOKUPS.name].items():
+        totals[cache] += count
+        if result != "miss":
+            hits[cache] += count
+    return {cache: hits[cache] / total for cache, total in totals.items() if total}
+
+
+def render(gauges=()):
+    """The Prometheus text exposition of every metric, plus gauges.
+
+    gauges: (name, help, {labels: value}, label names) tuples computed at
+    scrape time, e.g. cache sizes, which are not summed across workers.
+    """
+    merged = collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric._lines(merged[metric.name]))
+
+    gauges = [
+        ("flickflock_cache_hit_ratio", "Share of cache lookups that were hits.",
+         {(cache,): ratio for cache, ratio in hit_ratios(merged).items()}, ("cache",)),
+        *gauges,
+    ]
+    for name, help, series, label_names in gauges:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in series.items():
+            lines.append(f"{name}{_labels(label_names, key)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_publisher(interval=PUBLISH_INTERVAL):
+    """Publish this worker's values every interval seconds on a daemon thread (0 disables)."""
+    if not interval:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                publish()
+            except Exception:
+                log.exception("Publishing metrics failed")
+
+    thread = threading.Thread(target=loop, name="flock-metrics", daemon=True)
+    thread.start()
+    return thread
+
+
+def reset():
+    """Clear this process's values (for tests)."""
+    with _lock:
+        for metric in _registry:
+            metric._values.clear()
@@ -1,9 +1,9 @@
 import logging
 import os
 import re
-import requests
 import xxhash
-from diskcache import Cache
+from flickflock import metrics, request_cache, tracing
+from flickflock.transport import default_transport
 
 log = logging.getLogger(__name__)
 
@@ -11,14 +11,14 @@ log = logging.getLogger(__name__)
 class OMDb:
     """Lightweight OMDb API client with disk caching."""
 
-    cache = Cache('.requests', statistics=True)
-
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, transport=None):
         self.api_key = api_key or os.environ.get("OMDB_API_KEY")
         if not self.api_key:
             log.warning("No OMDB_API_KEY configured; OMDb enrichment disabled")
-        self.base_url = "https://www.omdbapi.com/"
+        self.base_url = os.environ.get("OMDB_BASE_URL", "https://www.omdbapi.com/")
+        self.transport = transport or default_transport()
 
+    @tracing.span("omdb")
     def get_by_imdb_id(self, imdb_id: str) -> dict | None:
         """Fetch movie/show data from OMDb by IMDB ID. Returns None on failure."""
         if not self.api_key or not imdb_id:
@@ -28,17 +28,19 @@ class OMDb:
         request_id = xxhash.xxh3_64_hexdigest(url)
 
         # Check cache
-        cached = self.cache.get(request_id)
+        cached = request_cache.namespace("omdb").get(request_id)
         if cached:
+            metrics.CACHE_LOOKUPS.inc(cache="omdb", result="l2_hit")
             return cached.get("data")
+        metrics.CACHE_LOOKUPS.inc(cache="omdb", result="miss")
 
         try:
-            resp = requests.get(url, timeout=5)
-            data = resp.json()
+            with metrics.UPSTREAM_SECONDS.time(service="omdb", endpoint="title"):
+                data = self.transport.fetch("omdb", "GET", url, timeout=5)
             if data.get("Response") == "False":
                 log.debug("OMDb returned no result for %s", imdb_id)
                 return None
-            self.cache.set(request_id, {"data": data}, expire=7 * 24 * 3600)
+            request_cache.namespace("omdb").set(request_id, {"data": data}, expire=7 * 24 * 3600)
             return data
         except Exception:
             log.warning("OMDb request failed for %s", imdb_id, exc_info=True)
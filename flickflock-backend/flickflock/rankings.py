@@ -0,0 +1,216 @@
+import bisect, logging, os, threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError
+from flickflock import metrics
+
+log = logging.getLogger(__name__)
+
+# Background workers precomputing rankings after flock mutations
+MATERIALIZER_WORKERS = int(os.environ.get("FLOCK_MATERIALIZER_WORKERS", 2))
+# Seconds /results waits for a build in flight before building the ranking itself
+MATERIALIZER_WAIT = float(os.environ.get("FLOCK_MATERIALIZER_WAIT", 5))
+
+
+def _year(work):
+    date = work.get("release_date") or work.get("first_air_date") or ""
+    return int(date[:4]) if date[:4].isdigit() else None
+
+
+class Ranking:
+    """A flock's full, scored list of works with precomputed facet indexes.
+
+    Built once per flock version, so filtering, re-sorting and paging only
+    walk these indexes and never re-score.  Works are shared between
+    requests and must not be mutated.
+    """
+
+    # Sort key -> key function; every order is descending and ties keep
+    # their score order.
+    SORTS = {
+        "score": None,
+        "popularity": lambda w: w.get("popularity") or 0,
+        "release_date": lambda w: w.get("release_date") or w.get("first_air_date") or "",
+    }
+
+    def __init__(self, works):
+        self.works = works
+        positions = range(len(works))
+        self._orders = {
+            sort: list(positions) if key is None
+            else sorted(positions, key=lambda i: key(works[i]), reverse=True)
+            for sort, key in self.SORTS.items()
+        }
+        self._by_genre = defaultdict(set)
+        self._by_media_type = defaultdict(set)
+        years = []
+        for i, work in enumerate(works):
+            for genre in work.get("genre_ids") or []:
+                self._by_genre[genre].add(i)
+            self._by_media_type[work.get("media_type")].add(i)
+            year = _year(work)
+            if year is not None:
+                years.append((year, i))
+        years.sort()
+        self._years = years
+        self._year_keys = [y for y, _ in years]
+
+    def __len__(self):
+        return len(self.works)
+
+    def _matching(self, genre, media_type, year_from, year_to):
+        """Positions passing every given filter, or None when nothing is filtered."""
+        sets = []
+        if genre is not None:
+            sets.append(self._by_genre.get(genre, set()))
+        if media_type is not None:
+            sets.append(self._by_media_type.get(media_type, set()))
+        if year_from is not None or year_to is not None:
+            lo = bisect.bisect_left(self._year_keys, year_from) if year_from is not None else 0
+            hi = bisect.bisect_right(self._year_keys, year_to) if year_to is not None else len(self._years)
+            sets.append({i for _, i in self._years[lo:hi]})
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def query(self, genre=None, media_type=None, year_from=None, year_to=None,
+              sort="score", limit=50, cursor=None):
+        """Return (works, next_cursor, total) for one page of the filtered ranking.
+
+        cursor is the next_cursor of the previous page (for the same filters
+        and sort); next_cursor is None on the last page.
+        """
+        order = self._orders[sort]
+        matching = self._matching(genre, media_type, year_from, year_to)
+        total = len(self.works) if matching is None else len(matching)
+
+        page = []
+        start = cursor or 0
+        for offset in range(start, len(order)):
+            i = order[offset]
+            if matching is not None and i not in matching:
+                continue
+            if len(page) == limit:
+                return page, offset, total
+            page.append(self.works[i])
+        return page, None, total
+
+
+class RankingCache:
+    """In-process LRU of Rankings keyed by (flock_id, version).
+
+    A flock's version changes on every mutation, so a cached ranking never
+    goes stale; old versions simply age out.
+    """
+
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, flock_id, version):
+        with self._lock:
+            ranking = self._lru.get((flock_id, version))
+            if ranking is not None:
+                self._lru.move_to_end((flock_id, version))
+            return ranking
+
+    def set(self, flock_id, version, ranking):
+        with self._lock:
+            self._lru[(flock_id, version)] = ranking
+            self._lru.move_to_end((flock_id, version))
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+        return ranking
+
+    def get_or_build(self, flock_id, version, build):
+        """Return the cached Ranking, calling build() for its works on a miss."""
+        ranking = self.get(flock_id, version)
+        if ranking is None:
+            ranking = self.set(flock_id, version, Ranking(build()))
+        return ranking
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+
+class Materializer:
+    """Precomputes rankings for new flock versions in the background.
+
+    Users usually open results right after changing their flock, so each
+    mutation submits the new version here and /results finds it ready (or
+    waits for the build already in flight instead of starting another).
+    At most one build per flock is tracked: re-submitting the same version
+    is a no-op, and a newer version cancels a pending older one and keeps a
+    running one from being cached.
+    """
+
+    def __init__(self, cache, max_workers=MATERIALIZER_WORKERS, wait=MATERIALIZER_WAIT):
+        self.cache = cache
+        self.wait = wait
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="flock-materializer")
+        self._lock = threading.Lock()
+        self._inflight = {}  # {flock_id: (version, future)}
+
+    def submit(self, flock_id, version, build):
+        """Build and cache flock_id's ranking at version; build() returns its works, or None to skip."""
+        with self._lock:
+            current = self._inflight.get(flock_id)
+            if current is not None:
+                current_version, future = current
+                if current_version >= version:
+                    return future
+                future.cancel()
+            if self.cache.get(flock_id, version) is not None:
+                return None
+            future = self._pool.submit(self._run, flock_id, version, build)
+            self._inflight[flock_id] = (version, future)
+            return future
+
+    def _superseded(self, flock_id, version):
+        with self._lock:
+            current = self._inflight.get(flock_id)
+            return current is not None and current[0] > version
+
+    def _run(self, flock_id, version, build):
+        try:
+            if self._superseded(flock_id, version):
+                return None
+            works = build()
+            if works is None or self._superseded(flock_id, version):
+                return None
+            return self.cache.set(flock_id, version, Ranking(works))
+        except Exception:
+            log.exception("Failed to materialize results for flock %s v%d", flock_id, version)
+            return None
+        finally:
+            with self._lock:
+                current = self._inflight.get(flock_id)
+                if current is not None and current[0] == version:
+                    del self._inflight[flock_id]
+
+    def get_or_build(self, flock_id, version, build):
+        """Return the Ranking for a flock version: cached, from the build in flight, or built now."""
+        ranking = self.cache.get(flock_id, version)
+        if ranking is not None:
+            metrics.CACHE_LOOKUPS.inc(cache="rankings", result="l1_hit")
+            return ranking
+        with self._lock:
+            current = self._inflight.get(flock_id)
+        if current is not None and current[0] == version:
+            try:
+                ranking = current[1].result(timeout=self.wait)
+            except (CancelledError, TimeoutError):
+                # A build stuck behind others (or on a slow upstream) doesn't
+                # hold the request; it builds the ranking itself instead
+                ranking = None
+            if ranking is not None:
+                metrics.CACHE_LOOKUPS.inc(cache="rankings", result="inflight")
+                return ranking
+        metrics.CACHE_LOOKUPS.inc(cache="rankings", result="miss")
+        return self.cache.get_or_build(flock_id, version, build)
+
+
+rankings = RankingCache()
+materializer = Materializer(rankings)
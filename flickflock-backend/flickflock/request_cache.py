@@ -0,0 +1,342 @@
+"""Namespaced TMDB/OMDb request caches, with portable read-only snapshots.
+
+Upstream responses are cached per namespace (one per client and endpoint
+family), each a diskcache with its own location, size limit and eviction
+policy, so a burst of large credits payloads can't evict small, hot
+search or OMDb entries.  Every namespace is configured in NAMESPACES and
+can be overridden from the environment:
+
+    FLOCK_CACHE_DIR                  root directory (default: data/requests)
+    FLOCK_CACHE_<NAME>_DIR           a namespace's own directory
+    FLOCK_CACHE_<NAME>_SIZE_MB       its size limit
+    FLOCK_CACHE_<NAME>_EVICTION      lru or lfu
+
+Each instance keeps its own caches, so a new replica starts cold.
+export_snapshot() writes every namespace's unexpired entries to one
+compacted SQLite file; a node started with FLOCK_CACHE_SNAPSHOT pointing
+at that file reads through it as a base layer under its own caches
+(import_snapshot() copies it in instead).
+
+Before namespaces there was one cache, in .requests under the working
+directory or directly in FLOCK_CACHE_DIR.  The first namespace opened
+moves its entries into their namespaces and deletes it.
+
+    python -m flickflock.request_cache export data/requests.snapshot
+    python -m flickflock.request_cache info data/requests.snapshot
+    python -m flickflock.request_cache import data/requests.snapshot
+    python -m flickflock.request_cache stats
+"""
+import json, logging, os, shutil, sqlite3, threading, time, zlib
+from flickflock import storage
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    "FLOCK_CACHE_DIR",
+    os.path.join(os.path.dirname(storage._DB_PATH), "requests"),
+)
+SNAPSHOT_PATH = os.environ.get("FLOCK_CACHE_SNAPSHOT")
+# Where the single pre-namespace cache lived by default
+LEGACY_CACHE_DIR = ".requests"
+
+_EVICTION_POLICIES = {
+    "lru": "least-recently-used",
+    "lfu": "least-frequently-used",
+}
+
+# {namespace: (size limit in MB, eviction policy)}
+NAMESPACES = {
+    "tmdb_search": (64, "lru"),
+    "tmdb_details": (256, "lru"),
+    # Movie/show credits and people's combined_credits: few, but large
+    "tmdb_credits": (1024, "lfu"),
+    "omdb": (64, "lru"),
+}
+
+SNAPSHOT_FORMAT = 2
+
+
+def namespace_config(name):
+    """(directory, size limit in bytes, diskcache eviction policy) for a namespace."""
+    size_mb, eviction = NAMESPACES[name]
+    prefix = f"FLOCK_CACHE_{name.upper()}_"
+    directory = os.environ.get(prefix + "DIR", os.path.join(CACHE_DIR, name))
+    size_mb = float(os.environ.get(prefix + "SIZE_MB", size_mb))
+    eviction = os.environ.get(prefix + "EVICTION", eviction).lower()
+    if eviction not in _EVICTION_POLICIES:
+        raise ValueError(f"{prefix}EVICTION must be one of {', '.join(_EVICTION_POLICIES)}, not {eviction!r}")
+    return directory, int(size_mb * 1024 * 1024), _EVICTION_POLICIES[eviction]
+
+
+class SnapshotLayer:
+    """Read-only view of a cache snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        if int(self.meta.get("format", 0)) != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported cache snapshot format {self.meta.get('format')!r} in {path}")
+
+    def get(self, key, expire_time=False):
+        """Return the snapshot's unexpired value for key, like Cache.get."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return (None, None) if expire_time else None
+        value = json.loads(zlib.decompress(row[0]))
+        return (value, row[1]) if expire_time else value
+
+    def items(self, namespace=None):
+        """Yield (namespace, key, value, expires_at) for every unexpired entry (in one namespace if given)."""
+        query, args = "SELECT namespace, key, value, expires_at FROM entries", ()
+        if namespace is not None:
+            query, args = query + " WHERE namespace = ?", (namespace,)
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        now = time.time()
+        for namespace, key, value, expires_at in rows:
+            if expires_at is None or expires_at > now:
+                yield namespace, key, json.loads(zlib.decompress(value)), expires_at
+
+    def close(self):
+        self._conn.close()
+
+
+class LayeredCache:
+    """A live diskcache that falls back to a read-only snapshot.
+
+    Snapshot hits are copied into the live cache with their remaining TTL,
+    so each entry is decoded from the snapshot at most once per node.
+    """
+
+    def __init__(self, live, base):
+        self.live = live
+        self.base = base
+
+    def get(self, key, default=None):
+        value = self.live.get(key)
+        if value is not None:
+            return value
+        value, expires_at = self.base.get(key, expire_time=True)
+        if value is None:
+            return default
+        self.live.set(key, value, expire=None if expires_at is None else expires_at - time.time())
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.live, name)
+
+
+def _open_snapshot(path):
+    try:
+        base = SnapshotLayer(path)
+    except (sqlite3.Error, ValueError):
+        log.exception("Ignoring unreadable cache snapshot %s", path)
+        return None
+    log.info("Reading through cache snapshot %s (%s entries)", path, base.meta.get("entries"))
+    return base
+
+
+def open_cache(name, snapshot=None):
+    """Open a namespace's live cache, layered over snapshot (a SnapshotLayer) if given."""
+    directory, size_limit, eviction_policy = namespace_config(name)
+    from diskcache import Cache  # deferred until a namespace is first used
+    live = Cache(directory, statistics=True, size_limit=size_limit, eviction_policy=eviction_policy)
+    return LayeredCache(live, snapshot) if snapshot else live
+
+
+def legacy_namespace(value):
+    """The namespace for an entry of the pre-namespace cache, from its value."""
+    # OMDb entries were stored as {"data": ...}, TMDB ones with a "date" too
+    if "date" not in value:
+        return "omdb"
+    data = value.get("data")
+    if isinstance(data, dict):
+        if "cast" in data or "crew" in data:
+            return "tmdb_credits"
+        if "results" in data and "total_results" in data:
+            return "tmdb_search"
+    return "tmdb_details"
+
+
+def _legacy_dirs():
+    dirs = dict.fromkeys(os.path.abspath(d) for d in (LEGACY_CACHE_DIR, CACHE_DIR))
+    return [d for d in dirs if os.path.exists(os.path.join(d, "cache.db"))]
+
+
+def migrate_legacy(caches):
+    """Move the pre-namespace cache's unexpired entries into {namespace: cache}. Returns the number moved."""
+    from diskcache import Cache
+    moved = 0
+    for directory in _legacy_dirs():
+        legacy = Cache(directory)
+        try:
+            for key in legacy.iterkeys():
+                value, expires_at = legacy.get(key, expire_time=True)
+                if not isinstance(value, dict):
+                    continue
+                cache = caches[legacy_namespace(value)]
+                if key in cache:
+                    continue
+                cache.set(key, value, expire=None if expires_at is None else expires_at - time.time())
+                moved += 1
+            legacy.clear()
+        finally:
+            legacy.close()
+        if directory == os.path.abspath(CACHE_DIR):
+            # The namespaces live in subdirectories here, so only drop the old database
+            for suffix in ("", "-wal", "-shm"):
+                path = os.path.join(directory, "cache.db" + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+        log.info("Moved the request cache in %s into namespaces under %s", directory, CACHE_DIR)
+    return moved
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_snapshot = None
+
+
+def namespace(name):
+    """The shared cache for a namespace (opened on first use)."""
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                global _snapshot
+                if _snapshot is None and SNAPSHOT_PATH:
+                    _snapshot = _open_snapshot(SNAPSHOT_PATH) or False
+                if not _caches and _legacy_dirs():
+                    for other in NAMESPACES:
+                        _caches[other] = open_cache(other, snapshot=_snapshot or None)
+                    try:
+                        migrate_legacy({other: _live(c) for other, c in _caches.items()})
+                    except Exception:
+                        log.exception("Could not move the pre-namespace request cache")
+                cache = _caches.get(name)
+                if cache is None:
+                    cache = _caches[name] = open_cache(name, snapshot=_snapshot or None)
+    return cache
+
+
+def _live(cache):
+    return cache.live if isinstance(cache, LayeredCache) else cache
+
+
+def values(name):
+    """Yield every unexpired value in a namespace, including ones only in its snapshot."""
+    cache = namespace(name)
+    live = _live(cache)
+    seen = set()
+    for key in live.iterkeys():
+        value = live.get(key)
+        if value is not None:
+            seen.add(key)
+            yield value
+    if isinstance(cache, LayeredCache):
+        for _, key, value, _ in cache.base.items(name):
+            if key not in seen:
+                yield value
+
+
+def stats():
+    """Per-namespace hit/miss counts, entry counts and disk usage."""
+    report = {}
+    for name in NAMESPACES:
+        cache = _live(namespace(name))
+        hits, misses = cache.stats()
+        report[name] = {
+            "hits": hits,
+            "misses": misses,
+            "entries": len(cache),
+            "size_bytes": cache.volume(),
+            "size_limit": cache.size_limit,
+            "eviction_policy": cache.eviction_policy,
+        }
+    return report
+
+
+def export_snapshot(caches, path):
+    """Write the unexpired entries of {namespace: cache} to a new snapshot file. Returns the entry count."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE entries (key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL)"
+        )
+        count = 0
+        with conn:
+            for name, cache in caches.items():
+                cache = _live(cache)
+                for key in cache.iterkeys():
+                    value, expires_at = cache.get(key, expire_time=True)
+                    if value is None:
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (key, name, zlib.compress(json.dumps(value).encode()), expires_at),
+                    )
+                    count += 1
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("format", str(SNAPSHOT_FORMAT)),
+                ("created_at", str(time.time())),
+                ("entries", str(count)),
+            ])
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return count
+
+
+def import_snapshot(caches, path, overwrite=False):
+    """Copy a snapshot's unexpired entries into {namespace: cache}. Returns the number copied."""
+    layer = SnapshotLayer(path)
+    copied = 0
+    try:
+        now = time.time()
+        for name, key, value, expires_at in layer.items():
+            cache = caches.get(name)
+            if cache is None or (not overwrite and key in cache):
+                continue
+            cache.set(key, value, expire=None if expires_at is None else expires_at - now)
+            copied += 1
+    finally:
+        layer.close()
+    return copied
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect request caches and export/import snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help in [
+        ("export", "write the live caches to a snapshot file"),
+        ("import", "copy a snapshot into the live caches"),
+        ("info", "show a snapshot's metadata"),
+    ]:
+        sub.add_parser(name, help=help).add_argument("path")
+    sub.add_parser("stats", help="show per-namespace cache statistics")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    live = {name: open_cache(name) for name in NAMESPACES}
+    if args.command == "export":
+        print(f"Exported {export_snapshot(live, args.path)} entries to {args.path}")
+    elif args.command == "import":
+        print(f"Imported {import_snapshot(live, args.path)} entries from {args.path}")
+    elif args.command == "stats":
+        print(json.dumps(stats(), indent=2))
+    else:
+        print(json.dumps(SnapshotLayer(args.path).meta, indent=2))
@@ -0,0 +1,228 @@
+"""A local autocomplete index over the titles and names seen upstream.
+
+Search-as-you-type sends a request per keystroke, and the request cache
+only helps with exact repeats.  The index holds every work and person from
+TMDB search responses and from cached credits (the graph flocks are built
+from), and answers /api/search locally when it can stand in for TMDB:
+
+- the same query was answered by TMDB in the last week (the request
+  cache's TTL), or
+- it holds at least FLOCK_SEARCH_INDEX_MIN_HITS titles or names starting
+  with the query (with or without a leading article), TMDB's page size by
+  default, so a full page of prefix matches is available.
+
+Prefixes of up to four characters are answered from per-prefix lists of
+the most popular matches; longer ones from a sorted name list, with
+substring matches found through a trigram index when prefixes don't fill
+the page.  Results are ranked with TMDB._rank_search_results, so the
+exact, prefix and article-stripping boosts are the same either way.  Other
+queries fall back to TMDB, and its answer is added to the index.
+
+    FLOCK_SEARCH_INDEX=0                 disable the index
+    FLOCK_SEARCH_INDEX_MIN_HITS          prefix matches needed to answer locally (20)
+    FLOCK_SEARCH_INDEX_MAX_DOCS          works and people held (200000)
+    FLOCK_SEARCH_INDEX_MAX_AGE           seconds TMDB's answer to a query is reused (604800)
+"""
+import bisect, heapq, logging, os, threading, time
+from collections import OrderedDict, defaultdict
+from flickflock import metrics, request_cache
+from flickflock.tmdb import TMDB
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("FLOCK_SEARCH_INDEX", "1") not in ("", "0")
+MIN_HITS = int(os.environ.get("FLOCK_SEARCH_INDEX_MIN_HITS", 20))
+MAX_DOCS = int(os.environ.get("FLOCK_SEARCH_INDEX_MAX_DOCS", 200_000))
+MAX_AGE = float(os.environ.get("FLOCK_SEARCH_INDEX_MAX_AGE", 7 * 24 * 3600))
+PAGE_SIZE = 20
+
+# Result fields kept per work or person: what the search dropdown shows
+# and what a selection sends to /api/flock
+FIELDS = (
+    "id", "media_type", "title", "name", "popularity", "poster_path", "profile_path",
+    "known_for_department", "release_date", "first_air_date", "original_language",
+)
+
+# Queries up to this long are answered from per-prefix popularity lists
+_SHORT = 4
+_SHORT_KEEP = 2 * PAGE_SIZE
+# Bounds on the name range and trigram candidates one lookup reads
+_MAX_SCAN = 1000
+_MAX_CANDIDATES = 5000
+# Pending names merged by re-sorting instead of one insort each
+_BULK = 64
+
+
+class SearchIndex:
+    """Works and people by title/name prefix, substring and popularity."""
+
+    def __init__(self, min_hits=MIN_HITS, max_docs=MAX_DOCS, max_queries=10000, max_age=MAX_AGE):
+        self.min_hits = min_hits
+        self.max_docs = max_docs
+        self.max_age = max_age
+        self.max_queries = max_queries
+        self._docs = {}                     # {(media_type, id): result fields}
+        self._titles = {}                   # {(media_type, id): lowercased title or name}
+        self._names = []                    # sorted [(name, key)]: titles and their article-stripped forms
+        self._pending = []                  # names not yet merged into _names
+        self._exact = defaultdict(set)      # {name: {key}}
+        self._short = defaultdict(dict)     # {prefix: {key: popularity}}, the most popular per short prefix
+        self._trigrams = defaultdict(set)   # {trigram: {key}} over titles
+        self._answered = OrderedDict()      # {query: (keys TMDB returned for it, answered_at)}, LRU
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- Adding ---
+
+    def _add(self, result):
+        """Index one search result or credit; returns its key, or None if it can't be indexed."""
+        media_type = result.get("media_type")
+        title = result.get("title") or result.get("name")
+        if media_type not in ("movie", "tv", "person") or not title or result.get("id") is None:
+            return None
+        key = (media_type, result["id"])
+        doc = self._docs.get(key)
+        if doc is not None:
+            doc.update((k, result[k]) for k in FIELDS if k in result)
+            return key
+        if len(self._docs) >= self.max_docs:
+            return None
+
+        self._docs[key] = {k: result[k] for k in FIELDS if k in result}
+        name = self._titles[key] = title.lower()
+        popularity = result.get("popularity") or 0
+        for form in {name, TMDB._strip_article(name)}:
+            self._pending.append((form, key))
+            self._exact[form].add(key)
+            for n in range(1, min(len(form), _SHORT) + 1):
+                self._remember_short(form[:n], key, popularity)
+        for i in range(len(name) - 2):
+            self._trigrams[name[i:i + 3]].add(key)
+        return key
+
+    def _remember_short(self, prefix, key, popularity):
+        entries = self._short[prefix]
+        entries[key] = popularity
+        if len(entries) > 2 * _SHORT_KEEP:
+            self._short[prefix] = dict(sorted(entries.items(), key=lambda e: -e[1])[:_SHORT_KEEP])
+
+    def _flush(self):
+        if len(self._pending) > _BULK:
+            self._names.extend(self._pending)
+            self._names.sort()
+        else:
+            for entry in self._pending:
+                bisect.insort(self._names, entry)
+        self._pending.clear()
+
+    def add(self, results):
+        """Index search results or credits (works need a media_type). Returns how many were indexable."""
+        with self._lock:
+            return sum(1 for r in results if self._add(r) is not None)
+
+    def ingest(self, payload):
+        """Index the works and people in a TMDB search, credits or combined_credits response."""
+        if "results" in payload:
+            return self.add(payload["results"])
+        # Combined credits list works (with a media_type), credits list people
+        return self.add(
+            c if "media_type" in c else {**c, "media_type": "person"}
+            for c in [*payload.get("cast", ()), *payload.get("crew", ())]
+        )
+
+    def answered(self, query, results):
+        """Record TMDB's results for query, so repeating it is answered locally."""
+        q = query.lower().strip()
+        with self._lock:
+            self._answered[q] = (tuple(k for k in map(self._add, results) if k is not None), time.monotonic())
+            self._answered.move_to_end(q)
+            while len(self._answered) > self.max_queries:
+                self._answered.popitem(last=False)
+
+    def load_cache(self):
+        """Index every search and credits response in the request cache. Returns the number read."""
+        read = 0
+        for name in ("tmdb_search", "tmdb_credits"):
+            for value in request_cache.values(name):
+                data = value.get("data") if isinstance(value, dict) else None
+                if isinstance(data, dict):
+                    self.ingest(data)
+                    read += 1
+        return read
+
+    # --- Lookups ---
+
+    def _prefix_matches(self, q):
+        if len(q) <= _SHORT:
+            return set(self._short.get(q, ()))
+        matches = set()
+        names = self._names
+        start = bisect.bisect_left(names, (q,))
+        for i in range(start, min(start + _MAX_SCAN, len(names))):
+            name, key = names[i]
+            if not name.startswith(q):
+                break
+            matches.add(key)
+        return matches
+
+    def _substring_matches(self, q):
+        postings = sorted((self._trigrams.get(q[i:i + 3], ()) for i in range(len(q) - 2)), key=len)
+        if not postings[0] or len(postings[0]) > _MAX_CANDIDATES:
+            return set()
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {key for key in candidates if q in self._titles[key]}
+
+    def lookup(self, query, limit=PAGE_SIZE):
+        """Ranked results for query, or None when the index can't stand in for TMDB."""
+        q = query.lower().strip()
+        if not q:
+            return None
+        q_no_article = TMDB._strip_article(q)
+        with self._lock:
+            if self._pending:
+                self._flush()
+            prefixed = self._prefix_matches(q)
+            exact = self._exact.get(q, set())
+            if q_no_article != q:
+                prefixed |= self._prefix_matches(q_no_article)
+                exact = exact | self._exact.get(q_no_article, set())
+            answered = self._answered.get(q)
+            if answered is not None:
+                if time.monotonic() - answered[1] > self.max_age:
+                    del self._answered[q]
+                    answered = None
+                else:
+                    self._answered.move_to_end(q)
+                    answered = answered[0]
+            if answered is None and len(prefixed) < self.min_hits:
+                metrics.CACHE_LOOKUPS.inc(cache="search_index", result="miss")
+                return None
+
+            # Exact matches outrank prefix matches, which outrank the rest,
+            # and each tier is ordered by popularity: only the most popular
+            # of each tier can make the page
+            docs = self._docs
+            popularity = lambda k: docs[k].get("popularity") or 0
+            keys = set(answered or ())
+            keys.update(heapq.nlargest(limit, exact, key=popularity))
+            keys.update(heapq.nlargest(limit, prefixed, key=popularity))
+            if len(prefixed) < limit and len(q) >= 3:
+                keys |= self._substring_matches(q)
+            candidates = [docs[k] for k in keys]
+        metrics.CACHE_LOOKUPS.inc(cache="search_index", result="l1_hit")
+        return [dict(doc) for doc in TMDB._rank_search_results(candidates, query)[:limit]]
+
+
+index = SearchIndex()
+
+
+def warm():
+    """Index the request cache's search and credits responses into the shared index."""
+    started = time.perf_counter()
+    read = index.load_cache()
+    log.info(
+        "Indexed %d works and people from %d cached responses in %.0fms",
+        len(index), read, (time.perf_counter() - started) * 1000,
+    )
@@ -0,0 +1,446 @@
+"""Shared SQLite storage for flocks, bookmarks and seed contributions.
+
+Modules register their tables with register_schema() and their one-time data
+migrations with register_migration() at import time.  Both are applied once
+per process, on the first connection that needs them, instead of on every
+load and save.  Connections are pooled and long-lived, and each one keeps
+its own prepared-statement cache, so hot queries are only compiled once.
+
+connection() and write() block the calling thread.  Async code uses
+read_async() and write_async() instead, which run the same functions on a
+dedicated thread per shard and never block the event loop.
+"""
+import asyncio, logging, os, queue, sqlite3, threading, time, zlib
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+_DB_PATH = os.environ.get(
+    "FLOCK_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "flock.db"),
+)
+
+# Tunable per-connection pragmas.  NORMAL sync is safe with WAL (a power
+# loss can only drop the last commits, never corrupt the database).
+# auto_vacuum only takes effect on new files (see maintenance.vacuum).
+PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": os.environ.get("FLOCK_DB_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.environ.get("FLOCK_DB_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("FLOCK_DB_CACHE_SIZE", -64000)),  # negative = KiB
+    "busy_timeout": int(os.environ.get("FLOCK_DB_BUSY_TIMEOUT_MS", 5000)),
+}
+
+# Idle connections kept per database; extra connections opened under load
+# are closed when returned.
+POOL_SIZE = int(os.environ.get("FLOCK_DB_POOL_SIZE", 8))
+
+# Prepared statements cached per connection (sqlite3's default is 128).
+_CACHED_STATEMENTS = 256
+
+_SCHEMA = []
+_MIGRATIONS = []
+
+
+def register_schema(*statements):
+    """Register CREATE TABLE/INDEX IF NOT EXISTS statements to run once per database."""
+    _SCHEMA.extend(statements)
+
+
+def register_migration(name, migration):
+    """Register a one-time migration, called as migration(conn) inside a transaction.
+
+    Migrations run in registration order after the schema is created and are
+    recorded in schema_migrations.  They must be idempotent: a concurrent
+    worker may run the same migration before it is marked as applied.
+    """
+    _MIGRATIONS.append((name, migration))
+
+
+class Database:
+    """A pool of long-lived connections to one SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=POOL_SIZE)
+        self._lock = threading.Lock()
+        # How much of the schema/migration registry has been applied
+        self._applied = (0, 0)
+
+    def _connect(self):
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=_CACHED_STATEMENTS,
+        )
+        for pragma, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+
+    def _ensure_schema(self, conn):
+        if self._applied == (len(_SCHEMA), len(_MIGRATIONS)):
+            return
+        with self._lock:
+            target = (len(_SCHEMA), len(_MIGRATIONS))
+            if self._applied == target:
+                return
+            with conn:
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        name TEXT PRIMARY KEY,
+                        applied_at REAL NOT NULL
+                    )
+                """)
+            applied = {row[0] for row in conn.execute("SELECT name FROM schema_migrations")}
+            for name, migration in _MIGRATIONS:
+                if name in applied:
+                    continue
+                with conn:
+                    migration(conn)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO schema_migrations (name, applied_at) VALUES (?, ?)",
+                        (name, time.time()),
+                    )
+                log.info("Applied migration %s to %s", name, self.path)
+            self._applied = target
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the pool.
+
+        Reads can use it directly; writes should run inside `with conn:` so
+        they are committed (or rolled back) before it goes back to the pool.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            self._ensure_schema(conn)
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Close all idle connections, e.g. on shutdown or between tests."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def reset_schema(self):
+        """Forget which schema and migrations were applied, so the next connection re-checks them."""
+        with self._lock:
+            self._applied = (0, 0)
+
+
+class WriteBatcher:
+    """Group commit: run writes from concurrent requests in shared transactions.
+
+    SQLite has a single writer, so under load every separate commit queues
+    behind the last one.  The batcher collects writes for up to max_delay
+    seconds (or until max_batch are pending) and commits them together.
+    Each write runs in its own savepoint, so one failing write is rolled
+    back and reported to its caller without affecting the rest of the
+    batch, and submit() only returns once the batch is durably committed.
+    """
+
+    def __init__(self, db, max_delay=0.002, max_batch=64):
+        self.db = db
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="flock-db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, write):
+        """Run write(conn) in the next batch and return its result once committed."""
+        return self.submit_nowait(write).result()
+
+    def submit_nowait(self, write):
+        """Queue write(conn) for the next batch and return a Future for its result."""
+        future = Future()
+        self._queue.put((write, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                outcomes = self._commit(batch)
+            except Exception as e:
+                log.exception("Group commit of %d writes failed", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit(self, batch):
+        outcomes = []
+        with self.db.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for write, _ in batch:
+                    conn.execute("SAVEPOINT batched_write")
+                    try:
+                        outcomes.append((True, write(conn)))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO batched_write")
+                        outcomes.append((False, e))
+                    conn.execute("RELEASE batched_write")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self.batches += 1
+        self.writes += len(batch)
+        return outcomes
+
+
+class DatabaseThread:
+    """Runs calls against one Database on a dedicated thread, for async callers.
+
+    Requests are queued and executed in order on a single long-lived
+    connection; the caller awaits the result without tying up the event
+    loop or a threadpool worker while SQLite works.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="flock-db-async", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, write=False):
+        """Queue fn(conn) (in a transaction if write) and return a Future for its result."""
+        future = Future()
+        self._queue.put((fn, write, future))
+        return future
+
+    def _run(self):
+        while True:
+            fn, write, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self.db.connection() as conn:
+                    if write:
+                        with conn:
+                            result = fn(conn)
+                    else:
+                        result = fn(conn)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+def shard_paths(path, count):
+    """File paths for a layout of count shards; a single shard uses path itself."""
+    if count == 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f"{root}.shard{i}of{count}{ext}" for i in range(count)]
+
+
+def shard_index(key, count):
+    """Stable shard number for a routing key (the same in every process)."""
+    return zlib.crc32(str(key).encode()) % count
+
+
+def configure(path=None, shards=None):
+    """(Re)build the shard layout, e.g. FLOCK_DB_SHARDS=4 for four files."""
+    global _path, _shards, default
+    for db in _shards:
+        db.close()
+    _path = path or _path
+    count = shards or int(os.environ.get("FLOCK_DB_SHARDS", 1))
+    _shards = [Database(p) for p in shard_paths(_path, count)]
+    default = _shards[0]
+    _batchers.clear()
+    _threads.clear()
+
+
+def shard_for(key=None):
+    """The Database holding key's rows; unkeyed (global) data lives on shard 0."""
+    if key is None:
+        return default
+    return _shards[shard_index(key, len(_shards))]
+
+
+def shards():
+    return list(_shards)
+
+
+_path = _DB_PATH
+_shards = []
+_batchers = {}
+_threads = {}
+_workers_lock = threading.Lock()  # guards creating batchers and database threads
+_group_commit = None
+configure()
+
+# Set FLOCK_DB_GROUP_COMMIT_MS to batch writes (see WriteBatcher); by default
+# every write commits on its own.
+if os.environ.get("FLOCK_DB_GROUP_COMMIT_MS"):
+    _group_commit = {"max_delay": float(os.environ["FLOCK_DB_GROUP_COMMIT_MS"]) / 1000}
+
+
+def connection(key=None):
+    """Borrow a connection to the shard that holds key (see shard_for)."""
+    return shard_for(key).connection()
+
+
+def _batcher(db):
+    batcher = _batchers.get(db.path)
+    if batcher is None:
+        with _workers_lock:
+            batcher = _batchers.get(db.path)
+            if batcher is None:
+                batcher = _batchers[db.path] = WriteBatcher(db, **_group_commit)
+    return batcher
+
+
+def _thread(db):
+    thread = _threads.get(db.path)
+    if thread is None:
+        with _workers_lock:
+            thread = _threads.get(db.path)
+            if thread is None:
+                thread = _threads[db.path] = DatabaseThread(db)
+    return thread
+
+
+def write(fn, key=None):
+    """Run fn(conn) in a write transaction on key's shard and return its result once committed.
+
+    fn must not commit itself.  With group commit enabled it may share its
+    transaction with other writes, isolated in a savepoint.
+    """
+    db = shard_for(key)
+    if _group_commit is not None:
+        return _batcher(db).submit(fn)
+    with db.connection() as conn, conn:
+        return fn(conn)
+
+
+async def read_async(fn, key=None, db=None):
+    """Await fn(conn) run on key's shard (or on db), off the event loop."""
+    return await asyncio.wrap_future(_thread(db or shard_for(key)).submit(fn))
+
+
+async def write_async(fn, key=None):
+    """Async write(): await fn(conn) run in a write transaction on key's shard."""
+    db = shard_for(key)
+    if _group_commit is not None:
+        future = _batcher(db).submit_nowait(fn)
+    else:
+        future = _thread(db).submit(fn, write=True)
+    return await asyncio.wrap_future(future)
+
+
+def enable_group_commit(max_delay=0.002, max_batch=64):
+    """Route write() through a WriteBatcher per shard."""
+    global _group_commit
+    _group_commit = {"max_delay": max_delay, "max_batch": max_batch}
+
+
+# {table: SQL expression for the row's routing key}.  Tables that aren't
+# registered hold global data and live on shard 0.
+_SHARD_KEYS = {}
+
+
+def register_sharded_table(table, key_expr):
+    """Declare how rebalance() finds the routing key of a table's rows."""
+    _SHARD_KEYS[table] = key_expr
+
+
+def rebalance(from_shards, to_shards, path=None):
+    """Copy every row from one shard layout into another.
+
+    Rows are upserted, so an interrupted run can simply be repeated.  The
+    source files are left untouched; switch FLOCK_DB_SHARDS once the copy
+    is done.  Returns {table: rows copied}.
+    """
+    path = path or _path
+    sources = [Database(p) for p in shard_paths(path, from_shards)]
+    targets = [Database(p) for p in shard_paths(path, to_shards)]
+    copied = defaultdict(int)
+    try:
+        for source in sources:
+            with source.connection() as src:
+                tables = [
+                    row[0] for row in src.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                    )
+                ]
+                for table in tables:
+                    key_expr = _SHARD_KEYS.get(table, "NULL")
+                    cursor = src.execute(f"SELECT {key_expr}, * FROM {table} ORDER BY rowid")
+                    columns = [d[0] for d in cursor.description[1:]]
+                    insert = (
+                        f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})"
+                    )
+                    by_target = defaultdict(list)
+                    for row in cursor:
+                        index = 0 if row[0] is None else shard_index(row[0], to_shards)
+                        by_target[index].append(row[1:])
+                    for index, rows in by_target.items():
+                        with targets[index].connection() as dst, dst:
+                            dst.executemany(insert, rows)
+                        copied[table] += len(rows)
+    finally:
+        for db in sources + targets:
+            db.close()
+    return dict(copied)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Flock storage maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebalance", help="copy all rows into a new shard layout")
+    rb.add_argument("--from", dest="from_shards", type=int, required=True)
+    rb.add_argument("--to", dest="to_shards", type=int, required=True)
+    rb.add_argument("--path", default=_DB_PATH)
+    args = parser.parse_args()
+
+    # Use the package module, which flock/bookmarks register their tables with
+    from flickflock import storage, flock, bookmarks, contributions
+    logging.basicConfig(level=logging.INFO)
+    for table, count in storage.rebalance(args.from_shards, args.to_shards, args.path).items():
+        print(f"{table}: {count} rows")
@@ -0,0 +1,254 @@
+"""A synthetic, TMDB-shaped graph of people and works.
+
+Payloads are generated on demand from (seed, kind, id), so the same graph
+comes out of every process without being stored, and a graph of any size
+costs nothing until it is read.  Ids are drawn with a popularity skew
+(low ids are the popular ones), so filmographies and credits overlap the
+way real ones do and flocks get a realistic long tail of members.
+
+SyntheticTMDB is a TMDB client answering from the graph instead of the
+network, so benchmarks run the real expansion and filtering code.
+"""
+import random
+from flickflock.tmdb import TMDB
+
+_WORDS = (
+    "silent", "river", "night", "empire", "last", "summer", "city", "ghost",
+    "golden", "winter", "storm", "garden", "broken", "wild", "dark", "road",
+    "stranger", "paper", "island", "blue", "fire", "echo", "house", "secret",
+)
+_FIRST_NAMES = ("Ada", "Ben", "Cleo", "Dev", "Eva", "Finn", "Greta", "Hugo", "Ines", "Jonas", "Kira", "Liam")
+_LAST_NAMES = ("Arden", "Brooks", "Castell", "Dunmore", "Ellery", "Fontaine", "Greer", "Hale", "Ives", "Jansen")
+_GENRES = (28, 12, 16, 35, 80, 18, 10751, 14, 27, 9648, 10749, 878, 53)
+# Shares of works in genres TMDB.EXCLUDED_GENRE_IDS drops, and of credits
+# missing the fields tmdb_movies_from_person and the results filters need.
+_EXCLUDED_SHARE = 0.05
+_INCOMPLETE_SHARE = 0.1
+
+_CREW = (
+    ("Directing", "Director"), ("Writing", "Screenplay"), ("Production", "Producer"),
+    ("Sound", "Original Music Composer"), ("Camera", "Director of Photography"),
+    ("Editing", "Editor"), ("Art", "Production Design"), ("Crew", "Stunts"),
+)
+
+NOT_FOUND = {"success": False, "status_code": 34, "status_message": "The resource you requested could not be found."}
+
+
+class SyntheticGraph:
+    """Deterministic TMDB payloads for people 1..people and works 1..works.
+
+    filmography: credits per person; cast and crew: credits per work.
+    Even work ids are movies and odd ones TV shows.
+    """
+
+    def __init__(self, people=20000, works=50000, filmography=40, cast=20, crew=10, seed=0):
+        self.people = people
+        self.works = works
+        self.filmography = filmography
+        self.cast = cast
+        self.crew = crew
+        self.seed = seed
+
+    def config(self):
+        return {
+            "people": self.people, "works": self.works, "filmography": self.filmography,
+            "cast": self.cast, "crew": self.crew, "seed": self.seed,
+        }
+
+    def _rng(self, *key):
+        return random.Random(":".join(map(str, (self.seed, *key))))
+
+    @staticmethod
+    def _skewed(rng, n):
+        return 1 + int(n * rng.random() ** 2.5)
+
+    def random_person(self, rng):
+        """A person id drawn with the graph's popularity skew."""
+        return self._skewed(rng, self.people)
+
+    def random_work(self, rng):
+        """A work id drawn with the graph's popularity skew."""
+        return self._skewed(rng, self.works)
+
+    @staticmethod
+    def media_type(work_id):
+        return "movie" if work_id % 2 == 0 else "tv"
+
+    # --- Entities ---
+
+    def person(self, id):
+        rng = self._rng("person", id)
+        department = rng.choice(("Acting",) * 6 + tuple(d for d, _ in _CREW))
+        return {
+            "id": id,
+            "name": f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {id}",
+            "known_for_department": department,
+            "popularity": round(100 / (1 + id / 500) + rng.random(), 3),
+            "profile_path": f"/p{id}.jpg",
+            "biography": f"Synthetic person {id}.",
+            "birthday": f"{rng.randint(1930, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "gender": rng.randint(0, 2),
+        }
+
+    def work(self, id):
+        """A work as it appears in search results and filmographies."""
+        rng = self._rng("work", id)
+        media_type = self.media_type(id)
+        title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3))).title()
+        date = f"{rng.randint(1950, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        genre_ids = rng.sample(_GENRES, rng.randint(1, 3))
+        if rng.random() < _EXCLUDED_SHARE:
+            genre_ids.append(rng.choice(sorted(TMDB.EXCLUDED_GENRE_IDS)))
+        incomplete = rng.random() < _INCOMPLETE_SHARE
+        work = {
+            "id": id,
+            "media_type": media_type,
+            "overview": "" if incomplete else f"A synthetic {media_type} about the {title.lower()}, number {id}.",
+            "poster_path": None if incomplete and rng.random() < 0.5 else f"/w{id}.jpg",
+            "popularity": round(200 / (1 + id / 1000) + rng.random() * 10, 3),
+            "original_language": rng.choice(("en", "en", "en", "fr", "ko", "ja", "es")),
+            "vote_average": round(rng.uniform(3, 9), 1),
+            "vote_count": rng.randint(0, 3) if incomplete else rng.randint(5, 20000),
+            "genre_ids": genre_ids,
+        }
+        if media_type == "movie":
+            work.update(title=title, original_title=title, release_date=date)
+        else:
+            work.update(name=title, original_name=title, first_air_date=date)
+        return work
+
+    # --- Endpoints ---
+
+    def combined_credits(self, person_id):
+        rng = self._rng("filmography", person_id)
+        person = self.person(person_id)
+        cast, crew = [], []
+        for _ in range(self.filmography):
+            work = self.work(self.random_work(rng))
+            if person["known_for_department"] == "Acting" or rng.random() < 0.2:
+                cast.append({**work, "character": f"Character {rng.randint(1, 999)}", "order": rng.randint(0, 30)})
+            else:
+                department, job = rng.choice(_CREW)
+                crew.append({**work, "department": department, "job": job})
+        return {"id": person_id, "cast": cast, "crew": crew}
+
+    def credits(self, work_id):
+        rng = self._rng("credits", work_id)
+        cast = [
+            {
+                "id": pid, "name": f"Person {pid}", "known_for_department": "Acting",
+                "character": f"Character {order}", "order": order, "profile_path": f"/p{pid}.jpg",
+            }
+            for order, pid in enumerate(self.random_person(rng) for _ in range(self.cast))
+        ]
+        crew = []
+        for _ in range(self.crew):
+            pid = self.random_person(rng)
+            department, job = rng.choice(_CREW)
+            crew.append({
+                "id": pid, "name": f"Person {pid}", "known_for_department": department,
+                "department": department, "job": job, "profile_path": f"/p{pid}.jpg",
+            })
+        return {"id": work_id, "cast": cast, "crew": crew}
+
+    def details(self, work_id):
+        details = self.work(work_id)
+        del details["media_type"]
+        details["genres"] = [{"id": g, "name": f"Genre {g}"} for g in details.pop("genre_ids")]
+        if self.media_type(work_id) == "movie":
+            details["runtime"] = self._rng("runtime", work_id).randint(80, 180)
+            details["imdb_id"] = self.imdb_id(work_id)
+        else:
+            details["number_of_seasons"] = self._rng("seasons", work_id).randint(1, 8)
+        return details
+
+    @staticmethod
+    def imdb_id(work_id):
+        return f"tt{work_id:07d}"
+
+    def external_ids(self, work_id):
+        return {"id": work_id, "imdb_id": self.imdb_id(work_id)}
+
+    def search(self, query, page_size=20):
+        """Works and people whose titles and names start with the query's words.
+
+        Reports more matches than the page holds, as a longer query would
+        not match these generated titles.
+        """
+        rng = self._rng("search", query.lower())
+        results = []
+        for _ in range(page_size):
+            if rng.random() < 0.25:
+                result = {**self.person(self.random_person(rng)), "media_type": "person"}
+                result["name"] = f"{query.title()} {result['name']}"
+            else:
+                result = self.work(self.random_work(rng))
+                name_key = "title" if "title" in result else "name"
+                result[name_key] = f"{query.title()} {result[name_key]}"
+            results.append(result)
+        pages = rng.randint(2, 50)
+        return {"page": 1, "results": results, "total_pages": pages, "total_results": pages * page_size}
+
+    def payload(self, path, params=None):
+        """The TMDB API response for path, or TMDB's not-found error."""
+        parts = path.strip("/").split("/")
+        kind, id = parts[0], parts[1] if len(parts) > 1 else ""
+        rest = "/".join(parts[2:])
+        if kind == "search":
+            return self.search((params or {}).get("query", ""))
+        if not id.isdigit():
+            return NOT_FOUND
+        id = int(id)
+        if kind == "person" and id <= self.people:
+            if rest == "":
+                return self.person(id)
+            if rest == "combined_credits":
+                return self.combined_credits(id)
+        elif kind in ("movie", "tv") and id <= self.works and self.media_type(id) == kind:
+            if rest == "":
+                return self.details(id)
+            if rest == "credits":
+                return self.credits(id)
+            if rest == "external_ids":
+                return self.external_ids(id)
+            if rest == "watch/providers":
+                return {"id": id, "results": {}}
+        return NOT_FOUND
+
+    def omdb(self, imdb_id):
+        """The OMDb API response for an IMDb id from external_ids()."""
+        id = imdb_id[2:] if imdb_id.startswith("tt") else ""
+        if not id.isdigit() or not 0 < int(id) <= self.works:
+            return {"Response": "False", "Error": "Incorrect IMDb ID."}
+        work = self.work(int(id))
+        rng = self._rng("omdb", id)
+        wins = rng.choice((0, 0, 0, 1, 2, 5))
+        return {
+            "Title": work.get("title") or work.get("name"),
+            "Year": (work.get("release_date") or work.get("first_air_date"))[:4],
+            "imdbID": imdb_id,
+            "imdbRating": str(work["vote_average"]),
+            "imdbVotes": f"{work['vote_count'] * 3:,}",
+            "Awards": f"{wins} wins & {rng.randint(wins, wins + 10)} nominations." if wins else "N/A",
+            "Type": "movie" if work["media_type"] == "movie" else "series",
+            "Response": "True",
+        }
+
+
+class SyntheticTMDB(TMDB):
+    """A TMDB client answering from a SyntheticGraph, without network or request cache."""
+
+    def __init__(self, graph=None):
+        super().__init__(api_key="synthetic", use_cache=False)
+        self.graph = graph or SyntheticGraph()
+        self._payloads = {}
+
+    def request(self, path: str, method="GET", params={}) -> dict:
+        # Memoized, as repeat requests would be request cache hits
+        key = (path, tuple(sorted(params.items())))
+        res = self._payloads.get(key)
+        if res is None:
+            res = self._payloads[key] = self.graph.payload(path, params)
+        if "status_message" in res:
+            raise RuntimeError(f"TMDB API error: {res['status_message']}")
+        return res
@@ -1,29 +1,76 @@
-import logging, os, requests, xxhash
+import logging, os, threading, time, xxhash
 from datetime import date
-from diskcache import Cache
+from flickflock import metrics, request_cache, tracing
+from flickflock.transport import default_transport
 
 log = logging.getLogger(__name__)
 
+
+class RateLimiter:
+    """Token bucket limiting upstream requests per second (0 disables it)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        # At least one token, or rates below 1/s could never send a request
+        self.capacity = max(1.0, burst or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
 class TMDB:    
     api_key_name = "TMDB_API_KEY"
     tmdb_requests = 0
     cached_requests = 0
-    cache = Cache('.requests', statistics=True)
+    # Shared by every client in the process; TMDB allows ~50 requests/second
+    rate_limiter = RateLimiter(float(os.environ.get("TMDB_RATE_LIMIT", 40)))
+    _counter_lock = threading.Lock()
 
-    def __init__(self, base_url="https://api.themoviedb.org/3", api_key=None, use_cache=True):
-        self.base_url = base_url
+    def __init__(self, base_url=None, api_key=None, use_cache=True, transport=None, search_index=None, typeahead=None):
+        # TMDB_BASE_URL points the client at a stand-in, e.g. flickflock.fake_upstream
+        self.base_url = base_url or os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3")
         self.api_key = api_key
         self.is_authenticated = False
         self.use_cache = use_cache
+        # Sends requests below the cache; see flickflock.transport for record/replay
+        self.transport = transport or default_transport()
+        # Answer searches locally when they can; see flickflock.search_index
+        # and flickflock.typeahead
+        self.search_index = search_index
+        self.typeahead = typeahead
 
         self.authenticate()
 
     def reset_cache(self):
         self.cache_db.truncate()
 
-    def get_cached_request(self, request_id):
+    @staticmethod
+    def cache_namespace(path):
+        """Request cache namespace for an API path (see request_cache.NAMESPACES)."""
+        if path.startswith("search/"):
+            return "tmdb_search"
+        if path.endswith("credits"):
+            return "tmdb_credits"
+        return "tmdb_details"
+
+    def get_cached_request(self, request_id, namespace="tmdb_details"):
         try:
-            cache = self.cache.get(request_id)
+            cache = request_cache.namespace(namespace).get(request_id)
         except Exception as e:
             print(f"Exception when fetching from cache ({request_id}): {e}")
             print("resetting cache...")
@@ -35,8 +82,8 @@ class TMDB:
         else:
             return False
 
-    def set_cached_request(self, request_id, data):
-        self.cache.set(request_id, {
+    def set_cached_request(self, request_id, data, namespace="tmdb_details"):
+        request_cache.namespace(namespace).set(request_id, {
             "date": str(date.today()),
             "data": data
         }, expire=7 * 24 * 3600)  # 7-day TTL
@@ -55,6 +102,18 @@ class TMDB:
         # TODO: check authentication
         
 
+    def _fetch(self, method, path, request_url):
+        if self.transport.remote:
+            self.rate_limiter.acquire()
+        with metrics.UPSTREAM_SECONDS.time(service="tmdb", endpoint=metrics.endpoint(path)), tracing.span("tmdb_upstream"):
+            res = self.transport.fetch("tmdb", method, request_url)
+        with self._counter_lock:
+            self.tmdb_requests += 1
+        if self.search_index is not None and path.endswith("credits"):
+            self.search_index.ingest(res)
+        return res
+
+    @tracing.span("tmdb")
     def request(self, path: str, method="GET", params={}) -> dict:
         """Make a request to the TMDB api and return the result as a dict."""
         params = "&".join([f"{k}={params[k]}" for k in params])
@@ -63,15 +122,19 @@ class TMDB:
 
         if self.use_cache and method == "GET":
             request_id = xxhash.xxh3_64_hexdigest(request_url)
-            res = self.get_cached_request(request_id)
+            namespace = self.cache_namespace(path)
+            res = self.get_cached_request(request_id, namespace)
             if res is False:
-                res = requests.request(method, request_url).json()
-                self.tmdb_requests += 1
-                self.set_cached_request(request_id, res)
+                metrics.CACHE_LOOKUPS.inc(cache=namespace, result="miss")
+                res = self._fetch(method, path, request_url)
+                self.set_cached_request(request_id, res, namespace)
+            else:
+                metrics.CACHE_LOOKUPS.inc(cache=namespace, result="l2_hit")
+                with self._counter_lock:
+                    self.cached_requests += 1
             
         else:
-            res = requests.request(method, request_url).json()
-            self.tmdb_requests += 1
+            res = self._fetch(method, path, request_url)
 
         if "status_message" in res:
             log.error("TMDB API error: %s", res["status_message"])
@@ -80,11 +143,42 @@ class TMDB:
         return res
 
 
-    def search(self, search_query: str, type="multi") -> list:
-        """Provide a search query to search the TMDB database and return a dict with the first page of results."""
+    def search(self, search_query: str, type="multi", client=None, generation=None) -> list:
+        """Provide a search query to search the TMDB database and return a dict with the first page of results.
+
+        client and generation (from typeahead.begin) identify the search, so
+        it is dropped with typeahead.Superseded if client has sent a newer one.
+        """
         print(f"searching for: {search_query}")
 
-        results = self.request(f"search/{type}", params={"query": search_query})["results"]
+        index = self.search_index if type == "multi" else None
+        if index is not None:
+            results = index.lookup(search_query)
+            if results is not None:
+                metrics.SEARCHES.inc(source="index")
+                return results
+
+        typeahead = self.typeahead if type == "multi" else None
+        if typeahead is None:
+            response = self.request(f"search/{type}", params={"query": search_query})
+        else:
+            results = typeahead.refine(search_query)
+            if results is None and typeahead.wait_for_prefix(search_query):
+                results = typeahead.refine(search_query)
+            if results is not None:
+                metrics.SEARCHES.inc(source="refined")
+                if index is not None:
+                    index.answered(search_query, results)
+                return results
+            typeahead.check(client, generation)
+            with typeahead.fetching(search_query):
+                response = self.request(f"search/{type}", params={"query": search_query})
+            typeahead.remember(search_query, response)
+
+        metrics.SEARCHES.inc(source="upstream")
+        results = response["results"]
+        if index is not None:
+            index.answered(search_query, results)
         return self._rank_search_results(results, search_query)
 
     _ARTICLES = {"the ", "a ", "an "}
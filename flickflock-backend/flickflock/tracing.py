@@ -0,0 +1,168 @@
+"""Per-request timing breakdown.
+
+A Trace is bound to the current request's context; span(name) adds the
+time spent in a block to it, so the response can report where its time
+went in a Server-Timing header.  Outside a request span() does nothing.
+
+With profiling enabled (FLOCK_PROFILE_TOKEN set, and a request carrying
+?profile=1 and a matching X-Profile-Token header), a sampler also records
+the stacks of every thread that opened a span for the request and the
+response is replaced by a hot-function report.  Sampling from a separate
+thread needs no profiler hooks in the request threads, so it also covers
+the expansion pool.
+"""
+import contextvars, hmac, os, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_TOKEN = os.environ.get("FLOCK_PROFILE_TOKEN")
+
+# Seconds between profile samples
+_SAMPLE_INTERVAL = 0.001
+
+_current = contextvars.ContextVar("flickflock_trace", default=None)
+
+
+class Sampler:
+    """Statistical profiler for a set of threads, pyinstrument-style."""
+
+    def __init__(self, interval=_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._ticks = 0
+        self._started = time.perf_counter()
+        self._stopped = None
+        self._threads = set()
+        self._self = Counter()
+        self._total = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="flock-profiler", daemon=True)
+        self._thread.start()
+
+    def watch(self, ident):
+        self._threads.add(ident)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            self._ticks += 1
+            for ident in list(self._threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                self.samples += 1
+                self._self[_describe(frame.f_code)] += 1
+                seen = set()
+                while frame is not None:
+                    name = _describe(frame.f_code)
+                    if name not in seen:
+                        seen.add(name)
+                        self._total[name] += 1
+                    frame = frame.f_back
+
+    def stop(self):
+        if self._stopped is None:
+            self._stop.set()
+            self._thread.join()
+            self._stopped = time.perf_counter()
+
+    def report(self, top=30):
+        """The functions with the most samples, on their own and including callees."""
+        # Walking stacks under the GIL stretches the interval; weigh samples by the real one
+        ms = ((self._stopped or time.perf_counter()) - self._started) * 1000 / max(self._ticks, 1)
+        return {
+            "samples": self.samples,
+            "sample_interval_ms": round(ms, 3),
+            "self": [{"function": f, "ms": round(n * ms, 1)} for f, n in self._self.most_common(top)],
+            "total": [{"function": f, "ms": round(n * ms, 1)} for f, n in self._total.most_common(top)],
+        }
+
+
+def _describe(code):
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class Trace:
+    def __init__(self, profile=False):
+        self.started = time.perf_counter()
+        self.spans = {}  # {name: [seconds, count]}
+        self._lock = threading.Lock()
+        self.sampler = Sampler() if profile else None
+        if self.sampler:
+            self.sampler.watch(threading.get_ident())
+
+    def add(self, name, seconds):
+        with self._lock:
+            totals = self.spans.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """The Server-Timing header value: one entry per span name, plus the total.
+
+        Spans in pool threads overlap, so their sum can exceed the total.
+        """
+        with self._lock:
+            parts = [
+                f'{name};dur={seconds * 1000:.1f};desc="{count}x"'
+                for name, (seconds, count) in self.spans.items()
+            ]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def report(self):
+        """Span totals and the sampler's hot functions, for ?profile=1."""
+        if self.sampler:
+            self.sampler.stop()
+        with self._lock:
+            spans = {
+                name: {"ms": round(seconds * 1000, 1), "count": count}
+                for name, (seconds, count) in self.spans.items()
+            }
+        return {
+            "total_ms": round(self.elapsed() * 1000, 1),
+            "spans": spans,
+            "profile": self.sampler.report() if self.sampler else None,
+        }
+
+
+@contextmanager
+def trace(profile=False):
+    """Bind a new Trace to the current context for the duration of a request."""
+    current = Trace(profile=profile)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        if current.sampler:
+            current.sampler.stop()
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to the current request's trace (usable as a decorator)."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    if current.sampler:
+        current.sampler.watch(threading.get_ident())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add(name, time.perf_counter() - started)
+
+
+def in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, so pool threads keep its trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def profiling_allowed(token):
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
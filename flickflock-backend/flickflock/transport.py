@@ -0,0 +1,213 @@
+"""HTTP transports for the TMDB and OMDb clients, with record and replay.
+
+The clients send every upstream request through a transport, below the
+request cache.  The default one goes to the network; FLOCK_TRANSPORT
+switches every client in the process to a cassette, a compact SQLite file
+of zlib-compressed responses keyed by method, path and query (API keys are
+never stored):
+
+    FLOCK_TRANSPORT=record FLOCK_CASSETTE=data/upstream.cassette   live, saving every response
+    FLOCK_TRANSPORT=replay FLOCK_CASSETTE=data/upstream.cassette   no network; unrecorded requests fail
+    FLOCK_REPLAY_LATENCY=1                                          replay sleeps each recorded latency
+
+Run the request cache on a scratch FLOCK_CACHE_DIR while recording, or
+cache hits will never reach the cassette.
+
+    python -m flickflock.transport info data/upstream.cassette
+    python -m flickflock.transport fixtures data/upstream.cassette fixtures.json
+"""
+import json, logging, os, sqlite3, threading, time, zlib
+from urllib.parse import parse_qsl, urlsplit
+
+log = logging.getLogger(__name__)
+
+# Query parameters left out of cassette keys
+SECRET_PARAMS = {"api_key", "apikey"}
+
+
+def request_key(method, url):
+    """(key, path, params) identifying a request regardless of host and API key."""
+    parts = urlsplit(url)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in SECRET_PARAMS)
+    key = f"{method} {parts.path}"
+    if params:
+        key += "?" + "&".join(f"{k}={v}" for k, v in params)
+    return key, parts.path, params
+
+
+class CassetteMiss(LookupError):
+    """A replayed request that was never recorded."""
+
+
+class Cassette:
+    """Recorded responses in a SQLite file."""
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    service TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status INTEGER,
+                    payload BLOB NOT NULL,
+                    latency REAL NOT NULL,
+                    recorded_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+        self._lock = threading.Lock()
+
+    def put(self, service, method, url, status, payload, latency):
+        key, path, params = request_key(method, url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, service, path, params, status, payload, latency, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, service, path, json.dumps(params), status,
+                 zlib.compress(json.dumps(payload).encode()), latency, time.time()),
+            )
+
+    def get(self, method, url):
+        """(payload, latency) recorded for a request, or None."""
+        key = request_key(method, url)[0]
+        with self._lock:
+            row = self._conn.execute("SELECT payload, latency FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def items(self):
+        """Yield (service, path, params, payload) for every recorded response."""
+        with self._lock:
+            rows = self._conn.execute("SELECT service, path, params, payload FROM responses").fetchall()
+        for service, path, params, payload in rows:
+            yield service, path, [tuple(p) for p in json.loads(params)], json.loads(zlib.decompress(payload))
+
+    def info(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT service, COUNT(*), SUM(LENGTH(payload)), AVG(latency) FROM responses GROUP BY service"
+            ).fetchall()
+        return {
+            service: {"responses": count, "bytes": size, "mean_latency_ms": round(latency * 1000, 1)}
+            for service, count, size, latency in rows
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+class HTTPTransport:
+    """Requests go to the network."""
+
+    remote = True
+
+    def fetch(self, service, method, url, timeout=None):
+        import requests  # deferred: importing it costs ~60ms of every cold start
+        return requests.request(method, url, timeout=timeout).json()
+
+
+class RecordingTransport(HTTPTransport):
+    """Requests go to the network and every response is saved to a cassette."""
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def fetch(self, service, method, url, timeout=None):
+        import requests
+        started = time.perf_counter()
+        res = requests.request(method, url, timeout=timeout)
+        payload = res.json()
+        self.cassette.put(service, method, url, res.status_code, payload, time.perf_counter() - started)
+        return payload
+
+
+class ReplayTransport:
+    """Responses come from a cassette, optionally after their recorded latency."""
+
+    remote = False
+
+    def __init__(self, cassette, simulate_latency=False):
+        self.cassette = cassette
+        self.simulate_latency = simulate_latency
+
+    def fetch(self, service, method, url, timeout=None):
+        recorded = self.cassette.get(method, url)
+        if recorded is None:
+            raise CassetteMiss(f"No recorded response for {request_key(method, url)[0]}")
+        payload, latency = recorded
+        if self.simulate_latency:
+            time.sleep(latency)
+        return payload
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_transport():
+    """The transport FLOCK_TRANSPORT selects, shared by every client in the process."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                mode = os.environ.get("FLOCK_TRANSPORT", "http").lower()
+                path = os.environ.get("FLOCK_CASSETTE")
+                if mode == "http":
+                    _default = HTTPTransport()
+                elif not path:
+                    raise ValueError(f"FLOCK_TRANSPORT={mode} needs FLOCK_CASSETTE")
+                elif mode == "record":
+                    log.info("Recording upstream responses to %s", path)
+                    _default = RecordingTransport(Cassette(path))
+                elif mode == "replay":
+                    log.info("Replaying upstream responses from %s", path)
+                    _default = ReplayTransport(
+                        Cassette(path, readonly=True),
+                        simulate_latency=os.environ.get("FLOCK_REPLAY_LATENCY", "") not in ("", "0"),
+                    )
+                else:
+                    raise ValueError(f"FLOCK_TRANSPORT must be http, record or replay, not {mode!r}")
+    return _default
+
+
+def to_fixtures(cassette):
+    """A cassette's responses in the flickflock.fake_upstream fixtures format."""
+    fixtures = {"tmdb": {}, "omdb": {}}
+    for service, path, params, payload in cassette.items():
+        if service == "omdb":
+            imdb_id = dict(params).get("i")
+            if imdb_id:
+                fixtures["omdb"][imdb_id] = payload
+        else:
+            key = path.split("/", 2)[-1] if path.startswith("/3/") else path.lstrip("/")
+            if params:
+                key += "?" + "&".join(f"{k}={v}" for k, v in params)
+            fixtures[service][key] = payload
+    return fixtures
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect upstream cassettes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="count recorded responses per service").add_argument("path")
+    fixtures = sub.add_parser("fixtures", help="convert to flickflock.fake_upstream fixtures")
+    fixtures.add_argument("path")
+    fixtures.add_argument("out")
+    args = parser.parse_args()
+
+    cassette = Cassette(args.path, readonly=True)
+    if args.command == "info":
+        print(json.dumps(cassette.info(), indent=2))
+    else:
+        converted = to_fixtures(cassette)
+        with open(args.out, "w") as f:
+            json.dump(converted, f)
+        print(f"Wrote {sum(len(v) for v in converted.values())} responses to {args.out}")
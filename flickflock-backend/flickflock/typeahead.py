@@ -0,0 +1,143 @@
+"""Fewer upstream searches while users type.
+
+Typing "tarantino" sends "tar", "tara", "taran", ... as the web client's
+debounce fires, each a separate TMDB search/multi call.  TMDB.search uses a
+Typeahead to cut those bursts down:
+
+- A query that extends a recently answered one whose results were complete
+  (TMDB had nothing past the first page) is refined locally: the earlier
+  results are narrowed to those still matching every query word and
+  re-ranked with TMDB._rank_search_results.
+- A query that extends one still in flight upstream waits for it, then
+  tries to refine its results before going upstream itself.
+- A search whose client (the X-Search-Session header) has sent a newer one
+  since is dropped before it reaches TMDB, raising Superseded.
+
+    FLOCK_TYPEAHEAD_MAX_AGE      seconds complete results are refined from (600)
+    FLOCK_TYPEAHEAD_WAIT         seconds a query waits for an in-flight prefix (2)
+"""
+import itertools, os, re, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flickflock import metrics
+from flickflock.tmdb import TMDB
+
+MAX_AGE = float(os.environ.get("FLOCK_TYPEAHEAD_MAX_AGE", 600))
+INFLIGHT_WAIT = float(os.environ.get("FLOCK_TYPEAHEAD_WAIT", 2))
+
+_WORD = re.compile(r"\w+")
+_NAME_FIELDS = ("title", "name", "original_title", "original_name")
+
+
+class Superseded(Exception):
+    """A search dropped because its client has sent a newer one."""
+
+
+def _normalize(query):
+    return " ".join(query.lower().split())
+
+
+def _matches(result, words):
+    """Whether every query word starts a word of the result's title or name."""
+    names = _WORD.findall(" ".join((result.get(f) or "") for f in _NAME_FIELDS).lower())
+    return all(any(name.startswith(w) for name in names) for w in words)
+
+
+class Typeahead:
+    """Complete search results by query, in-flight searches and each client's newest search."""
+
+    def __init__(self, max_age=MAX_AGE, wait=INFLIGHT_WAIT, max_queries=2048, max_clients=10000):
+        self.max_age = max_age
+        self.wait = wait
+        self.max_queries = max_queries
+        self.max_clients = max_clients
+        self._complete = OrderedDict()  # {query: (results, answered_at)}, LRU
+        self._inflight = {}             # {query: Event set once its upstream search is done}
+        self._latest = OrderedDict()    # {client: generation of its newest search}
+        self._generations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # --- Superseded searches ---
+
+    def begin(self, client):
+        """Register a new search from client; returns its generation (None without a client)."""
+        if not client:
+            return None
+        with self._lock:
+            generation = self._latest[client] = next(self._generations)
+            self._latest.move_to_end(client)
+            while len(self._latest) > self.max_clients:
+                self._latest.popitem(last=False)
+        return generation
+
+    def check(self, client, generation):
+        """Raise Superseded if client has begun a newer search than generation."""
+        if generation is not None and self._latest.get(client, generation) != generation:
+            metrics.SEARCHES.inc(source="superseded")
+            raise Superseded(f"Search superseded by a newer one from {client}")
+
+    # --- Prefix reuse ---
+
+    def remember(self, query, response):
+        """Keep a TMDB search response for refining longer queries, if it holds every result."""
+        results = response.get("results") or []
+        total = response.get("total_results")
+        if total is None or total > len(results):
+            return
+        q = _normalize(query)
+        with self._lock:
+            self._complete[q] = (results, time.monotonic())
+            self._complete.move_to_end(q)
+            while len(self._complete) > self.max_queries:
+                self._complete.popitem(last=False)
+
+    def refine(self, query):
+        """Ranked results for query from the complete results of it or a prefix of it, or None."""
+        q = _normalize(query)
+        now = time.monotonic()
+        with self._lock:
+            for n in range(len(q), 0, -1):
+                entry = self._complete.get(q[:n])
+                if entry is not None and now - entry[1] <= self.max_age:
+                    self._complete.move_to_end(q[:n])
+                    results, prefix = entry[0], q[:n]
+                    break
+            else:
+                return None
+        if prefix != q:
+            words = _WORD.findall(q)
+            if not words:
+                return None
+            results = [r for r in results if _matches(r, words)]
+        return TMDB._rank_search_results(results, query)
+
+    @contextmanager
+    def fetching(self, query):
+        """Mark query as in flight upstream while the block runs."""
+        q = _normalize(query)
+        event = threading.Event()
+        with self._lock:
+            self._inflight.setdefault(q, event)
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._inflight.get(q) is event:
+                    del self._inflight[q]
+            event.set()
+
+    def wait_for_prefix(self, query):
+        """Wait for an in-flight search of query or a prefix of it; returns whether there was one."""
+        q = _normalize(query)
+        with self._lock:
+            for n in range(len(q), 0, -1):
+                event = self._inflight.get(q[:n])
+                if event is not None:
+                    break
+            else:
+                return False
+        event.wait(self.wait)
+        return True
+
+
+typeahead = Typeahead()
@@ -0,0 +1,141 @@
+import struct, sys
+from array import array
+
+# Department enum for packed vectors.  Codes are persisted, so only ever
+# append to this list; unknown departments are stored as "" (code 0).
+DEPARTMENTS = [
+    "",
+    "Acting",
+    "Art",
+    "Camera",
+    "Costume & Make-Up",
+    "Creator",
+    "Crew",
+    "Directing",
+    "Editing",
+    "Lighting",
+    "Production",
+    "Sound",
+    "Visual Effects",
+    "Writing",
+]
+DEPARTMENT_CODES = {d: i for i, d in enumerate(DEPARTMENTS)}
+
+# Weight of an entity whose department (or weight) is unknown; flock.py
+# weighs credits with the same default
+DEFAULT_DEPARTMENT_WEIGHT = 0.5
+
+# Blob layout: format version (uint8) and entity count (uint32), followed by
+# parallel little-endian arrays of int32 ids, float32 weights and uint8
+# department codes.
+_HEADER = struct.Struct("<BI")
+_FORMAT_VERSION = 1
+_SWAP = sys.byteorder != "little"
+
+assert array("i").itemsize == 4 and array("f").itemsize == 4
+
+
+class EntityVector:
+    """Compact, read-mostly entity-weight vector for one flock entry.
+
+    Stores parallel arrays instead of a list of {"id", "weight", "department"}
+    dicts.  A vector loaded from storage keeps its raw blob and only decodes
+    the arrays on first access, so loading and re-saving a flock doesn't pay
+    for entries that weren't touched.  Indexing and iteration still yield the
+    dict form for callers that want it.
+    """
+
+    __slots__ = ("_blob", "_ids", "_weights", "_codes")
+
+    def __init__(self, ids=(), weights=(), codes=()):
+        self._blob = None
+        self._ids = array("i", ids)
+        self._weights = array("f", weights)
+        self._codes = array("B", codes)
+
+    @classmethod
+    def from_entities(cls, entities):
+        """Build a vector from weighted entity dicts."""
+        return cls(
+            [e["id"] for e in entities],
+            [e.get("weight", DEFAULT_DEPARTMENT_WEIGHT) for e in entities],
+            [DEPARTMENT_CODES.get(e.get("department", ""), 0) for e in entities],
+        )
+
+    @classmethod
+    def from_bytes(cls, blob):
+        vec = cls.__new__(cls)
+        vec._blob = bytes(blob)
+        vec._ids = vec._weights = vec._codes = None
+        return vec
+
+    def _decode(self):
+        version, count = _HEADER.unpack_from(self._blob)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported entity vector format: {version}")
+        offset = _HEADER.size
+        ids, weights, codes = array("i"), array("f"), array("B")
+        ids.frombytes(self._blob[offset:offset + 4 * count])
+        offset += 4 * count
+        weights.frombytes(self._blob[offset:offset + 4 * count])
+        offset += 4 * count
+        codes.frombytes(self._blob[offset:offset + count])
+        if _SWAP:
+            ids.byteswap()
+            weights.byteswap()
+        self._ids, self._weights, self._codes = ids, weights, codes
+
+    def to_bytes(self):
+        if self._blob is None:
+            ids, weights = self._ids, self._weights
+            if _SWAP:
+                ids, weights = array("i", ids), array("f", weights)
+                ids.byteswap()
+                weights.byteswap()
+            self._blob = (
+                _HEADER.pack(_FORMAT_VERSION, len(self._ids))
+                + ids.tobytes() + weights.tobytes() + self._codes.tobytes()
+            )
+        return self._blob
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._decode()
+        return self._ids
+
+    @property
+    def weights(self):
+        if self._weights is None:
+            self._decode()
+        return self._weights
+
+    @property
+    def departments(self):
+        if self._codes is None:
+            self._decode()
+        return [DEPARTMENTS[c] for c in self._codes]
+
+    def __len__(self):
+        if self._ids is None:
+            return _HEADER.unpack_from(self._blob)[1]
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if self._ids is None:
+            self._decode()
+        return {
+            "id": self._ids[index],
+            "weight": self._weights[index],
+            "department": DEPARTMENTS[self._codes[index]],
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self):
+        return list(self)
+
+    def __repr__(self):
+        return f"EntityVector({len(self)} entities)"
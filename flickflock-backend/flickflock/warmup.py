@@ -0,0 +1,179 @@
+"""Warm the TMDB request cache for popular seeds.
+
+After a deploy or a cache wipe the first visitors pay for every upstream
+call.  warm() fetches what expanding a seed needs (credits for movies and
+shows; details, combined credits and top works' credits for people) for
+a list of seeds or for the most selected ids in flock storage, with
+bounded concurrency and through the TMDB rate limiter.  Warmed seeds are
+recorded, so an interrupted run picks up where it stopped.
+
+    python -m flickflock.warmup --top 500
+    python -m flickflock.warmup movie:603 person:6384
+"""
+import json, logging, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flickflock import storage
+
+log = logging.getLogger(__name__)
+
+# Matches the TMDB request cache TTL: a seed warmed longer ago than this
+# may have expired and is warmed again.
+WARM_MAX_AGE = 7 * 24 * 3600
+
+storage.register_schema("""
+    CREATE TABLE IF NOT EXISTS cache_warmup (
+        seed TEXT PRIMARY KEY,
+        warmed_at REAL NOT NULL
+    )
+""")
+
+
+def parse_seed(seed):
+    """'movie:603' -> ('movie', 603)"""
+    media_type, _, id = seed.partition(":")
+    if media_type not in ("movie", "tv", "person") or not id.isdigit():
+        raise ValueError(f"Invalid seed {seed!r}, expected movie:<id>, tv:<id> or person:<id>")
+    return media_type, int(id)
+
+
+def _current_selections(conn):
+    """Each flock's selection: its snapshot's, then the selection events after it."""
+    # One read transaction, so a snapshot written concurrently can't move
+    # events between the two reads
+    conn.execute("BEGIN")
+    try:
+        selections = {
+            flock_id: json.loads(selection) if selection else []
+            for flock_id, selection in conn.execute(
+                "SELECT flock_id, json_extract(data, '$.selection') FROM flocks"
+            )
+        }
+        events = conn.execute(
+            "SELECT e.flock_id, e.op, e.payload FROM flock_events e "
+            "LEFT JOIN flocks f ON f.flock_id = e.flock_id "
+            "WHERE e.op IN ('add_selection', 'remove_selection') AND e.version > COALESCE(f.version, 0) "
+            "ORDER BY e.flock_id, e.version"
+        ).fetchall()
+    finally:
+        conn.commit()
+    for flock_id, op, payload in events:
+        payload = json.loads(payload)
+        selection = selections.setdefault(flock_id, [])
+        # Mirrors Flock._apply
+        if op == "add_selection":
+            selection.append(payload)
+        else:
+            selections[flock_id] = [s for s in selection if s.get("id") != payload]
+    return selections.values()
+
+
+def popular_seeds(limit):
+    """The seeds in the most flocks' current selections, most popular first."""
+    counts = Counter()
+    for db in storage.shards():
+        with db.connection() as conn:
+            for selection in _current_selections(conn):
+                counts.update({
+                    f"{s.get('media_type')}:{s.get('id')}" for s in selection
+                    if s.get("media_type") in ("movie", "tv", "person") and isinstance(s.get("id"), int)
+                })
+    return [seed for seed, _ in counts.most_common(limit)]
+
+
+def warm_seed(tmdb, seed):
+    """Fetch everything expanding seed requests, so it lands in the request cache."""
+    media_type, id = parse_seed(seed)
+    if media_type == "person":
+        tmdb.get_person_by_id(id)
+        tmdb.get_person_relations_filtered(id)
+    else:
+        tmdb.get_credits(media_type, id)
+
+
+def _warmed_since(seeds, since):
+    with storage.connection() as conn:
+        done = set()
+        for i in range(0, len(seeds), 500):
+            chunk = seeds[i:i + 500]
+            done.update(r[0] for r in conn.execute(
+                f"SELECT seed FROM cache_warmup WHERE warmed_at >= ? AND seed IN ({', '.join('?' * len(chunk))})",
+                (since, *chunk),
+            ))
+    return done
+
+
+def warm(tmdb, seeds, concurrency=4, resume=True, progress_every=50):
+    """Warm the cache for seeds and return a report with the cache hit ratio."""
+    started = time.time()
+    todo = list(dict.fromkeys(seeds))
+    skipped = 0
+    if resume:
+        done = _warmed_since(todo, started - WARM_MAX_AGE)
+        skipped = len(done)
+        todo = [s for s in todo if s not in done]
+
+    hits, misses = tmdb.cached_requests, tmdb.tmdb_requests
+    warmed, failed = 0, []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(warm_seed, tmdb, seed): seed for seed in todo}
+        for n, future in enumerate(as_completed(futures), 1):
+            seed = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                log.warning("Failed to warm %s: %s", seed, e)
+                failed.append(seed)
+            else:
+                warmed += 1
+                storage.write(lambda conn: conn.execute(
+                    "INSERT OR REPLACE INTO cache_warmup (seed, warmed_at) VALUES (?, ?)",
+                    (seed, time.time()),
+                ))
+            if n % progress_every == 0 or n == len(todo):
+                log.info("Warmed %d/%d seeds (%d failed)", n, len(todo), len(failed))
+
+    hits, misses = tmdb.cached_requests - hits, tmdb.tmdb_requests - misses
+    return {
+        "seeds": len(todo) + skipped,
+        "warmed": warmed,
+        "skipped": skipped,
+        "failed": failed,
+        "upstream_requests": misses,
+        "cache_hits": hits,
+        "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+        "seconds": round(time.time() - started, 1),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from flickflock.tmdb import TMDB
+    # Register the flock tables popular_seeds() reads
+    from flickflock import flock
+
+    parser = argparse.ArgumentParser(description="Warm the TMDB request cache")
+    parser.add_argument("seeds", nargs="*", help="seeds such as movie:603, tv:1399 or person:6384")
+    parser.add_argument("--file", help="read seeds from a file, one per line")
+    parser.add_argument("--top", type=int, help="warm the N most selected seeds in flock storage")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--restart", action="store_true", help="ignore progress from earlier runs")
+    args = parser.parse_args()
+
+    seeds = list(args.seeds)
+    if args.file:
+        with open(args.file) as f:
+            seeds += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if args.top:
+        seeds += popular_seeds(args.top)
+    if not seeds:
+        parser.error("no seeds given; pass seeds, --file or --top")
+    for seed in seeds:
+        try:
+            parse_seed(seed)
+        except ValueError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO)
+    report = warm(TMDB(), seeds, concurrency=args.concurrency, resume=not args.restart)
+    print(json.dumps(report, indent=2))
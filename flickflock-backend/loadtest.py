@@ -0,0 +1,267 @@
+"""End-to-end load test: replay user sessions against the app.
+
+Each virtual user loops through sessions the way the web client drives
+the API: search and pick 2-5 seeds (the flock is created once two are
+picked, then each further seed is added on its own), load the flock's
+details and results after every add, then open a few results' details
+and a member's page.  The report has p50/p95/p99 latency, errors and
+throughput per endpoint, and the upstream calls the run caused.
+
+Without --app-url the app is started with uvicorn against a fake TMDB/OMDb
+(flickflock.fake_upstream) and a scratch database and request cache, so
+the run starts cold and costs no TMDB quota:
+
+    python loadtest.py --users 20 --duration 60 --latency-ms 80 --jitter-ms 40
+    python loadtest.py --users 20 --sessions 200 --error-rate 0.02 --out load.json
+    python loadtest.py --app-url http://localhost:8080 --upstream-url http://localhost:8765 --users 50
+
+The app's TMDB rate limiter still applies; set TMDB_RATE_LIMIT=0 to
+measure the app without it.
+"""
+import argparse, json, math, os, random, subprocess, sys, tempfile, threading, time
+from collections import defaultdict
+import requests
+from flickflock.fake_upstream import FakeUpstream, load_fixtures
+from flickflock.synthetic import SyntheticGraph
+
+QUERIES = (
+    "night", "river", "empire", "summer", "ghost", "golden", "storm", "garden",
+    "wild", "dark", "road", "island", "blue", "fire", "house", "secret",
+)
+
+
+class Recorder:
+    """Thread-safe latency samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)  # {endpoint: [(seconds, ok)]}
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples[endpoint].append((seconds, ok))
+
+
+class Client:
+    """One virtual user's HTTP session."""
+
+    def __init__(self, base_url, recorder, http=None, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.http = http or requests.Session()
+        self.timeout = timeout
+
+    def call(self, endpoint, method, path, **kwargs):
+        """Send a request, record it under endpoint and return its JSON (None on failure)."""
+        started = time.perf_counter()
+        try:
+            if self.timeout:
+                kwargs["timeout"] = self.timeout
+            res = self.http.request(method, self.base_url + path, **kwargs)
+            ok = res.status_code < 400
+            body = res.json() if ok else None
+        except Exception:
+            ok, body = False, None
+        self.recorder.add(endpoint, time.perf_counter() - started, ok)
+        return body
+
+
+def run_session(client, rng, think=0.0):
+    """One user's search -> add seeds -> results -> details session."""
+    def pause():
+        if think:
+            time.sleep(rng.uniform(0.5, 1.5) * think)
+
+    selection, flock_id, works, members = [], None, [], {}
+    for _ in range(rng.randint(2, 5)):
+        results = client.call("GET /api/search", "GET", "/api/search", params={"q": rng.choice(QUERIES)})
+        picked = {s["id"] for s in selection}
+        candidates = [r for r in (results or [])[:5] if r.get("id") not in picked and r.get("media_type")]
+        if not candidates:
+            continue
+        item = rng.choice(candidates)
+        selection.append({k: item.get(k) for k in ("id", "media_type", "title", "name")})
+        pause()
+        if len(selection) < 2:
+            continue
+
+        data = selection if len(selection) == 2 else selection[-1:]
+        if flock_id:
+            res = client.call("POST /api/flock/{id}", "POST", f"/api/flock/{flock_id}", json={"data": data})
+        else:
+            res = client.call("POST /api/flock", "POST", "/api/flock", json={"data": data})
+        if not res:
+            continue
+        flock_id = res["flock_id"]
+        details = client.call("GET /api/flock/{id}/details", "GET", f"/api/flock/{flock_id}/details")
+        results = client.call("GET /api/flock/{id}/results", "GET", f"/api/flock/{flock_id}/results")
+        members = (details or {}).get("flock") or members
+        works = (results or {}).get("flock_works") or works
+        pause()
+
+    for work in rng.sample(works[:10], min(len(works), rng.randint(1, 3))):
+        client.call("GET /api/{media_type}/{id}/details", "GET", f"/api/{work['media_type']}/{work['id']}/details")
+        pause()
+    if members:
+        client.call("GET /api/person/{id}", "GET", f"/api/person/{rng.choice(list(members))}")
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(samples, seconds):
+    timings = sorted(s for s, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / seconds, 2) if seconds else None,
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 1),
+        **{f"p{p}_ms": round(percentile(timings, p) * 1000, 1) for p in (50, 95, 99)},
+    }
+
+
+def run(base_url, users=10, duration=None, sessions=None, think=0.0, seed=0, http_factory=None, timeout=60):
+    """Run users concurrent session loops until duration seconds or sessions sessions, and report."""
+    if duration is None and sessions is None:
+        raise ValueError("Set duration or sessions")
+    recorder = Recorder()
+    lock = threading.Lock()
+    started = time.perf_counter()
+    done = {"sessions": 0, "started": 0}
+
+    def user(index):
+        rng = random.Random(f"{seed}:{index}")
+        client = Client(base_url, recorder, http=http_factory() if http_factory else None, timeout=timeout)
+        while duration is None or time.perf_counter() - started < duration:
+            with lock:
+                if sessions is not None and done["started"] >= sessions:
+                    return
+                done["started"] += 1
+            run_session(client, rng, think=think)
+            with lock:
+                done["sessions"] += 1
+
+    threads = [threading.Thread(target=user, args=(i,), name=f"loadtest-user-{i}") for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    return {
+        "users": users,
+        "sessions": done["sessions"],
+        "seconds": round(seconds, 1),
+        "endpoints": {e: summarize(samples, seconds) for e, samples in sorted(recorder.samples.items())},
+        "total": summarize(all_samples, seconds) if all_samples else None,
+    }
+
+
+def upstream_stats(upstream_url):
+    return requests.get(upstream_url.rstrip("/") + "/__stats", timeout=10).json()
+
+
+def start_app(upstream_url, port, workers, env=None):
+    """Start the app with uvicorn against upstream_url, with a scratch database and request cache."""
+    scratch = tempfile.mkdtemp(prefix="flickflock-loadtest-")
+    env = {
+        **os.environ,
+        "TMDB_BASE_URL": upstream_url + "/3",
+        "OMDB_BASE_URL": upstream_url + "/",
+        "TMDB_API_KEY": "loadtest",
+        "OMDB_API_KEY": "loadtest",
+        "FLOCK_DB_PATH": os.path.join(scratch, "flock.db"),
+        "FLOCK_CACHE_DIR": os.path.join(scratch, "requests"),
+        **(env or {}),
+    }
+    env.pop("FLOCK_CACHE_SNAPSHOT", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            requests.get(url + "/healthz", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.01)
+    process.terminate()
+    raise RuntimeError("App did not start within 30 seconds")
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions by {report['users']} users in {report['seconds']}s")
+    print(f"{'endpoint':<36} {'requests':>8} {'errors':>6} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = [*report["endpoints"].items(), *([("total", report["total"])] if report["total"] else [])]
+    for endpoint, s in rows:
+        print(f"{endpoint:<36} {s['requests']:>8} {s['errors']:>6} {s['rps']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}")
+    if report.get("upstream"):
+        print("upstream calls:")
+        for endpoint, count in sorted(report["upstream"]["calls"].items(), key=lambda x: -x[1]):
+            errors = report["upstream"]["errors"].get(endpoint, 0)
+            print(f"  {endpoint:<34} {count:>8}" + (f" ({errors} injected errors)" if errors else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay user sessions against the app and report latencies")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, help="seconds to run for")
+    parser.add_argument("--sessions", type=int, help="sessions to run in total")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-url", help="test a running app instead of starting one")
+    parser.add_argument("--upstream-url", help="fake upstream to read call counts from (with --app-url)")
+    parser.add_argument("--port", type=int, default=8081, help="port for the started app")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started app")
+    parser.add_argument("--fixtures", help="recorded responses for the fake upstream")
+    parser.add_argument("--latency-ms", type=float, default=50, help="fake upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="fake upstream latency noise")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of fake upstream requests that fail")
+    parser.add_argument("--out", help="save the report as JSON")
+    args = parser.parse_args()
+    if args.duration is None and args.sessions is None:
+        args.duration = 30
+
+    upstream = app = None
+    upstream_url = args.upstream_url
+    try:
+        if args.app_url:
+            app_url = args.app_url
+        else:
+            upstream = FakeUpstream(
+                graph=SyntheticGraph(seed=args.seed),
+                fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+                latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                seed=args.seed,
+            ).start()
+            upstream_url = upstream.url
+            app, app_url = start_app(upstream_url, args.port, args.workers)
+
+        before = upstream_stats(upstream_url) if upstream_url else None
+        report = run(app_url, users=args.users, duration=args.duration, sessions=args.sessions,
+                     think=args.think_ms / 1000, seed=args.seed)
+        if upstream_url:
+            after = upstream_stats(upstream_url)
+            report["upstream"] = {
+                kind: {k: v - before[kind].get(k, 0) for k, v in after[kind].items() if v - before[kind].get(k, 0)}
+                for kind in ("calls", "errors")
+            }
+    finally:
+        if app:
+            app.terminate()
+            app.wait()
+        if upstream:
+            upstream.stop()
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,18 +1,100 @@
 import math
 import os
 import logging
-from fastapi import FastAPI, Header, HTTPException, Query, Request
+import threading
+import time
+from typing import Literal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from flickflock.tmdb import TMDB
-from flickflock.flock import Flock
+from flickflock.flock import Flock, build_contribution
+from flickflock.contributions import contributions, seed_key
 from flickflock.bookmarks import BookmarkList
 from flickflock.omdb import OMDb
+from flickflock.rankings import materializer
+from flickflock import maintenance, metrics, request_cache, search_index, storage, tracing
+from flickflock.typeahead import Superseded, typeahead
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-app = FastAPI()
+# Set FLOCK_PREWARM=0 to build the upstream clients and caches on the first
+# request instead of in the background once the app is up
+PREWARM = os.environ.get("FLOCK_PREWARM", "1") not in ("", "0")
+
+# The upstream clients are built on first use rather than at import, so a
+# new instance is ready as soon as the app is; tests and benchmarks can
+# swap them by assigning main.tmdb and main.omdb.
+tmdb = None
+omdb = None
+_clients_lock = threading.Lock()
+
+
+def get_tmdb() -> TMDB:
+    """The process's TMDB client (a route dependency)."""
+    global tmdb
+    if tmdb is None:
+        with _clients_lock:
+            if tmdb is None:
+                tmdb = TMDB(
+                    api_key=os.environ.get("TMDB_API_KEY"),
+                    search_index=search_index.index if search_index.ENABLED else None,
+                    typeahead=typeahead,
+                )
+    return tmdb
+
+
+def get_omdb() -> OMDb:
+    """The process's OMDb client (a route dependency)."""
+    global omdb
+    if omdb is None:
+        with _clients_lock:
+            if omdb is None:
+                omdb = OMDb(api_key=os.environ.get("OMDB_API_KEY", "c215031e"))
+    return omdb
+
+
+def prewarm():
+    """Build the clients and open the request caches and database ahead of the first request."""
+    started = time.perf_counter()
+    try:
+        get_tmdb()
+        get_omdb()
+        import requests  # noqa: F401 (loaded by the HTTP transport on its first fetch)
+        for name in request_cache.NAMESPACES:
+            request_cache.namespace(name)
+        for db in storage.shards():
+            with db.connection():
+                pass
+    except Exception:
+        log.exception("Prewarming failed; the first requests will warm up instead")
+        return
+    log.info("Prewarmed in %.0fms", (time.perf_counter() - started) * 1000)
+    # Slower on a large cache, so last: until it finishes, searches fall back to TMDB more often
+    if search_index.ENABLED:
+        try:
+            search_index.warm()
+        except Exception:
+            log.exception("Indexing the request cache for search failed")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Expire and vacuum abandoned flocks every FLOCK_MAINTENANCE_INTERVAL seconds
+    maintenance.start_background()
+    # Share this worker's metrics with the others' /metrics scrapes
+    metrics.start_publisher()
+    # Warm up without holding back startup, so readiness isn't delayed
+    if PREWARM:
+        threading.Thread(target=prewarm, name="flock-prewarm", daemon=True).start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -28,21 +110,83 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-tmdb = TMDB(api_key=os.environ.get("TMDB_API_KEY"))
-omdb = OMDb(api_key=os.environ.get("OMDB_API_KEY", "c215031e"))
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Report each request's span totals in a Server-Timing header.
+
+    With ?profile=1 and a valid X-Profile-Token, the response is replaced
+    by the span totals and the sampled hot functions for that request.
+    """
+    profile = request.query_params.get("profile") == "1" and tracing.profiling_allowed(
+        request.headers.get("x-profile-token")
+    )
+    with tracing.trace(profile=profile) as trace:
+        response = await call_next(request)
+        if profile:
+            async for _ in response.body_iterator:
+                pass
+            return JSONResponse({"status": response.status_code, **trace.report()})
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.get("/healthz")
+def healthz():
+    """Readiness probe; answers without touching upstream clients, caches or the database."""
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus metrics for upstream calls, caches, storage and scoring."""
+    cache_stats = request_cache.stats()
+    gauges = [
+        (f"flickflock_request_cache_{field}", help,
+         {(name,): stats[field] for name, stats in cache_stats.items()}, ("namespace",))
+        for field, help in [
+            ("hits", "diskcache hits per request cache namespace (all workers)."),
+            ("misses", "diskcache misses per request cache namespace (all workers)."),
+            ("entries", "Entries per request cache namespace."),
+            ("size_bytes", "Disk usage per request cache namespace."),
+            ("size_limit", "Size limit per request cache namespace."),
+        ]
+    ]
+    gauges.append((
+        "flickflock_contribution_cache_items", "Seed contributions held in this worker's LRU.",
+        {(): len(contributions._lru)}, (),
+    ))
+    gauges.append((
+        "flickflock_search_index_docs", "Works and people in this worker's search index.",
+        {(): len(search_index.index)}, (),
+    ))
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+async def search_session(x_search_session: str = Header(None)):
+    """(session, generation) of a search, registered on arrival rather than once a
+    worker thread picks it up, so the session's older searches still queued are dropped."""
+    return x_search_session, typeahead.begin(x_search_session)
 
 
 @app.get("/api/search")
-def search(q: str = Query("", min_length=1)):
+def search(
+    q: str = Query("", min_length=1),
+    session: tuple = Depends(search_session),
+    tmdb: TMDB = Depends(get_tmdb),
+):
+    client, generation = session
     try:
-        return tmdb.search(q)
+        return tmdb.search(q, client=client, generation=generation)
+    except Superseded:
+        raise HTTPException(409, "Superseded by a newer search")
     except Exception:
         log.exception("Search failed for query: %s", q)
         raise HTTPException(500, "Search failed")
 
 
 @app.get("/api/person/{person_id}")
-def get_person_details(person_id: int):
+def get_person_details(person_id: int, tmdb: TMDB = Depends(get_tmdb)):
     try:
         return tmdb.get_person_by_id(person_id)
     except Exception:
@@ -53,17 +197,22 @@ def get_person_details(person_id: int):
 # --- Flock routes MUST come before the generic {media_type}/{content_id} routes ---
 # FastAPI matches routes in definition order; the generic parameterized routes
 # would otherwise swallow /api/flock/... paths and fail parsing the UUID as int.
+#
+# Flock routes are async: they load and save flocks on the storage module's
+# database threads, and only hand scoring and TMDB calls to the threadpool.
 
 @app.get("/api/flock/{flock_id}/details")
-def flock_details(flock_id: str):
+async def flock_details(flock_id: str):
     if not flock_id:
         raise HTTPException(400, "Invalid Flock ID")
     try:
-        f = Flock(flock_id=flock_id)
+        f = await Flock.load_async(flock_id=flock_id)
         return {
             "flock_id": f.flock_id,
             "selection": f.get_selection(),
-            "flock": f.get_flock(details_function=person_details_func, most_common=25),
+            "flock": await run_in_threadpool(
+                f.get_flock, details_function=person_details_func, most_common=25,
+            ),
         }
     except Exception:
         log.exception("Failed to get flock details %s", flock_id)
@@ -71,94 +220,171 @@ def flock_details(flock_id: str):
 
 
 @app.get("/api/flock/{flock_id}/results")
-def flock_results(flock_id: str):
+async def flock_results(
+    flock_id: str,
+    genre: int | None = None,
+    media_type: Literal["movie", "tv"] | None = None,
+    year_from: int | None = None,
+    year_to: int | None = None,
+    sort: Literal["score", "popularity", "release_date"] = "score",
+    limit: int = Query(50, ge=1, le=200),
+    cursor: int | None = Query(None, ge=0),
+):
+    """Ranked works for a flock, optionally filtered, re-sorted and paged.
+
+    The full ranking is built once per flock version and cached, so
+    changing filters or paging never re-scores the flock.
+    """
     if not flock_id:
         raise HTTPException(400, "Invalid Flock ID")
     try:
-        f = Flock(flock_id=flock_id)
-        works = f.get_flock_works(tmdb_movies_from_person, most_common=50)
-
-        # Filter out low-quality entries: no overview or very few votes
-        works = [
-            w for w in works
-            if len(w.get("overview") or "") >= 20
-            and (w.get("vote_count") or 0) >= 5
-        ]
-
-        # Quality boost: gently re-rank using TMDB ratings
-        # A well-rated film (8+) gets up to ~1.0x, poorly rated (~4) gets ~0.82x
-        for w in works:
-            vote_avg = w.get("vote_average") or 0
-            vote_count = w.get("vote_count") or 0
-            if vote_count >= 10 and vote_avg > 0:
-                quality = vote_avg / 10.0  # normalize to 0..1
-                w["count"] = round(w["count"] * (0.7 + 0.3 * quality), 2)
-        # Animation penalty: voice roles in animated content are less relevant
-        ANIMATION_GENRE_ID = 16
-        for w in works:
-            genre_ids = w.get("_genre_ids") or []
-            if ANIMATION_GENRE_ID in genre_ids:
-                w["count"] = round(w["count"] * 0.5, 2)
-
-        for w in works:
-            w.pop("_genre_ids", None)
-
-        works.sort(key=lambda x: x["count"], reverse=True)
-
-        # Enrich connected_member_ids with names/profile info for "why this" display
-        # Collect all unique member IDs first, then batch-fetch details
-        all_member_ids = set()
-        for w in works[:50]:
-            for entry in w.get("connected_member_ids", []):
-                all_member_ids.add(entry["id"])
-        member_details = {}
-        for pid in all_member_ids:
-            try:
-                details = tmdb.get_person_by_id(pid)  # cached from flock load
-                member_details[pid] = {
-                    "name": details.get("name", ""),
-                    "profile_path": details.get("profile_path"),
-                }
-            except Exception:
-                pass
-        for w in works[:50]:
-            connected = []
-            for entry in w.get("connected_member_ids", []):
-                pid = entry["id"]
-                if pid in member_details:
-                    connected.append({
-                        "id": pid,
-                        "name": member_details[pid]["name"],
-                        "profile_path": member_details[pid]["profile_path"],
-                        "role": entry.get("role", ""),
-                    })
-            w["connected_members"] = connected
-            w["member_count"] = len(connected)
-            w.pop("connected_member_ids", None)
-
+        f = await Flock.load_async(flock_id=flock_id)
+
+        def results_page():
+            with tracing.span("ranking"):
+                ranking = materializer.get_or_build(f.flock_id, f.version, lambda: ranked_works(f))
+            works, next_cursor, total = ranking.query(
+                genre=genre,
+                media_type=media_type,
+                year_from=year_from,
+                year_to=year_to,
+                sort=sort,
+                limit=limit,
+                cursor=cursor,
+            )
+            return enrich_members(works), next_cursor, total
+
+        page, next_cursor, total = await run_in_threadpool(results_page)
         return {
             "flock_id": f.flock_id,
             "selection": f.get_selection(),
-            "flock_works": works[:50],
+            "flock_works": page,
+            "total": total,
+            "next_cursor": next_cursor,
         }
     except Exception:
         log.exception("Failed to get flock results %s", flock_id)
         raise HTTPException(500, "Failed to load results")
 
 
+# Kept on ranked works for "why this" and the genre facet, but not part of
+# the /results payload.
+_RANKING_ONLY_KEYS = frozenset({"connected_member_ids", "genre_ids"})
+
+
+@tracing.span("enrich")
+def enrich_members(works):
+    """Copies of a results page with connected member names and photos filled in."""
+    # Enrich connected_member_ids with names/profile info for "why this" display
+    # Collect all unique member IDs first, then batch-fetch details
+    all_member_ids = set()
+    for w in works:
+        for entry in w.get("connected_member_ids", []):
+            all_member_ids.add(entry["id"])
+    member_details = {}
+    for pid in all_member_ids:
+        try:
+            details = get_tmdb().get_person_by_id(pid)  # cached from flock load
+            member_details[pid] = {
+                "name": details.get("name", ""),
+                "profile_path": details.get("profile_path"),
+            }
+        except Exception:
+            pass
+    page = []
+    for w in works:
+        connected = []
+        for entry in w.get("connected_member_ids", []):
+            pid = entry["id"]
+            if pid in member_details:
+                connected.append({
+                    "id": pid,
+                    "name": member_details[pid]["name"],
+                    "profile_path": member_details[pid]["profile_path"],
+                    "role": entry.get("role", ""),
+                })
+        # Cached works are shared, so enrich a copy
+        w = {k: v for k, v in w.items() if k not in _RANKING_ONLY_KEYS}
+        w["connected_members"] = connected
+        w["member_count"] = len(connected)
+        page.append(w)
+    return page
+
+
+def ranked_works(f):
+    """The flock's full results ranking, before paging and member enrichment."""
+    return f.get_flock_works(
+        tmdb_movies_from_person,
+        most_common=50,
+        filters=RESULT_FILTERS,
+        multipliers=RESULT_MULTIPLIERS,
+    )
+
+
+def materialize_results(f):
+    """Start building f's results ranking in the background, so /results finds it ready."""
+    flock_id, version = f.flock_id, f.version
+
+    def build():
+        # Load a private copy; skip if the flock has moved on since
+        latest = Flock(flock_id=flock_id)
+        return ranked_works(latest) if latest.version == version else None
+
+    materializer.submit(flock_id, version, build)
+
+
+# /results pipeline stages, pushed down into get_flock_works so works that
+# fail a filter are dropped before they are scored or copied.
+
+def has_overview(work):
+    """Drop works without a real overview."""
+    return len(work.get("overview") or "") >= 20
+
+
+def has_votes(work):
+    """Drop works with very few votes."""
+    return (work.get("vote_count") or 0) >= 5
+
+
+def quality_multiplier(work):
+    """Quality boost: gently re-rank using TMDB ratings.
+
+    A well-rated film (8+) gets up to ~1.0x, poorly rated (~4) gets ~0.82x.
+    """
+    vote_avg = work.get("vote_average") or 0
+    vote_count = work.get("vote_count") or 0
+    if vote_count >= 10 and vote_avg > 0:
+        quality = vote_avg / 10.0  # normalize to 0..1
+        return 0.7 + 0.3 * quality
+    return None
+
+
+ANIMATION_GENRE_ID = 16
+
+
+def animation_multiplier(work):
+    """Animation penalty: voice roles in animated content are less relevant."""
+    return 0.5 if ANIMATION_GENRE_ID in (work.get("genre_ids") or []) else None
+
+
+RESULT_FILTERS = (has_overview, has_votes)
+RESULT_MULTIPLIERS = (quality_multiplier, animation_multiplier)
+
+
 @app.post("/api/flock/{flock_id}/remove")
-def flock_remove(flock_id: str, request_body: dict):
+async def flock_remove(flock_id: str, request_body: dict):
     selection_id = request_body.get("selection_id") if request_body else None
     if not selection_id:
         raise HTTPException(400, "Missing selection_id")
     try:
-        f = Flock(flock_id=flock_id)
+        f = await Flock.load_async(flock_id=flock_id)
         f.remove_selection(selection_id)
-        f.sync_flock()
+        await f.sync_flock_async()
+        materialize_results(f)
         return {
             "flock_id": f.flock_id,
             "selection": f.get_selection(),
-            "flock": f.get_flock(most_common=25),
+            "flock": await run_in_threadpool(f.get_flock, most_common=25),
         }
     except Exception:
         log.exception("Failed to remove selection from flock %s", flock_id)
@@ -166,66 +392,106 @@ def flock_remove(flock_id: str, request_body: dict):
 
 
 @app.get("/api/flock/{flock_id}")
-def get_flock(flock_id: str):
+async def get_flock(flock_id: str):
     if flock_id in ("", "None"):
         raise HTTPException(400, "Invalid Flock ID")
     try:
-        f = Flock(flock_id=flock_id)
+        f = await Flock.load_async(flock_id=flock_id)
         return {
             "flock_id": f.flock_id,
             "selection": f.get_selection(),
-            "flock": f.get_flock(most_common=25),
+            "flock": await run_in_threadpool(f.get_flock, most_common=25),
         }
     except Exception:
         log.exception("Failed to get flock %s", flock_id)
         raise HTTPException(500, "Failed to load flock")
 
 
+# Max seeds expanded in parallel for one update request.  Person expansion
+# fetches its top works' credits sequentially, so this also bounds how many
+# TMDB calls a single onboarding POST can have in flight.
+_MAX_EXPANSION_WORKERS = 4
+
+
+def expand_selection(item):
+    """Resolve the flock contributions for one selected movie, show or person.
+
+    Contributions are built once per seed and shared across flocks through the
+    contribution cache, so re-adding a popular seed is a single lookup.
+    Returns a list of (version key, source_type) pairs for Flock.add_seed_to_flock.
+    """
+    media_type = item["media_type"]
+    item_id = item["id"]
+
+    if media_type == "person":
+        def direct():
+            person = get_tmdb().get_person_by_id(item_id)
+            return [{"id": item_id,
+                     "department": person.get("known_for_department", "Acting"),
+                     "order": 0}]
+
+        def transitive():
+            relations = get_tmdb().get_person_relations_filtered(item_id)
+            return [p for p in relations if p.get("id") != item_id]
+
+        seeds = [
+            (seed_key("person_direct", item_id), direct),
+            (seed_key("person_transitive", item_id, max_works=20, max_cast=15), transitive),
+        ]
+    elif media_type in ("movie", "tv"):
+        seeds = [(
+            seed_key(media_type, item_id, max_cast=20),
+            lambda: get_tmdb().get_people_by_media_id_filtered(item_id, media_type, max_cast=20),
+        )]
+    else:
+        return []
+
+    expanded = []
+    for key, fetch in seeds:
+        source_type = key.split(":", 1)[0]
+        version = contributions.get_or_build(key, lambda: build_contribution(fetch(), source_type))
+        expanded.append((version, source_type))
+    return expanded
+
+
+def add_selections(f, items):
+    """Expand selected items and add them and their seeds to flock f (unsynced)."""
+    # Expand seeds concurrently, but apply them in request order so the
+    # resulting flock (and its scores) doesn't depend on fetch timing.
+    workers = min(len(items), _MAX_EXPANSION_WORKERS)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            expansions = list(pool.map(tracing.in_context(expand_selection), items))
+    else:
+        expansions = [expand_selection(i) for i in items]
+
+    for item, expanded in zip(items, expansions):
+        f.update_selection(item)
+        for key, source_type in expanded:
+            f.add_seed_to_flock(
+                key,
+                primary_id=item["id"],
+                source_type=source_type,
+            )
+
+
 @app.post("/api/flock")
 @app.post("/api/flock/{flock_id}")
-def update_flock(request_body: dict, flock_id: str | None = None):
+async def update_flock(request_body: dict, flock_id: str | None = None):
     try:
-        f = Flock(flock_id=flock_id)
+        f = await Flock.load_async(flock_id=flock_id)
         data_items = request_body.get("data")
         if not data_items:
             raise HTTPException(400, "Request body must include 'data' array")
 
-        for item in data_items:
-            if "id" not in item or "media_type" not in item:
-                continue
-
-            f.update_selection(item)
-            media_type = item["media_type"]
-
-            if media_type == "person":
-                person = tmdb.get_person_by_id(item["id"])
-                f.add_to_flock(
-                    [{"id": item["id"],
-                      "department": person.get("known_for_department", "Acting"),
-                      "order": 0}],
-                    primary_id=item["id"],
-                    source_type="person_direct",
-                )
-                relations = tmdb.get_person_relations_filtered(item["id"])
-                f.add_to_flock(
-                    [p for p in relations if p.get("id") != item["id"]],
-                    primary_id=item["id"],
-                    source_type="person_transitive",
-                )
-            elif media_type in ("movie", "tv"):
-                people = tmdb.get_people_by_media_id_filtered(
-                    item["id"], media_type, max_cast=20
-                )
-                f.add_to_flock(
-                    people,
-                    primary_id=item["id"],
-                    source_type=media_type,
-                )
-
+        items = [i for i in data_items if "id" in i and "media_type" in i]
+        await run_in_threadpool(add_selections, f, items)
+        await f.sync_flock_async()
+        materialize_results(f)
         return {
             "flock_id": f.flock_id,
             "selection": f.get_selection(),
-            "flock": f.get_flock(most_common=25),
+            "flock": await run_in_threadpool(f.get_flock, most_common=25),
         }
     except HTTPException:
         raise
@@ -235,33 +501,43 @@ def update_flock(request_body: dict, flock_id: str | None = None):
 
 
 # --- Bookmark routes ---
+# These only touch SQLite, so they are async and await the storage threads
+# instead of occupying the request threadpool.
 
 @app.get("/api/bookmarks")
-def get_bookmarks(x_user_id: str = Header(None)):
-    """Get the current user's bookmark list."""
+async def get_bookmarks(
+    x_user_id: str = Header(None),
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: int | None = None,
+):
+    """Get the current user's bookmark list, optionally one page at a time."""
     if not x_user_id:
         raise HTTPException(400, "X-User-Id header required")
     try:
-        bl = BookmarkList(user_id=x_user_id)
-        return bl.to_dict()
+        bl = await BookmarkList.load_async(user_id=x_user_id)
+        return await bl.to_dict_async(limit=limit, cursor=cursor)
     except Exception:
         log.exception("Failed to get bookmarks for user %s", x_user_id)
         raise HTTPException(500, "Failed to load bookmarks")
 
 
 @app.get("/api/bookmarks/{list_id}")
-def get_bookmark_list(list_id: str):
+async def get_bookmark_list(
+    list_id: str,
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: int | None = None,
+):
     """Get a bookmark list by its public ID (for sharing)."""
     try:
-        bl = BookmarkList(list_id=list_id)
-        return bl.to_dict()
+        bl = await BookmarkList.load_async(list_id=list_id)
+        return await bl.to_dict_async(limit=limit, cursor=cursor)
     except Exception:
         log.exception("Failed to get bookmark list %s", list_id)
         raise HTTPException(500, "Failed to load bookmark list")
 
 
 @app.post("/api/bookmarks")
-def add_bookmark(request_body: dict, x_user_id: str = Header(None)):
+async def add_bookmark(request_body: dict, x_user_id: str = Header(None)):
     """Add an item to the user's bookmark list."""
     if not x_user_id:
         raise HTTPException(400, "X-User-Id header required")
@@ -269,23 +545,23 @@ def add_bookmark(request_body: dict, x_user_id: str = Header(None)):
     if not item or "id" not in item or "media_type" not in item:
         raise HTTPException(400, "Request body must include 'item' with id and media_type")
     try:
-        bl = BookmarkList(user_id=x_user_id)
-        bl.add(item)
-        return bl.to_dict()
+        bl = await BookmarkList.load_async(user_id=x_user_id)
+        await bl.add_async(item)
+        return await bl.to_dict_async()
     except Exception:
         log.exception("Failed to add bookmark for user %s", x_user_id)
         raise HTTPException(500, "Failed to add bookmark")
 
 
 @app.delete("/api/bookmarks/{media_type}/{media_id}")
-def remove_bookmark(media_type: str, media_id: int, x_user_id: str = Header(None)):
+async def remove_bookmark(media_type: str, media_id: int, x_user_id: str = Header(None)):
     """Remove an item from the user's bookmark list."""
     if not x_user_id:
         raise HTTPException(400, "X-User-Id header required")
     try:
-        bl = BookmarkList(user_id=x_user_id)
-        bl.remove(media_id, media_type)
-        return bl.to_dict()
+        bl = await BookmarkList.load_async(user_id=x_user_id)
+        await bl.remove_async(media_id, media_type)
+        return await bl.to_dict_async()
     except Exception:
         log.exception("Failed to remove bookmark for user %s", x_user_id)
         raise HTTPException(500, "Failed to remove bookmark")
@@ -294,7 +570,12 @@ def remove_bookmark(media_type: str, media_id: int, x_user_id: str = Header(None
 # --- Generic media routes AFTER flock routes to avoid shadowing ---
 
 @app.get("/api/{media_type}/{content_id}/details")
-def get_media_details(content_id: int, media_type: str):
+def get_media_details(
+    content_id: int,
+    media_type: str,
+    tmdb: TMDB = Depends(get_tmdb),
+    omdb: OMDb = Depends(get_omdb),
+):
     if media_type not in ("movie", "tv"):
         raise HTTPException(400, "media_type must be 'movie' or 'tv'")
     try:
@@ -341,7 +622,7 @@ def get_media_details(content_id: int, media_type: str):
 
 
 @app.get("/api/{media_type}/{content_id}")
-def get_content_details(content_id: int, media_type: str):
+def get_content_details(content_id: int, media_type: str, tmdb: TMDB = Depends(get_tmdb)):
     if media_type not in ("movie", "tv"):
         raise HTTPException(400, "media_type must be 'movie' or 'tv'")
     try:
@@ -353,7 +634,7 @@ def get_content_details(content_id: int, media_type: str):
 
 def person_details_func(id):
     keys = ["id", "name", "biography", "birthday", "known_for_department", "popularity", "profile_path"]
-    details = tmdb.get_person_by_id(id)
+    details = get_tmdb().get_person_by_id(id)
     return {k: details.get(k, "") for k in keys}
 
 
@@ -365,7 +646,7 @@ def tmdb_movies_from_person(id):
     keys = ["id", "overview", "media_type", "poster_path", "popularity", "first_air_date", "release_date", "original_language", "vote_average", "vote_count"]
     excluded = TMDB.EXCLUDED_GENRE_IDS
     results = []
-    person_details = tmdb.get_person_by_id(id)
+    person_details = get_tmdb().get_person_by_id(id)
     for i in [*person_details.get("cast", []), *person_details.get("crew", [])]:
         # Skip talk shows, news, etc. — they pollute results
         if set(i.get("genre_ids", [])) & excluded:
@@ -390,7 +671,7 @@ def tmdb_movies_from_person(id):
         results.append({
             "title": title,
             "_role": role,
-            "_genre_ids": i.get("genre_ids", []),
+            "genre_ids": i.get("genre_ids", []),
             **{k: i.get(k, "") for k in keys},
         })
     return results
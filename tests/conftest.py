@@ -0,0 +1,22 @@
+import pytest
+from flickflock import maintenance, request_cache, storage
+from flickflock.contributions import contributions
+from flickflock.rankings import rankings
+
+
+@pytest.fixture(autouse=True)
+def scratch_db(tmp_path, monkeypatch):
+    """Run every test against its own database, flock archive and request cache."""
+    original = storage._path, len(storage.shards())
+    path = str(tmp_path / "flock.db")
+    storage.configure(path=path, shards=1)
+    monkeypatch.setattr(maintenance, "_ARCHIVE_PATH", str(tmp_path / "flock-archive.db"))
+    monkeypatch.setattr(request_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(request_cache, "LEGACY_CACHE_DIR", str(tmp_path / ".requests"))
+    monkeypatch.setattr(request_cache, "_caches", {})
+    contributions.clear_memory()
+    rankings.clear()
+    yield path
+    storage.configure(*original)
+    contributions.clear_memory()
+    rankings.clear()
@@ -0,0 +1,50 @@
+import pytest
+from flickflock import storage
+from flickflock.synthetic import SyntheticGraph, SyntheticTMDB
+
+
+@pytest.fixture
+def bench(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMDB_API_KEY", "test")
+    import bench
+    original = storage.default.path
+    yield bench
+    storage.configure(path=original, shards=1)
+
+
+def test_graph_is_deterministic():
+    a, b = SyntheticGraph(seed=1), SyntheticGraph(seed=1)
+    assert a.combined_credits(42) == b.combined_credits(42)
+    assert a.credits(100) == b.credits(100)
+    assert a.credits(100) != SyntheticGraph(seed=2).credits(100)
+
+
+def test_graph_serves_tmdb_shaped_payloads():
+    tmdb = SyntheticTMDB(SyntheticGraph(filmography=25))
+    person = tmdb.get_person_by_id(7)
+    assert person["name"] and len(person["cast"]) + len(person["crew"]) == 25
+    assert tmdb.get_external_ids("movie", 10)["imdb_id"] == "tt0000010"
+    assert tmdb.get_person_relations_filtered(7, max_works=5, max_cast_per_work=3)
+    assert tmdb.search("night")[0]
+    # Odd work ids are TV shows, so there is no movie 11
+    with pytest.raises(RuntimeError):
+        tmdb.get_details("movie", 11)
+
+
+def test_bench_runs_and_compares(bench, tmp_path):
+    scenario = {"selections": 3, "person_share": 0.5, "filmography": 10, "max_works": 3, "max_cast": 5, "index_docs": 200}
+    results = bench.run({"tiny": scenario}, repeat=1, db_path=str(tmp_path / "bench.db"))
+    tiny = results["scenarios"]["tiny"]
+    assert tiny["flock"]["members"] > 0
+    assert set(tiny["stages"]) == {
+        "score_flock", "get_flock", "get_flock_works", "results_postprocess", "flock_results", "search_lookup",
+    }
+    assert all(m["min_ms"] > 0 and m["peak_kib"] > 0 for m in tiny["stages"].values())
+
+    rows, regressions = bench.compare(results, results)
+    assert rows and not regressions
+    slower = {"scenarios": {"tiny": {**tiny, "stages": {
+        stage: {**m, "min_ms": m["min_ms"] * 2} for stage, m in tiny["stages"].items()
+    }}}}
+    _, regressions = bench.compare(slower, results, threshold=0.5)
+    assert len(regressions) == len(tiny["stages"])
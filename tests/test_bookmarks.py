@@ -1,4 +1,8 @@
+import asyncio
+import json
+import sqlite3
 import pytest
+from flickflock import storage
 from flickflock.bookmarks import BookmarkList
 
 
@@ -84,3 +88,116 @@ def test_different_media_types_same_id():
     bl.remove(100, "movie")
     assert len(bl.items) == 1
     assert bl.items[0]["media_type"] == "tv"
+
+
+def test_add_and_remove_write_single_rows():
+    bl = BookmarkList(user_id="test-user-rows")
+    for i in range(10):
+        bl.add({"id": i, "title": f"Film {i}", "media_type": "movie"})
+    bl.remove(3, "movie")
+
+    with storage.connection() as conn:
+        count = conn.execute(
+            "SELECT COUNT(*) FROM bookmark_items WHERE list_id = ?", (bl.list_id,)
+        ).fetchone()[0]
+        items_json = conn.execute(
+            "SELECT items FROM bookmark_lists WHERE list_id = ?", (bl.list_id,)
+        ).fetchone()[0]
+    assert count == 9
+    assert items_json == "[]"
+
+
+def test_paginated_reads():
+    bl = BookmarkList(user_id="test-user-pages")
+    for i in range(5):
+        bl.add({"id": i, "title": f"Film {i}", "media_type": "movie"})
+
+    first, cursor = bl.page(limit=2)
+    second, cursor2 = bl.page(limit=2, cursor=cursor)
+    third, cursor3 = bl.page(limit=2, cursor=cursor2)
+    assert [i["id"] for i in first + second + third] == [0, 1, 2, 3, 4]
+    assert cursor3 is None
+
+    d = bl.to_dict(limit=2)
+    assert len(d["items"]) == 2
+    assert d["next_cursor"] == cursor
+
+
+def test_rowid_cursors_survive_the_position_migration(tmp_path):
+    path = str(tmp_path / "rowids.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE bookmark_lists (list_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+            "items TEXT NOT NULL DEFAULT '[]', updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE bookmark_items (list_id TEXT NOT NULL, media_type TEXT NOT NULL, "
+            "media_id INTEGER NOT NULL, data TEXT NOT NULL, added_at REAL NOT NULL, "
+            "UNIQUE (list_id, media_type, media_id))"
+        )
+        conn.execute("CREATE INDEX idx_bookmark_items_list_id ON bookmark_items(list_id)")
+        conn.execute("INSERT INTO bookmark_lists VALUES ('rowid-list', 'rowid-user', '[]', 0)")
+        for i in range(4):
+            conn.execute(
+                "INSERT INTO bookmark_items VALUES ('rowid-list', 'movie', ?, ?, 0)",
+                (i, json.dumps({"id": i, "media_type": "movie"})),
+            )
+    storage.configure(path=path, shards=1)
+
+    bl = BookmarkList(list_id="rowid-list")
+    # A cursor handed out before the migration was the rowid of item 1
+    rest, _ = bl.page(cursor=2)
+    assert [i["id"] for i in rest] == [2, 3]
+    bl.add({"id": 4, "media_type": "tv"})
+    with storage.connection() as conn:
+        conn.execute("VACUUM")
+    first, cursor = bl.page(limit=3)
+    second, _ = bl.page(limit=3, cursor=cursor)
+    assert [i["id"] for i in first + second] == [0, 1, 2, 3, 4]
+
+
+def test_legacy_json_items_migrated_on_load():
+    with storage.connection() as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO bookmark_lists (list_id, user_id, items, updated_at) VALUES (?, ?, ?, 0)",
+            ("legacy-list", "legacy-user", json.dumps([
+                {"id": 1, "title": "Old A", "media_type": "movie"},
+                {"id": 2, "title": "Old B", "media_type": "tv"},
+            ])),
+        )
+
+    bl = BookmarkList(list_id="legacy-list")
+    assert [i["title"] for i in bl.items] == ["Old A", "Old B"]
+    bl.add({"id": 1, "title": "Old A", "media_type": "movie"})
+    assert len(BookmarkList(user_id="legacy-user").items) == 2
+
+
+def test_legacy_items_without_media_type_are_kept():
+    with storage.connection() as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO bookmark_lists (list_id, user_id, items, updated_at) VALUES (?, ?, ?, 0)",
+            ("untyped-list", "untyped-user", json.dumps([
+                {"id": 1, "title": "Old Movie"},
+                {"id": 2, "name": "Old Show"},
+            ])),
+        )
+
+    bl = BookmarkList(list_id="untyped-list")
+    assert [(i["id"], i["media_type"]) for i in bl.items] == [(1, "movie"), (2, "tv")]
+    bl.remove(2, "tv")
+    assert [i["id"] for i in BookmarkList(user_id="untyped-user").items] == [1]
+
+
+def test_async_api_matches_sync_api():
+    async def main():
+        bl = await BookmarkList.load_async(user_id="async-user")
+        await bl.add_async({"id": 1, "media_type": "movie", "title": "A"})
+        await bl.add_async({"id": 2, "media_type": "tv", "title": "B"})
+        await bl.remove_async(1, "movie")
+        shared = await BookmarkList.load_async(list_id=bl.list_id)
+        return bl, await shared.to_dict_async(), await shared.to_dict_async(limit=1)
+
+    bl, data, page = asyncio.run(main())
+    assert data == BookmarkList(user_id="async-user").to_dict()
+    assert [i["id"] for i in data["items"]] == [2]
+    assert page["next_cursor"] is None and len(page["items"]) == 1
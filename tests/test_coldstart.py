@@ -0,0 +1,23 @@
+import coldstart
+
+
+def test_import_defers_clients_and_heavy_modules():
+    report = coldstart.measure_import()
+    assert report["loaded"] == []
+    assert report["clients_built"] is False
+    assert report["import_ms"] > 0
+
+
+def test_clients_are_built_once_on_first_use(monkeypatch):
+    monkeypatch.setenv("TMDB_API_KEY", "test")
+    import main
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "tmdb", None)
+    monkeypatch.setattr(main, "omdb", None)
+
+    assert TestClient(main.app).get("/healthz").json() == {"status": "ok"}
+    assert main.tmdb is None
+
+    tmdb = main.get_tmdb()
+    assert main.get_tmdb() is tmdb is main.tmdb
+    assert main.get_omdb() is main.omdb
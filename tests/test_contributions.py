@@ -0,0 +1,142 @@
+import threading, time
+import pytest
+from flickflock.contributions import ContributionCache, seed_key
+from flickflock.flock import Flock, build_contribution, _TRANSITIVE_CAP
+
+
+def test_seed_key_includes_sorted_params():
+    assert seed_key("movie", 603) == "movie:603"
+    assert seed_key("person_transitive", 31, max_works=20, max_cast=15) == \
+        "person_transitive:31:max_cast=15,max_works=20"
+
+
+def test_set_and_get_round_trip():
+    cache = ContributionCache()
+    key = seed_key("movie", 1001, max_cast=20)
+    version = cache.set(key, [{"id": 1, "weight": 5.0, "department": "Directing"}])
+
+    assert version.startswith(key + "@")
+    assert cache.get(version)[0]["id"] == 1
+
+    # A fresh cache (e.g. another worker) reads it back from SQLite
+    other = ContributionCache()
+    assert other.current(key) == version
+    assert other.get(version).to_list() == [{"id": 1, "weight": 5.0, "department": "Directing"}]
+
+
+def test_get_or_build_builds_once():
+    cache = ContributionCache()
+    key = seed_key("movie", 1002, max_cast=20)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return [{"id": 2, "weight": 3.0, "department": "Acting"}]
+
+    version = cache.get_or_build(key, build)
+    assert cache.get_or_build(key, build) == version
+    assert len(calls) == 1
+
+
+def test_concurrent_misses_build_once():
+    cache = ContributionCache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.05)
+        return [{"id": 4, "weight": 1.0, "department": "Acting"}]
+
+    versions = []
+    threads = [
+        threading.Thread(target=lambda: versions.append(cache.get_or_build("movie:1004", build)))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert len(set(versions)) == 1
+
+
+def test_rebuild_leaves_existing_flocks_unchanged():
+    cache = ContributionCache()
+    key = seed_key("movie", 1005)
+    old = cache.set(key, [{"id": 5, "weight": 1.0, "department": "Acting"}])
+    time.sleep(0.01)
+
+    new = cache.get_or_build(key, lambda: [{"id": 6, "weight": 2.0, "department": "Acting"}], max_age=0)
+    assert new != old and cache.current(key) == new
+    assert cache.get(old)[0]["id"] == 5
+    assert cache.get(new)[0]["id"] == 6
+
+
+def test_get_respects_max_age():
+    cache = ContributionCache()
+    key = seed_key("movie", 1003)
+    version = cache.set(key, [{"id": 3, "weight": 1.0, "department": ""}])
+    time.sleep(0.01)
+
+    assert cache.get(version, max_age=0) is None
+    assert cache.current(key, max_age=0) is None
+    assert cache.get(version) is not None
+
+
+def test_lru_is_bounded():
+    cache = ContributionCache(max_items=2)
+    for i in range(5):
+        cache.set(seed_key("movie", 2000 + i), [])
+    assert len(cache._lru) == 2
+
+
+def test_build_contribution_caps_transitive():
+    transitive = [{"id": 1000 + i, "department": "Crew"} for i in range(_TRANSITIVE_CAP + 50)]
+    assert len(build_contribution(transitive, "person_transitive")) == _TRANSITIVE_CAP
+    assert len(build_contribution(transitive, "movie")) == _TRANSITIVE_CAP + 50
+
+
+def test_seeded_flock_scores_like_inline_flock():
+    """Referencing a cached seed should score exactly like adding its entities inline."""
+    people = [
+        {"id": 1, "department": "Directing"},
+        {"id": 2, "department": "Acting", "order": 0},
+    ]
+    transitive = [{"id": 1, "department": "Directing"}]
+    transitive += [{"id": 100 + i, "department": "Crew"} for i in range(_TRANSITIVE_CAP + 20)]
+
+    inline = Flock()
+    inline.add_to_flock(people, primary_id=10, source_type="movie")
+    inline.add_to_flock(transitive, primary_id=42, source_type="person_transitive")
+
+    from flickflock.contributions import contributions
+    movie_key = seed_key("movie", 3001, max_cast=20)
+    person_key = seed_key("person_transitive", 3002, max_works=20, max_cast=15)
+    movie_key = contributions.set(movie_key, build_contribution(people, "movie"))
+    person_key = contributions.set(person_key, build_contribution(transitive, "person_transitive"))
+
+    seeded = Flock()
+    seeded.add_seed_to_flock(movie_key, primary_id=10, source_type="movie")
+    seeded.add_seed_to_flock(person_key, primary_id=42, source_type="person_transitive")
+
+    assert seeded.score_flock() == pytest.approx(inline.score_flock())
+
+    # Seeded flocks survive a reload without copying the entities
+    loaded = Flock(flock_id=seeded.flock_id)
+    assert "entities" not in loaded.flock_entries[0]
+    assert loaded.score_flock() == pytest.approx(inline.score_flock())
+
+
+def test_unversioned_rows_stay_current():
+    from flickflock import storage
+    from flickflock.vectors import EntityVector
+    storage.write(lambda conn: conn.execute(
+        "INSERT INTO seed_contributions (seed_key, entities, updated_at) VALUES ('movie:1006', ?, ?)",
+        (EntityVector.from_entities([{"id": 7, "weight": 1.0, "department": ""}]).to_bytes(), time.time()),
+    ))
+    storage.write(lambda conn: conn.execute("DELETE FROM schema_migrations WHERE name = 'seed_versions_backfill'"))
+    storage.default.reset_schema()
+
+    cache = ContributionCache()
+    assert cache.current("movie:1006") == "movie:1006"
+    assert cache.get_or_build("movie:1006", lambda: 1 / 0) == "movie:1006"
@@ -0,0 +1,78 @@
+import pytest
+from flickflock.fake_upstream import FakeUpstream
+from flickflock.omdb import OMDb
+from flickflock.synthetic import SyntheticGraph
+from flickflock.tmdb import TMDB, RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(TMDB, "rate_limiter", RateLimiter(0))
+
+
+@pytest.fixture
+def upstream():
+    upstream = FakeUpstream(graph=SyntheticGraph(filmography=10)).start()
+    yield upstream
+    upstream.stop()
+
+
+def client(upstream):
+    return TMDB(base_url=upstream.url + "/3", api_key="test", use_cache=False)
+
+
+def test_serves_the_synthetic_graph(upstream, monkeypatch):
+    tmdb = client(upstream)
+    assert tmdb.get_credits("movie", 10) == upstream.graph.credits(10)
+    assert len(tmdb.get_person_by_id(7)["cast"]) + len(tmdb.get_person_by_id(7)["crew"]) == 10
+    with pytest.raises(RuntimeError):
+        tmdb.get_details("movie", 11)
+
+    monkeypatch.setenv("OMDB_BASE_URL", upstream.url + "/")
+    assert OMDb(api_key="test").get_by_imdb_id("tt0000010")["Response"] == "True"
+
+    calls = upstream.stats()["calls"]
+    assert calls["tmdb movie/:id/credits"] == 1
+    assert calls["tmdb person/:id"] == 2
+    assert calls["omdb title"] == 1
+
+
+def test_fixtures_take_precedence():
+    fixtures = {"tmdb": {"movie/603/credits": {"id": 603, "cast": [], "crew": []}}, "omdb": {}}
+    upstream = FakeUpstream(fixtures=fixtures, fixtures_only=True).start()
+    try:
+        tmdb = client(upstream)
+        assert tmdb.get_credits("movie", 603) == {"id": 603, "cast": [], "crew": []}
+        with pytest.raises(RuntimeError):
+            tmdb.get_credits("movie", 10)
+    finally:
+        upstream.stop()
+
+
+def test_injects_errors():
+    upstream = FakeUpstream(error_rate=1, error_statuses=(429,)).start()
+    try:
+        with pytest.raises(RuntimeError, match="over the allowed limit"):
+            client(upstream).get_credits("movie", 10)
+        assert upstream.stats()["errors"] == {"tmdb movie/:id/credits": 1}
+    finally:
+        upstream.stop()
+
+
+def test_load_driver_reports_per_endpoint(upstream, scratch_db, monkeypatch):
+    # The sessions create flocks through main.app, in the per-test database
+    monkeypatch.setenv("TMDB_API_KEY", "test")
+    import main, loadtest
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(main, "tmdb", client(upstream))
+    monkeypatch.setenv("OMDB_BASE_URL", upstream.url + "/")
+    monkeypatch.setattr(main, "omdb", OMDb(api_key="test"))
+
+    app = TestClient(main.app)
+    report = loadtest.run("", users=1, sessions=2, http_factory=lambda: app, timeout=None)
+    assert report["sessions"] == 2
+    assert report["total"]["errors"] == 0
+    assert report["endpoints"]["GET /api/search"]["requests"] >= 2
+    results = report["endpoints"]["GET /api/flock/{id}/results"]
+    assert results["p50_ms"] <= results["p95_ms"] <= results["p99_ms"]
+    assert loadtest.percentile([1, 2, 3, 4], 50) == 2
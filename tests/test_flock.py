@@ -1,6 +1,10 @@
+import asyncio
+import json
 import math
 import pytest
-from flickflock.flock import Flock, compute_entity_weight, cast_order_weight, _TRANSITIVE_CAP
+import flickflock.flock as flock_module
+from flickflock import storage
+from flickflock.flock import Flock, compute_entity_weight, cast_order_weight, _TRANSITIVE_CAP, _migrate_entries
 
 
 def test_flock():
@@ -297,3 +301,194 @@ def test_transitive_small_entry_unaffected():
     scores = flock.score_flock()
     # All 10 people should be present (none trimmed)
     assert len(scores) == 10
+
+
+def test_transitive_capped_at_insert():
+    """Oversized transitive entries are merged and capped when added, not when scored."""
+    flock = Flock(db_type="local")
+    transitive = [{"id": 42, "department": "Acting", "order": 0}] * 3
+    transitive += [{"id": 1000 + i, "department": "Crew"} for i in range(_TRANSITIVE_CAP + 50)]
+    flock.add_to_flock(transitive, primary_id=99, source_type="person_transitive")
+
+    entities = flock.flock_entries[0]["entities"]
+    assert len(entities) == _TRANSITIVE_CAP
+    assert entities[0] == {"id": 42, "weight": 9.0, "department": "Acting"}
+
+
+def test_migrate_entries_legacy_and_uncapped():
+    legacy = {"entities": [100, 200], "primary_id": "a", "source_type": "movie"}
+    uncapped = {
+        "entities": [{"id": i, "weight": 0.3, "department": "Crew"} for i in range(_TRANSITIVE_CAP + 10)],
+        "primary_id": "b",
+        "source_type": "person_transitive",
+    }
+    seeded = {"seed_key": "movie:1", "primary_id": "c", "source_type": "movie"}
+
+    migrated = _migrate_entries([legacy, uncapped, seeded])
+    assert migrated[0]["entities"][0] == {"id": 100, "weight": 0.5, "department": ""}
+    assert len(migrated[1]["entities"]) == _TRANSITIVE_CAP
+    assert migrated[2] == seeded
+
+
+def test_stored_flocks_migrated_once(scratch_db):
+    # Re-runs every migration, so only against the per-test database
+    legacy_id = "legacy-flock-migration"
+    with storage.connection(legacy_id) as conn, conn:
+        conn.execute("DELETE FROM schema_migrations")
+        conn.execute(
+            "INSERT OR REPLACE INTO flocks (flock_id, data, updated_at) VALUES (?, ?, 0)",
+            (legacy_id, json.dumps({
+                "flock_id": legacy_id,
+                "flock_entries": [{"entities": [1, 2, 3], "primary_id": 5}],
+            })),
+        )
+
+    storage.default.reset_schema()
+    loaded = Flock(flock_id=legacy_id)
+    assert loaded.flock_entries[0]["entities"][0]["weight"] == 0.5
+    assert set(loaded.score_flock()) == {1, 2, 3}
+
+
+def _count_rows(table, flock_id):
+    with storage.connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE flock_id = ?", (flock_id,)).fetchone()[0]
+
+
+def test_mutation_appends_events_only():
+    flock = Flock()
+    for i in range(5):
+        flock.update_selection({"id": i, "media_type": "movie"})
+        flock.add_to_flock([{"id": 100 + i, "department": "Directing"}], primary_id=i, source_type="movie")
+    flock.sync_flock()
+
+    loaded = Flock(flock_id=flock.flock_id)
+    loaded.update_selection({"id": 99, "media_type": "movie"})
+    loaded.sync_flock()
+
+    assert loaded.version == 11
+    assert _count_rows("flock_events", flock.flock_id) == 11
+    assert _count_rows("flock_entries", flock.flock_id) == 5
+    assert _count_rows("flocks", flock.flock_id) == 0  # no snapshot yet
+
+
+def test_concurrent_updates_are_not_lost():
+    flock = Flock()
+    flock.update_selection({"id": 1, "media_type": "movie"})
+    flock.sync_flock()
+
+    a = Flock(flock_id=flock.flock_id)
+    b = Flock(flock_id=flock.flock_id)
+    a.update_selection({"id": 2, "media_type": "movie"})
+    a.add_to_flock([{"id": 20, "department": "Directing"}], primary_id=2, source_type="movie")
+    b.update_selection({"id": 3, "media_type": "movie"})
+    a.sync_flock()
+    b.sync_flock()  # conflicts with a, rebases and retries
+
+    assert [s["id"] for s in b.selection] == [1, 2, 3]
+    loaded = Flock(flock_id=flock.flock_id)
+    assert [s["id"] for s in loaded.selection] == [1, 2, 3]
+    assert len(loaded.flock_entries) == 1
+    assert loaded.version == 4
+
+
+def test_concurrent_entry_removal_removes_the_same_entry():
+    flock = Flock()
+    flock.add_to_flock([{"id": 10, "department": "Directing"}], primary_id=1, source_type="movie")
+    flock.add_to_flock([{"id": 20, "department": "Directing"}], primary_id=2, source_type="movie")
+    flock.sync_flock()
+
+    a = Flock(flock_id=flock.flock_id)
+    b = Flock(flock_id=flock.flock_id)
+    a.remove_from_flock(0)
+    b.remove_from_flock(1)
+    a.sync_flock()
+    b.sync_flock()  # rebased onto a's removal, where index 1 no longer exists
+
+    assert Flock(flock_id=flock.flock_id).flock_entries == []
+
+
+def test_periodic_snapshot():
+    flock = Flock(name="snapshotted")
+    for i in range(flock_module._SNAPSHOT_INTERVAL + 3):
+        flock.update_selection({"id": i, "media_type": "movie"})
+        flock.add_to_flock([{"id": 100 + i, "department": "Writing"}], primary_id=i, source_type="movie")
+        flock.sync_flock()
+    flock.remove_selection(0)
+    flock.sync_flock()
+
+    assert _count_rows("flocks", flock.flock_id) == 1
+    # Entry rows up to the snapshot were folded into it
+    assert _count_rows("flock_entries", flock.flock_id) < flock_module._SNAPSHOT_INTERVAL
+
+    loaded = Flock(flock_id=flock.flock_id)
+    assert loaded.flock_name == "snapshotted"
+    assert loaded.version == flock.version
+    assert len(loaded.selection) == flock_module._SNAPSHOT_INTERVAL + 2
+    assert loaded.score_flock() == pytest.approx(flock.score_flock())
+
+
+def test_async_load_and_sync_match_sync_api():
+    flock = Flock(name="async")
+    flock.add_to_flock([{"id": 1, "department": "Directing"}], primary_id=10, source_type="movie")
+    flock.sync_flock()
+
+    async def main():
+        loaded = await Flock.load_async(flock_id=flock.flock_id)
+        loaded.add_to_flock([{"id": 2, "department": "Acting", "order": 0}], primary_id=11, source_type="movie")
+        await loaded.sync_flock_async()
+        return loaded
+
+    loaded = asyncio.run(main())
+    assert loaded.flock_name == "async"
+    reloaded = Flock(flock_id=flock.flock_id)
+    assert reloaded.version == loaded.version == 3
+    assert reloaded.score_flock() == loaded.score_flock()
+
+
+def test_async_load_reads_seed_vectors_off_the_event_loop(monkeypatch):
+    from flickflock.contributions import contributions
+    version = contributions.set("person_direct:5", [{"id": 5, "weight": 3.0, "department": "Acting"}])
+    flock = Flock()
+    flock.add_seed_to_flock(version, primary_id=5, source_type="person_direct")
+    flock.sync_flock()
+    contributions.clear_memory()
+
+    def blocking(*args, **kwargs):
+        raise AssertionError("blocking storage read on the event loop")
+
+    monkeypatch.setattr(storage, "connection", blocking)
+    loaded = asyncio.run(Flock.load_async(flock_id=flock.flock_id))
+    assert loaded.direct_person_ids == {5}
+
+
+def test_get_flock_works_filters_and_multipliers():
+    """Filtered works are never scored; multipliers adjust and re-rank the rest."""
+    flock = Flock(db_type="local")
+    flock.add_to_flock([{"id": 1, "department": "Directing"}], primary_id=99, source_type="movie")
+    seen = []
+
+    def mock_works(person_id):
+        return [
+            {"id": 100, "title": "Kept", "_genre_ids": [16]},
+            {"id": 101, "title": "Dropped"},
+            {"id": 102, "title": "Boosted", "_genre_ids": []},
+        ]
+
+    def keep(work):
+        seen.append(work["id"])
+        return work["id"] != 101
+
+    results = flock.get_flock_works(
+        mock_works,
+        filters=[keep],
+        multipliers=[
+            lambda w: 0.5 if 16 in w.get("_genre_ids", []) else None,
+            lambda w: 1.333 if w["id"] == 102 else None,
+        ],
+    )
+    base = flock.get_flock_works(mock_works)[0]["count"]
+    assert [w["id"] for w in results] == [102, 100]
+    assert results[0]["count"] == round(base * 1.333, 2)
+    assert results[1]["count"] == round(base * 0.5, 2)
+    assert "_genre_ids" not in results[0]
+    assert seen == [100, 101, 102]
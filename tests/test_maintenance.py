@@ -0,0 +1,99 @@
+import sqlite3, time
+from flickflock import maintenance, storage
+from flickflock.flock import Flock
+
+
+def _age(flock_id, days):
+    def write(conn):
+        conn.execute(
+            "UPDATE flock_heads SET updated_at = ? WHERE flock_id = ?",
+            (time.time() - days * 24 * 3600, flock_id),
+        )
+    storage.write(write, key=flock_id)
+
+
+def _exists(flock_id):
+    with storage.connection(flock_id) as conn:
+        return any(
+            conn.execute(f"SELECT 1 FROM {table} WHERE flock_id = ?", (flock_id,)).fetchone()
+            for table in ("flock_heads", "flock_events", "flock_entries")
+        )
+
+
+def test_expire_archives_and_deletes_old_flocks():
+    old = Flock(name="old")
+    old.add_to_flock([{"id": 1, "department": "Directing"}], primary_id=10, source_type="movie")
+    old.sync_flock()
+    recent = Flock(name="recent")
+    recent.add_to_flock([{"id": 2, "department": "Acting"}], primary_id=11, source_type="movie")
+    recent.sync_flock()
+    _age(old.flock_id, 100)
+
+    db = storage.shard_for(old.flock_id)
+    assert maintenance.expire_flocks(db, max_age_days=90, dry_run=True) >= 1
+    assert _exists(old.flock_id)
+
+    assert maintenance.expire_flocks(db, max_age_days=90) >= 1
+    assert not _exists(old.flock_id)
+    assert _exists(recent.flock_id)
+
+    archived = maintenance.load_archived(old.flock_id)
+    assert archived["flock_name"] == "old"
+    assert archived["flock_entries"][0]["entities"][0]["id"] == 1
+
+
+def test_run_vacuums_every_shard():
+    report = maintenance.run(max_age_days=90)
+    assert len(report) == len(storage.shards())
+    for shard in report:
+        assert isinstance(shard["reclaimed_bytes"], int)
+    with storage.connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_only_convert_rewrites_older_files(tmp_path):
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x)")
+    db = storage.Database(path)
+    maintenance.vacuum(db)
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    maintenance.vacuum(db, convert=True)
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    db.close()
+
+
+def test_lease_admits_one_worker():
+    assert maintenance.acquire_lease(60, owner="a")
+    assert not maintenance.acquire_lease(60, owner="b")
+    assert maintenance.acquire_lease(60, owner="a")
+    assert maintenance.acquire_lease(0, owner="a")
+    time.sleep(0.01)
+    assert maintenance.acquire_lease(60, owner="b")
+
+
+def test_collects_unreferenced_contribution_versions():
+    from flickflock.contributions import ContributionCache
+    cache = ContributionCache()
+    live = cache.set("movie:50", [{"id": 1, "weight": 1.0, "department": ""}])
+    archived = cache.set("movie:50", [{"id": 2, "weight": 1.0, "department": ""}])
+    unused = cache.set("movie:50", [{"id": 3, "weight": 1.0, "department": ""}])
+    current = cache.set("movie:50", [{"id": 4, "weight": 1.0, "department": ""}])
+
+    kept = Flock()
+    kept.add_seed_to_flock(live, primary_id=50)
+    kept.sync_flock()
+    expired = Flock()
+    expired.add_seed_to_flock(archived, primary_id=50)
+    expired.sync_flock()
+    _age(expired.flock_id, 100)
+    maintenance.expire_flocks(storage.shard_for(expired.flock_id), max_age_days=90)
+    storage.write(lambda conn: conn.execute("UPDATE seed_contributions SET updated_at = 0"))
+
+    assert maintenance.collect_contributions(dry_run=True) == 1
+    assert maintenance.collect_contributions() == 1
+    with storage.connection() as conn:
+        left = {row[0] for row in conn.execute("SELECT seed_key FROM seed_contributions")}
+    assert left == {live, archived, current}
@@ -0,0 +1,67 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from flickflock import metrics, storage
+from flickflock.flock import Flock
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_are_thread_safe():
+    def work(_):
+        for _ in range(1000):
+            metrics.CACHE_LOOKUPS.inc(cache="test", result="miss")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(8)))
+    assert metrics.collect()[metrics.CACHE_LOOKUPS.name][("test", "miss")] == 8000
+
+
+def test_histogram_renders_cumulative_buckets():
+    metrics.DB_SECONDS.observe(0.002, op="test")
+    metrics.DB_SECONDS.observe(20, op="test")
+    text = metrics.render()
+    assert 'flickflock_db_seconds_bucket{op="test",le="0.001"} 0' in text
+    assert 'flickflock_db_seconds_bucket{op="test",le="0.005"} 1' in text
+    assert 'flickflock_db_seconds_bucket{op="test",le="10"} 1' in text
+    assert 'flickflock_db_seconds_bucket{op="test",le="+Inf"} 2' in text
+    assert 'flickflock_db_seconds_count{op="test"} 2' in text
+
+
+def test_render_sums_published_workers():
+    metrics.CACHE_LOOKUPS.inc(cache="test", result="l1_hit")
+    other = {metrics.CACHE_LOOKUPS.name: [[["test", "miss"], 3.0], [["test", "l1_hit"], 1.0]]}
+    storage.write(lambda conn: conn.execute(
+        "INSERT INTO metrics_workers (worker, data, updated_at) VALUES (?, ?, ?)",
+        ("other:1", json.dumps(other), time.time()),
+    ))
+    # This worker's own stale row is replaced by its live values
+    metrics.publish()
+    metrics.CACHE_LOOKUPS.inc(cache="test", result="l1_hit")
+
+    text = metrics.render()
+    assert 'flickflock_cache_lookups_total{cache="test",result="l1_hit"} 3.0' in text
+    assert 'flickflock_cache_lookups_total{cache="test",result="miss"} 3.0' in text
+    assert 'flickflock_cache_hit_ratio{cache="test"} 0.5' in text
+
+
+def test_endpoint_collapses_ids():
+    assert metrics.endpoint("person/31/combined_credits") == "person/:id/combined_credits"
+
+
+def test_scoring_is_instrumented():
+    flock = Flock()
+    flock.add_to_flock([{"id": 1, "department": "Directing"}], primary_id=10, source_type="movie")
+    flock.get_flock_works(lambda pid: [{"id": 100}, {"id": 101}])
+
+    merged = metrics.collect()
+    assert sum(merged[metrics.SCORING_SECONDS.name][("get_flock_works",)][:-1]) == 1
+    assert ("score_flock",) in merged[metrics.SCORING_SECONDS.name]
+    assert ("flock_save",) in merged[metrics.DB_SECONDS.name]
+    assert sum(merged[metrics.FLOCK_WORKS.name][("candidates",)][:-1]) == 1
@@ -0,0 +1,122 @@
+import threading
+from flickflock.rankings import Materializer, Ranking, RankingCache
+
+
+def _works():
+    return [
+        {"id": 1, "media_type": "movie", "genre_ids": [18], "release_date": "1999-03-31", "popularity": 5.0},
+        {"id": 2, "media_type": "tv", "genre_ids": [16, 18], "first_air_date": "2010-01-01", "popularity": 9.0},
+        {"id": 3, "media_type": "movie", "genre_ids": [16], "release_date": "2005-06-01", "popularity": 1.0},
+        {"id": 4, "media_type": "movie", "genre_ids": [18], "release_date": "", "popularity": ""},
+    ]
+
+
+def _ids(page):
+    return [w["id"] for w in page[0]]
+
+
+def test_query_defaults_to_score_order():
+    ranking = Ranking(_works())
+    assert _ids(ranking.query()) == [1, 2, 3, 4]
+    assert ranking.query()[1:] == (None, 4)
+
+
+def test_query_filters_by_facets():
+    ranking = Ranking(_works())
+    assert _ids(ranking.query(genre=18)) == [1, 2, 4]
+    assert _ids(ranking.query(genre=18, media_type="movie")) == [1, 4]
+    assert _ids(ranking.query(year_from=2000)) == [2, 3]
+    assert _ids(ranking.query(year_from=1999, year_to=2005)) == [1, 3]
+    assert ranking.query(genre=99) == ([], None, 0)
+
+
+def test_query_sorts():
+    ranking = Ranking(_works())
+    assert _ids(ranking.query(sort="popularity")) == [2, 1, 3, 4]
+    assert _ids(ranking.query(sort="release_date")) == [2, 3, 1, 4]
+
+
+def test_query_pages_with_cursor():
+    ranking = Ranking(_works())
+    works, cursor, total = ranking.query(genre=18, limit=2)
+    assert [w["id"] for w in works] == [1, 2] and total == 3
+    works, cursor, _ = ranking.query(genre=18, limit=2, cursor=cursor)
+    assert [w["id"] for w in works] == [4] and cursor is None
+
+
+def test_cache_builds_once_per_version():
+    cache = RankingCache(max_items=2)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return _works()
+
+    first = cache.get_or_build("f", 1, build)
+    assert cache.get_or_build("f", 1, build) is first
+    cache.get_or_build("f", 2, build)
+    cache.get_or_build("g", 1, build)
+    assert len(calls) == 3
+    assert cache.get("f", 1) is None
+
+
+def test_materializer_dedupes_and_serves_builds():
+    materializer = Materializer(RankingCache(), max_workers=1)
+    release = threading.Event()
+    calls = []
+
+    def build():
+        calls.append(1)
+        release.wait(5)
+        return _works()
+
+    future = materializer.submit("m", 1, build)
+    assert materializer.submit("m", 1, build) is future
+    release.set()
+    # /results waits for the build in flight rather than starting another
+    ranking = materializer.get_or_build("m", 1, lambda: 1 / 0)
+    assert len(ranking) == 4 and len(calls) == 1
+    assert materializer.submit("m", 1, build) is None
+
+
+def test_materializer_builds_inline_when_the_build_in_flight_is_slow():
+    materializer = Materializer(RankingCache(), max_workers=1, wait=0.05)
+    release = threading.Event()
+    materializer.submit("s", 1, lambda: release.wait(5) and _works())
+    try:
+        assert len(materializer.get_or_build("s", 1, _works)) == 4
+    finally:
+        release.set()
+
+
+def test_materializer_newer_version_supersedes_older():
+    cache = RankingCache()
+    materializer = Materializer(cache, max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return _works()
+
+    running = materializer.submit("blocker", 1, slow)
+    started.wait(5)
+    pending = materializer.submit("n", 1, _works)
+    newer = materializer.submit("n", 2, _works)
+    assert pending.cancelled()
+    release.set()
+    running.result(5)
+    newer.result(5)
+    assert cache.get("n", 1) is None
+    assert cache.get("n", 2) is not None
+
+
+def test_results_page_keeps_genre_ids_out_of_the_payload(monkeypatch):
+    monkeypatch.setenv("TMDB_API_KEY", "test")
+    import main
+
+    works = _works()
+    page = main.enrich_members(works)
+    assert all("genre_ids" not in w and "connected_member_ids" not in w for w in page)
+    # The cached ranking still has them for the genre facet
+    assert works[1]["genre_ids"] == [16, 18]
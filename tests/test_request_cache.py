@@ -0,0 +1,131 @@
+import sqlite3
+import pytest
+from diskcache import Cache
+from flickflock import request_cache
+from flickflock.request_cache import LayeredCache, SnapshotLayer, export_snapshot, import_snapshot, open_cache
+from flickflock.tmdb import TMDB
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(request_cache, "CACHE_DIR", str(tmp_path / "live"))
+    return tmp_path
+
+
+@pytest.fixture
+def source(tmp_path):
+    search = Cache(str(tmp_path / "source_search"))
+    credits = Cache(str(tmp_path / "source_credits"))
+    search.set("search", {"data": {"results": []}}, expire=3600)
+    credits.set("movie", {"data": {"id": 603}}, expire=3600)
+    credits.set("person", {"data": {"id": 6384}})
+    credits.set("stale", {"data": {}}, expire=-1)
+    yield {"tmdb_search": search, "tmdb_credits": credits}
+    search.close()
+    credits.close()
+
+
+def test_namespaces_have_their_own_location_and_limits(cache_dir, monkeypatch):
+    monkeypatch.setenv("FLOCK_CACHE_OMDB_SIZE_MB", "1")
+    monkeypatch.setenv("FLOCK_CACHE_OMDB_EVICTION", "lfu")
+    omdb = open_cache("omdb")
+    assert omdb.directory == str(cache_dir / "live" / "omdb")
+    assert omdb.size_limit == 1024 * 1024
+    assert omdb.eviction_policy == "least-frequently-used"
+    assert open_cache("tmdb_search").eviction_policy == "least-recently-used"
+
+    monkeypatch.setenv("FLOCK_CACHE_OMDB_EVICTION", "random")
+    with pytest.raises(ValueError):
+        open_cache("omdb")
+
+
+def test_tmdb_paths_map_to_namespaces():
+    assert TMDB.cache_namespace("search/multi") == "tmdb_search"
+    assert TMDB.cache_namespace("movie/603/credits") == "tmdb_credits"
+    assert TMDB.cache_namespace("person/6384/combined_credits") == "tmdb_credits"
+    assert TMDB.cache_namespace("person/6384") == "tmdb_details"
+    assert TMDB.cache_namespace("movie/603/watch/providers") == "tmdb_details"
+
+
+def test_stats_are_per_namespace(cache_dir, monkeypatch):
+    monkeypatch.setattr(request_cache, "_caches", {})
+    request_cache.namespace("omdb").set("a", {"data": 1})
+    request_cache.namespace("omdb").get("a")
+    request_cache.namespace("omdb").get("b")
+
+    stats = request_cache.stats()
+    assert set(stats) == set(request_cache.NAMESPACES)
+    assert stats["omdb"]["hits"] == 1 and stats["omdb"]["misses"] == 1
+    assert stats["omdb"]["entries"] == 1
+    assert stats["tmdb_search"]["entries"] == 0
+
+
+def test_export_writes_unexpired_entries(source, tmp_path):
+    path = str(tmp_path / "snap.db")
+    assert export_snapshot(source, path) == 3
+
+    layer = SnapshotLayer(path)
+    assert layer.meta["entries"] == "3"
+    assert layer.get("movie") == {"data": {"id": 603}}
+    assert layer.get("stale") is None
+    # Snapshots are opened read-only
+    with pytest.raises(sqlite3.OperationalError):
+        layer._conn.execute("DELETE FROM entries")
+
+
+def test_layered_cache_reads_through_and_promotes(source, tmp_path, cache_dir):
+    path = str(tmp_path / "snap.db")
+    export_snapshot(source, path)
+    cache = open_cache("tmdb_credits", snapshot=SnapshotLayer(path))
+    assert isinstance(cache, LayeredCache)
+
+    assert cache.get("movie") == {"data": {"id": 603}}
+    assert cache.live.get("movie") == {"data": {"id": 603}}
+    # Promoted entries keep the snapshot's expiry
+    expires_at = source["tmdb_credits"].get("movie", expire_time=True)[1]
+    assert cache.live.get("movie", expire_time=True)[1] == pytest.approx(expires_at, abs=5)
+    assert cache.get("missing") is None
+
+    cache.set("new", {"data": 1})
+    assert cache.live.get("new") == {"data": 1}
+
+
+def test_import_routes_by_namespace_without_overwriting(source, tmp_path):
+    path = str(tmp_path / "snap.db")
+    export_snapshot(source, path)
+    search = Cache(str(tmp_path / "live_search"))
+    credits = Cache(str(tmp_path / "live_credits"))
+    credits.set("movie", {"data": "local"})
+
+    assert import_snapshot({"tmdb_search": search, "tmdb_credits": credits}, path) == 2
+    assert credits.get("movie") == {"data": "local"}
+    assert credits.get("person") == {"data": {"id": 6384}}
+    assert search.get("search") == {"data": {"results": []}}
+    assert "person" not in search
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path, cache_dir, monkeypatch):
+    path = tmp_path / "bad.db"
+    path.write_bytes(b"not a database")
+    monkeypatch.setattr(request_cache, "_caches", {})
+    monkeypatch.setattr(request_cache, "_snapshot", None)
+    monkeypatch.setattr(request_cache, "SNAPSHOT_PATH", str(path))
+    assert isinstance(request_cache.namespace("omdb"), Cache)
+
+
+def test_pre_namespace_cache_moves_into_namespaces(cache_dir, monkeypatch):
+    legacy_dir = cache_dir / ".requests"
+    monkeypatch.setattr(request_cache, "LEGACY_CACHE_DIR", str(legacy_dir))
+    with Cache(str(legacy_dir)) as legacy:
+        legacy.set("search", {"date": "2026-10-01", "data": {"results": [], "total_results": 0}}, expire=3600)
+        legacy.set("credits", {"date": "2026-10-01", "data": {"cast": [], "crew": []}})
+        legacy.set("details", {"date": "2026-10-01", "data": {"id": 603}})
+        legacy.set("omdb", {"data": {"Title": "The Matrix"}})
+        legacy.set("stale", {"date": "2026-10-01", "data": {}}, expire=-1)
+
+    assert request_cache.namespace("omdb").get("omdb") == {"data": {"Title": "The Matrix"}}
+    assert request_cache.namespace("tmdb_search").get("search")["data"]["total_results"] == 0
+    assert "credits" in request_cache.namespace("tmdb_credits")
+    assert "details" in request_cache.namespace("tmdb_details")
+    assert "stale" not in request_cache.namespace("tmdb_details")
+    assert not legacy_dir.exists()
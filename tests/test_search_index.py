@@ -0,0 +1,102 @@
+import time
+from flickflock import request_cache
+from flickflock.search_index import SearchIndex
+from flickflock.tmdb import TMDB
+
+
+def movie(id, title, popularity):
+    return {"id": id, "media_type": "movie", "title": title, "popularity": popularity, "overview": "..."}
+
+
+class CountingTMDB(TMDB):
+    """A TMDB client whose search responses come from a fixed list of results."""
+
+    def __init__(self, results, **kwargs):
+        super().__init__(api_key="test", use_cache=False, **kwargs)
+        self.results = results
+        self.queries = []
+
+    def request(self, path, method="GET", params={}):
+        self.queries.append(params["query"])
+        q = params["query"].lower()
+        return {"results": [r for r in self.results if q in (r.get("title") or r.get("name")).lower()]}
+
+
+def test_ranks_like_tmdb_with_article_stripping():
+    index = SearchIndex(min_hits=1)
+    results = [
+        movie(1, "The Godfather", 80), movie(2, "Godzilla", 90), movie(3, "God's Own Country", 10),
+        movie(4, "Oh My God", 50), movie(5, "Wild", 99),
+    ]
+    index.add(results)
+
+    hits = index.lookup("the god")
+    assert [h["id"] for h in hits] == [h["id"] for h in TMDB._rank_search_results(hits, "the god")]
+    assert [h["id"] for h in hits] == [2, 1, 3]
+    assert [h["id"] for h in index.lookup("god")] == [2, 1, 3, 4]  # prefix matches by popularity, then substring
+    assert "overview" not in hits[0]
+    assert [h["id"] for h in index.lookup("godfather")] == [1]
+    assert [h["id"] for h in index.lookup("go")] == [2, 1, 3]
+
+
+def test_answers_locally_only_when_covered():
+    results = [movie(i, f"Tarantula {i}", i) for i in range(1, 31)]
+    tmdb = CountingTMDB(results, search_index=SearchIndex(min_hits=20))
+
+    assert tmdb.search("tarantula 1")[0]["id"] == 1
+    assert tmdb.queries == ["tarantula 1"]
+    # Indexed 11 matches of "tarantula": not enough to stand in for TMDB
+    tmdb.search("tarantula")
+    assert tmdb.queries == ["tarantula 1", "tarantula"]
+
+    # Now 30 titles start with "ta", "tara" and "taran"
+    assert len(tmdb.search("ta")) == 20
+    assert tmdb.search("tara")[0]["id"] == 30
+    assert tmdb.search("taran")[0]["id"] == 30
+    assert tmdb.search("tarantula 1")[0]["id"] == 1  # answered before
+    assert tmdb.queries == ["tarantula 1", "tarantula"]
+
+    tmdb.search("wild")
+    assert tmdb.queries[-1] == "wild"
+
+
+def test_indexes_credits_and_the_request_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(request_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(request_cache, "_caches", {})
+    request_cache.namespace("tmdb_credits").set("a", {"data": {
+        "id": 7,
+        "cast": [{**movie(1, "Heat", 40), "character": "Neil"}],
+        "crew": [{"id": 2, "media_type": "tv", "name": "Heat Wave", "popularity": 3, "job": "Producer"}],
+    }})
+    request_cache.namespace("tmdb_credits").set("b", {"data": {
+        "id": 1, "cast": [{"id": 7, "name": "Heather Holt", "popularity": 9, "character": "Eady"}], "crew": [],
+    }})
+    request_cache.namespace("tmdb_search").set("c", {"data": {"results": [movie(3, "Heatwave", 1)]}})
+
+    index = SearchIndex(min_hits=4)
+    assert index.load_cache() == 3
+    hits = index.lookup("hea")
+    assert [(h["media_type"], h["id"]) for h in hits] == [("movie", 1), ("person", 7), ("tv", 2), ("movie", 3)]
+    assert "character" not in hits[0]
+
+
+def test_large_index_answers_every_kind_of_query():
+    index = SearchIndex()
+    words = ["silent", "river", "night", "empire", "summer", "ghost", "golden", "storm"]
+    index.add(
+        movie(i, f"{words[i % 8]} {words[i // 8 % 8]} {words[i // 64 % 8]} {i}", i % 997)
+        for i in range(5000)
+    )
+    for q in ("s", "ni", "gho", "river", "the empire", "summer st", "gold"):
+        hits = index.lookup(q)
+        assert len(hits) == 20
+        assert hits == TMDB._rank_search_results(hits, q)
+        assert all(h["title"].startswith(TMDB._strip_article(q)) for h in hits)
+
+
+def test_answers_expire():
+    index = SearchIndex(min_hits=100, max_age=0.01)
+    index.answered("heat", [movie(1, "Heat", 40)])
+    assert index.lookup("heat")[0]["id"] == 1
+    time.sleep(0.02)
+    assert index.lookup("heat") is None
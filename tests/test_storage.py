@@ -0,0 +1,220 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from flickflock import storage
+from flickflock.storage import Database, DatabaseThread, WriteBatcher
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    yield database
+    database.close()
+
+
+def test_connections_are_reused(db):
+    with db.connection() as first:
+        pass
+    with db.connection() as second:
+        pass
+    assert first is second
+
+
+def test_pragmas_applied(db):
+    with db.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_registered_schema_and_migrations_run_once(db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(storage, "_SCHEMA", ["CREATE TABLE IF NOT EXISTS things (id INTEGER)"])
+    monkeypatch.setattr(storage, "_MIGRATIONS", [])
+    storage.register_migration("count_calls", lambda conn: calls.append(1))
+
+    for _ in range(3):
+        with db.connection() as conn:
+            conn.execute("SELECT * FROM things").fetchall()
+    assert calls == [1]
+
+    # A fresh process (no in-memory state) sees the migration as applied
+    other = Database(db.path)
+    with other.connection():
+        pass
+    other.close()
+    assert calls == [1]
+
+
+def test_uncommitted_writes_rolled_back_on_release(db, monkeypatch):
+    monkeypatch.setattr(storage, "_SCHEMA", ["CREATE TABLE IF NOT EXISTS things (id INTEGER)"])
+    monkeypatch.setattr(storage, "_MIGRATIONS", [])
+    with db.connection() as conn:
+        conn.execute("INSERT INTO things VALUES (1)")
+    with db.connection() as conn, conn:
+        conn.execute("INSERT INTO things VALUES (2)")
+    with db.connection() as conn:
+        assert conn.execute("SELECT id FROM things").fetchall() == [(2,)]
+
+
+def test_group_commit_batches_concurrent_writes(db, monkeypatch):
+    monkeypatch.setattr(storage, "_SCHEMA", ["CREATE TABLE IF NOT EXISTS things (id INTEGER PRIMARY KEY)"])
+    monkeypatch.setattr(storage, "_MIGRATIONS", [])
+    batcher = WriteBatcher(db, max_delay=0.02)
+
+    def insert(i):
+        return batcher.submit(lambda conn: conn.execute("INSERT INTO things VALUES (?)", (i,)).lastrowid)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(insert, range(64)))
+
+    assert results == list(range(64))
+    assert batcher.writes == 64
+    assert batcher.batches < 64
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM things").fetchone()[0] == 64
+
+
+def test_racing_writers_share_one_batcher(db, monkeypatch):
+    started = []
+
+    class SlowBatcher(WriteBatcher):
+        def __init__(self, *args, **kwargs):
+            started.append(1)
+            time.sleep(0.02)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(storage, "WriteBatcher", SlowBatcher)
+    monkeypatch.setattr(storage, "_group_commit", {"max_delay": 0.002})
+    monkeypatch.setattr(storage, "_batchers", {})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        batchers = list(pool.map(lambda _: storage._batcher(db), range(8)))
+    assert len(started) == 1
+    assert all(b is batchers[0] for b in batchers)
+
+
+def test_group_commit_isolates_failing_writes(db, monkeypatch):
+    monkeypatch.setattr(storage, "_SCHEMA", ["CREATE TABLE IF NOT EXISTS things (id INTEGER PRIMARY KEY)"])
+    monkeypatch.setattr(storage, "_MIGRATIONS", [])
+    batcher = WriteBatcher(db, max_delay=0.05)
+
+    def write(i):
+        def fn(conn):
+            conn.execute("INSERT INTO things VALUES (?)", (i,))
+            if i == 3:
+                conn.execute("INSERT INTO things VALUES (?)", (0,))  # duplicate key
+        return batcher.submit(fn)
+
+    write(0)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = {i: pool.submit(write, i) for i in range(1, 8)}
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[3].result()
+
+    with db.connection() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id FROM things ORDER BY id")]
+    assert ids == [0, 1, 2, 4, 5, 6, 7]
+
+
+def test_database_thread_runs_reads_and_writes(db, monkeypatch):
+    monkeypatch.setattr(storage, "_SCHEMA", ["CREATE TABLE IF NOT EXISTS things (id INTEGER PRIMARY KEY)"])
+    monkeypatch.setattr(storage, "_MIGRATIONS", [])
+    thread = DatabaseThread(db)
+
+    thread.submit(lambda conn: conn.execute("INSERT INTO things VALUES (1)"), write=True).result()
+    # Reads run without a transaction, so an uncommitted write is rolled back
+    thread.submit(lambda conn: conn.execute("INSERT INTO things VALUES (2)")).result()
+    assert thread.submit(lambda conn: conn.execute("SELECT id FROM things").fetchall()).result() == [(1,)]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        thread.submit(lambda conn: conn.execute("INSERT INTO things VALUES (1)"), write=True).result()
+
+
+def test_async_reads_and_writes_do_not_block_the_loop():
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await storage.write_async(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO seed_contributions VALUES ('async-test', x'', 0)"
+        ))
+        rows = await asyncio.gather(*(
+            storage.read_async(lambda conn: conn.execute(
+                "SELECT seed_key FROM seed_contributions WHERE seed_key = 'async-test'"
+            ).fetchone())
+            for _ in range(20)
+        ))
+        task.cancel()
+        return rows, ticks
+
+    rows, ticks = asyncio.run(main())
+    assert rows == [("async-test",)] * 20
+    assert ticks > 0
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    original = storage.default.path
+    path = str(tmp_path / "flock.db")
+    storage.configure(path=path, shards=4)
+    yield path
+    storage.configure(path=original, shards=1)
+
+
+def test_flocks_and_bookmarks_route_across_shards(sharded):
+    from flickflock.flock import Flock
+    from flickflock.bookmarks import BookmarkList
+
+    flock_ids = []
+    for i in range(20):
+        f = Flock()
+        f.update_selection({"id": i, "media_type": "movie"})
+        f.sync_flock()
+        flock_ids.append(f.flock_id)
+    bl = BookmarkList(user_id="sharded-user")
+    bl.add({"id": 1, "title": "Film", "media_type": "movie"})
+
+    used = {storage.shard_index(fid, 4) for fid in flock_ids}
+    assert len(used) > 1
+    for db in storage.shards():
+        with db.connection() as conn:
+            ids = {r[0] for r in conn.execute("SELECT flock_id FROM flock_heads")}
+        assert ids == {fid for fid in flock_ids if storage.shard_for(fid) is db}
+
+    assert [Flock(flock_id=fid).selection[0]["id"] for fid in flock_ids] == list(range(20))
+    assert BookmarkList(list_id=bl.list_id).user_id == "sharded-user"
+
+
+def test_rebalance_moves_rows_to_new_layout(sharded):
+    from flickflock.flock import Flock
+    from flickflock.bookmarks import BookmarkList
+
+    flock_ids = []
+    for i in range(10):
+        f = Flock()
+        f.add_to_flock([{"id": 100 + i, "department": "Directing"}], primary_id=i, source_type="movie")
+        f.sync_flock()
+        flock_ids.append(f.flock_id)
+    lists = []
+    for i in range(5):
+        bl = BookmarkList(user_id=f"rebalance-user-{i}")
+        bl.add({"id": i, "title": "A", "media_type": "movie"})
+        bl.add({"id": i, "title": "B", "media_type": "tv"})
+        lists.append(bl.list_id)
+
+    copied = storage.rebalance(4, 2, sharded)
+    assert copied["flock_entries"] == 10
+    assert copied["bookmark_items"] == 10
+
+    storage.configure(path=sharded, shards=2)
+    for i, fid in enumerate(flock_ids):
+        assert list(Flock(flock_id=fid).flock_entries[0]["entities"].ids) == [100 + i]
+    for list_id in lists:
+        assert [item["title"] for item in BookmarkList(list_id=list_id).items] == ["A", "B"]
@@ -1,5 +1,6 @@
+import time
 import pytest, requests
-from flickflock.tmdb import TMDB
+from flickflock.tmdb import TMDB, RateLimiter
 
 class MockTMDBResponse:
     @staticmethod
@@ -41,4 +42,19 @@ def test_tmdb_request(monkeypatch):
     tmdb = TMDB()
     result = tmdb.request("path/test")
     assert "results" in result.keys()
-    assert isinstance(result["results"], list)
\ No newline at end of file
+    assert isinstance(result["results"], list)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(100, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+def test_rate_limiter_allows_rates_below_one_per_second():
+    limiter = RateLimiter(0.5)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started < 0.1
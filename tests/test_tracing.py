@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flickflock import tracing
+
+
+def test_spans_outside_a_request_are_ignored():
+    with tracing.span("db_load"):
+        pass
+
+
+def test_spans_are_summed_per_name():
+    with tracing.trace() as trace:
+        for _ in range(3):
+            with tracing.span("db_load"):
+                time.sleep(0.002)
+    seconds, count = trace.spans["db_load"]
+    assert count == 3 and seconds >= 0.006
+
+    header = trace.server_timing()
+    assert header.startswith('db_load;dur=')
+    assert 'desc="3x"' in header
+    assert ", total;dur=" in header
+
+
+def test_pool_threads_report_to_the_request_trace():
+    @tracing.span("expand")
+    def expand(i):
+        return i
+
+    with tracing.trace() as trace:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            assert list(pool.map(tracing.in_context(expand), range(8))) == list(range(8))
+    assert trace.spans["expand"][1] == 8
+
+
+def test_profile_samples_hot_functions():
+    def busy():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    with tracing.trace(profile=True) as trace:
+        with tracing.span("score_flock"):
+            busy()
+        report = trace.report()
+    assert report["spans"]["score_flock"]["count"] == 1
+    assert report["profile"]["samples"] > 0
+    assert any(f["function"].startswith("busy ") for f in report["profile"]["total"])
+
+
+def test_profiling_needs_a_matching_token(monkeypatch):
+    monkeypatch.setattr(tracing, "PROFILE_TOKEN", None)
+    assert not tracing.profiling_allowed("secret")
+    monkeypatch.setattr(tracing, "PROFILE_TOKEN", "secret")
+    assert not tracing.profiling_allowed(None)
+    assert not tracing.profiling_allowed("guess")
+    assert tracing.profiling_allowed("secret")
@@ -0,0 +1,70 @@
+import pytest
+from flickflock.fake_upstream import FakeUpstream
+from flickflock.omdb import OMDb
+from flickflock.synthetic import SyntheticGraph
+from flickflock.tmdb import TMDB, RateLimiter
+from flickflock.transport import Cassette, CassetteMiss, RecordingTransport, ReplayTransport, to_fixtures
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(TMDB, "rate_limiter", RateLimiter(0))
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    """A cassette of a few TMDB and OMDb requests against a fake upstream."""
+    path = str(tmp_path / "upstream.cassette")
+    upstream = FakeUpstream(graph=SyntheticGraph(filmography=10)).start()
+    try:
+        cassette = Cassette(path)
+        transport = RecordingTransport(cassette)
+        tmdb = TMDB(base_url=upstream.url + "/3", api_key="secret", use_cache=False, transport=transport)
+        tmdb.get_credits("movie", 10)
+        tmdb.get_person_by_id(7)
+        with pytest.raises(RuntimeError):
+            tmdb.get_details("movie", 11)
+        monkeypatch.setenv("OMDB_BASE_URL", upstream.url + "/")
+        OMDb(api_key="secret", transport=transport).get_by_imdb_id("tt0000010")
+        cassette.close()
+    finally:
+        upstream.stop()
+    return path, upstream.graph
+
+
+def test_replays_without_network(recorded, monkeypatch):
+    path, graph = recorded
+    transport = ReplayTransport(Cassette(path, readonly=True))
+    # Nothing listens here; every response has to come from the cassette
+    tmdb = TMDB(base_url="http://127.0.0.1:9/3", api_key="other", use_cache=False, transport=transport)
+    assert tmdb.get_credits("movie", 10) == graph.credits(10)
+    assert tmdb.get_person_by_id(7)["id"] == 7
+    with pytest.raises(RuntimeError):
+        tmdb.get_details("movie", 11)
+    monkeypatch.setenv("OMDB_BASE_URL", "http://127.0.0.1:9/")
+    assert OMDb(api_key="other", transport=transport).get_by_imdb_id("tt0000010") == graph.omdb("tt0000010")
+
+    with pytest.raises(CassetteMiss):
+        tmdb.get_credits("movie", 12)
+
+
+def test_cassette_leaves_out_api_keys(recorded):
+    path, _ = recorded
+    with open(path, "rb") as f:
+        assert b"secret" not in f.read()
+    info = Cassette(path, readonly=True).info()
+    assert info["tmdb"]["responses"] == 4
+    assert info["omdb"]["responses"] == 1
+
+
+def test_converts_to_fake_upstream_fixtures(recorded):
+    path, graph = recorded
+    fixtures = to_fixtures(Cassette(path, readonly=True))
+    assert fixtures["omdb"] == {"tt0000010": graph.omdb("tt0000010")}
+
+    upstream = FakeUpstream(fixtures=fixtures, fixtures_only=True).start()
+    try:
+        tmdb = TMDB(base_url=upstream.url + "/3", api_key="test", use_cache=False)
+        assert tmdb.get_credits("movie", 10) == graph.credits(10)
+    finally:
+        upstream.stop()
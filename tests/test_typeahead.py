@@ -0,0 +1,78 @@
+import threading, time
+import pytest
+from flickflock.tmdb import TMDB
+from flickflock.typeahead import Superseded, Typeahead
+
+TITLES = ["Tarantula", "Taras Bulba", "Tarzan", "The Tarot", "Star Trek", "Tár", "Guitar Heroes"]
+
+
+class SearchTMDB(TMDB):
+    """A TMDB client searching a fixed list of titles, like TMDB does by word prefix."""
+
+    def __init__(self, page_size=20, delay=0, **kwargs):
+        super().__init__(api_key="test", use_cache=False, **kwargs)
+        self.page_size = page_size
+        self.delay = delay
+        self.queries = []
+
+    def request(self, path, method="GET", params={}):
+        self.queries.append(params["query"])
+        time.sleep(self.delay)
+        words = params["query"].lower().split()
+        matches = [
+            {"id": i, "media_type": "movie", "title": t, "popularity": len(TITLES) - i}
+            for i, t in enumerate(TITLES)
+            if all(any(w2.startswith(w) for w2 in t.lower().split()) for w in words)
+        ]
+        return {"results": matches[:self.page_size], "total_results": len(matches)}
+
+
+def titles(results):
+    return [r["title"] for r in results]
+
+
+def test_refines_complete_prefix_results():
+    tmdb = SearchTMDB(typeahead=Typeahead())
+    assert titles(tmdb.search("tar")) == ["Tarantula", "Taras Bulba", "Tarzan", "The Tarot"]
+    assert titles(tmdb.search("tara")) == ["Tarantula", "Taras Bulba"]
+    assert titles(tmdb.search("Taras  b")) == ["Taras Bulba"]
+    assert tmdb.search("tarantino") == []
+    assert tmdb.queries == ["tar"]
+
+    # A query that doesn't extend an answered one still goes upstream
+    tmdb.search("star")
+    assert tmdb.queries == ["tar", "star"]
+
+
+def test_incomplete_results_are_not_refined():
+    tmdb = SearchTMDB(page_size=2, typeahead=Typeahead())
+    tmdb.search("tar")
+    tmdb.search("tara")
+    assert tmdb.queries == ["tar", "tara"]
+
+
+def test_waits_for_an_inflight_prefix():
+    tmdb = SearchTMDB(delay=0.2, typeahead=Typeahead())
+    first = threading.Thread(target=tmdb.search, args=("tar",))
+    first.start()
+    time.sleep(0.05)
+    assert titles(tmdb.search("tarz")) == ["Tarzan"]
+    first.join()
+    assert tmdb.queries == ["tar"]
+
+
+def test_drops_superseded_searches():
+    typeahead = Typeahead()
+    tmdb = SearchTMDB(typeahead=typeahead)
+    older = typeahead.begin("tab-1")
+    newer = typeahead.begin("tab-1")
+    other = typeahead.begin("tab-2")
+
+    with pytest.raises(Superseded):
+        tmdb.search("tarz", client="tab-1", generation=older)
+    assert tmdb.queries == []
+    tmdb.search("tarza", client="tab-1", generation=newer)
+    tmdb.search("star", client="tab-2", generation=other)
+    assert tmdb.queries == ["tarza", "star"]
+    # Answered locally, so not dropped
+    assert titles(tmdb.search("tarzan", client="tab-1", generation=older)) == ["Tarzan"]
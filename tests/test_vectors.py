@@ -0,0 +1,67 @@
+import json, uuid
+import pytest
+from flickflock import storage
+from flickflock.flock import Flock
+from flickflock.vectors import EntityVector
+
+
+ENTITIES = [
+    {"id": 1, "weight": 5.0, "department": "Directing"},
+    {"id": 2, "weight": 2.4, "department": "Acting"},
+    {"id": 3, "weight": 0.5, "department": "Catering"},
+]
+
+
+def test_round_trip():
+    vec = EntityVector.from_entities(ENTITIES)
+    loaded = EntityVector.from_bytes(vec.to_bytes())
+
+    assert list(loaded.ids) == [1, 2, 3]
+    assert list(loaded.weights) == pytest.approx([5.0, 2.4, 0.5])
+    assert loaded.departments == ["Directing", "Acting", ""]
+
+
+def test_decode_is_lazy():
+    blob = EntityVector.from_entities(ENTITIES).to_bytes()
+    loaded = EntityVector.from_bytes(blob)
+
+    assert len(loaded) == 3
+    assert loaded._ids is None
+    # Re-saving an untouched vector reuses its blob as-is
+    assert loaded.to_bytes() == blob
+    assert loaded[0] == {"id": 1, "weight": 5.0, "department": "Directing"}
+
+
+def test_packed_size():
+    vec = EntityVector.from_entities(ENTITIES * 100)
+    # 9 bytes per entity plus a 5 byte header
+    assert len(vec.to_bytes()) == 5 + 9 * 300
+
+
+def test_missing_weight_uses_the_default_department_weight():
+    from flickflock.flock import DEFAULT_DEPARTMENT_WEIGHT, weigh_entities
+    vec = EntityVector.from_entities([{"id": 1}])
+    assert vec[0]["weight"] == DEFAULT_DEPARTMENT_WEIGHT == weigh_entities([1])[0]["weight"]
+
+
+def test_flock_reads_json_rows():
+    """Rows saved before entries were packed should still load."""
+    flock_id = f"pre-blob-{uuid.uuid4()}"
+    with storage.connection(flock_id) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO flocks (flock_id, data, entries, updated_at) VALUES (?, ?, NULL, 0)",
+            (flock_id, json.dumps({
+                "flock_id": flock_id,
+                "flock_entries": [{"entities": ENTITIES, "primary_id": 7, "source_type": "movie"}],
+            })),
+        )
+
+    loaded = Flock(flock_id=flock_id)
+    assert list(loaded.flock_entries[0]["entities"].ids) == [1, 2, 3]
+
+    # New events are appended on top of the legacy snapshot
+    loaded.update_selection({"id": 8, "media_type": "movie"})
+    loaded.sync_flock()
+    reloaded = Flock(flock_id=flock_id)
+    assert list(reloaded.flock_entries[0]["entities"].ids) == [1, 2, 3]
+    assert reloaded.selection == [{"id": 8, "media_type": "movie"}]
@@ -0,0 +1,103 @@
+import json
+import pytest
+from flickflock import storage
+from flickflock.flock import Flock
+from flickflock.warmup import parse_seed, popular_seeds, warm
+
+
+class FakeTMDB:
+    def __init__(self):
+        self.cache = set()
+        self.tmdb_requests = self.cached_requests = 0
+
+    def _request(self, path):
+        if path in self.cache:
+            self.cached_requests += 1
+        else:
+            self.cache.add(path)
+            self.tmdb_requests += 1
+
+    def get_credits(self, media_type, id):
+        if id == 404:
+            raise RuntimeError("not found")
+        self._request(f"{media_type}/{id}/credits")
+
+    def get_person_by_id(self, id):
+        self._request(f"person/{id}")
+
+    def get_person_relations_filtered(self, id):
+        self._request(f"person/{id}")
+        self._request(f"movie/{id + 1}/credits")
+
+
+def test_parse_seed():
+    assert parse_seed("movie:603") == ("movie", 603)
+    with pytest.raises(ValueError):
+        parse_seed("episode:1")
+
+
+def test_warm_reports_hit_ratio_and_failures():
+    tmdb = FakeTMDB()
+    report = warm(tmdb, ["movie:1", "person:1", "movie:2", "movie:404"], concurrency=1)
+    assert report["warmed"] == 3
+    assert report["failed"] == ["movie:404"]
+    # person:1 fetches its details twice and its top work, movie:2
+    assert report["upstream_requests"] == 3
+    assert report["cache_hits"] == 2
+    assert report["hit_ratio"] == 0.4
+
+
+def test_warm_resumes_from_recorded_progress():
+    warm(FakeTMDB(), ["movie:10", "movie:11"])
+    tmdb = FakeTMDB()
+    report = warm(tmdb, ["movie:10", "movie:11", "movie:12"])
+    assert report["skipped"] == 2 and report["warmed"] == 1
+    assert tmdb.tmdb_requests == 1
+
+    assert warm(FakeTMDB(), ["movie:10"], resume=False)["warmed"] == 1
+
+
+def test_popular_seeds_counts_selections():
+    for _ in range(3):
+        f = Flock()
+        f.update_selection({"id": 7001, "media_type": "movie"})
+        f.sync_flock()
+    f = Flock()
+    f.update_selection({"id": 7002, "media_type": "person"})
+    f.sync_flock()
+
+    seeds = popular_seeds(1000)
+    assert seeds.index("movie:7001") < seeds.index("person:7002")
+
+
+def test_popular_seeds_counts_current_selections():
+    # A legacy flock only has its snapshot, with no selection events
+    legacy_id = "legacy-flock-warmup"
+    with storage.connection(legacy_id) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO flocks (flock_id, data, updated_at) VALUES (?, ?, 0)",
+            (legacy_id, json.dumps({
+                "flock_id": legacy_id,
+                "flock_entries": [],
+                "selection": [{"id": 7101, "media_type": "tv"}, {"id": 7102, "media_type": "movie"}],
+            })),
+        )
+    legacy = Flock(flock_id=legacy_id)
+    legacy.remove_selection(7102)
+    legacy.sync_flock()
+
+    for _ in range(2):
+        f = Flock()
+        # Selecting the same seed twice counts once
+        f.update_selection({"id": 7102, "media_type": "movie"})
+        f.update_selection({"id": 7102, "media_type": "movie"})
+        f.update_selection({"id": 7103, "media_type": "movie"})
+        f.remove_selection(7103)
+        f.sync_flock()
+        f = Flock()
+        f.update_selection({"id": 7101, "media_type": "tv"})
+        f.sync_flock()
+
+    seeds = popular_seeds(1000)
+    assert seeds.index("tv:7101") < seeds.index("movie:7102")
+    assert "movie:7103" not in seeds